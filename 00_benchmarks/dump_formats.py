@@ -0,0 +1,168 @@
+# =============================================================
+# Trajectory Output Benchmark
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Compare bytes written and write time of the 03_shear dump formats.
+# Note: Runs a small synthetic BCC Fe box, so no input from 01_input/02_minimize is needed.
+# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif mpirun.openmpi -np 4 /opt/venv/bin/python3 00_benchmarks/dump_formats.py
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import os, json, shutil, datetime, importlib.util
+from mpi4py import MPI
+from lammps import lammps
+
+# =============================================================
+# INITIALISE MPI
+# =============================================================
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+
+# =============================================================
+# PATH SETTINGS
+# =============================================================
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BASE_DIR = os.path.join(REPO_DIR, '000_data') # Master data directory
+BENCH_DATA_DIR = os.path.join(BASE_DIR, '00_benchmarks') # Benchmark results directory
+WORK_DIR = os.path.join(BENCH_DATA_DIR, 'dump_formats') # Scratch dumps, removed after each format
+
+SHEAR_RUN_FILE = os.path.join(REPO_DIR, '03_shear', 'run.py') # Dump settings are taken from the shear stage
+
+# =============================================================
+# BENCHMARK PARAMETERS
+# =============================================================
+
+ALAT = 2.855 # Fe lattice constant (angstrom), close enough for an I/O benchmark
+NX, NY, NZ = 40, 10, 8 # Box size in [111], [1-10], [11-2] lattice repeats
+
+DT = 0.001
+TEMPERATURE = 300
+RUN_STEPS = 200
+DUMP_FREQ = 10
+REPEATS = 3 # Timed runs per format, the fastest is reported
+
+KEEP_OUTPUT = False
+
+# =============================================================
+# MAIN FUNCTION
+# =============================================================
+
+def main():
+    shear = load_shear_module()
+
+    # Baseline without any dump so the difference is the cost of writing
+    results = {"none": benchmark_format(shear, None)}
+    for dump_format in shear.DUMP_FILENAMES:
+        results[dump_format] = benchmark_format(shear, dump_format)
+
+    if rank == 0:
+        natoms = results["none"]["natoms"]
+        base_time = results["none"]["wall_time"]
+        text_bytes = results.get("text", {}).get("bytes", 0)
+
+        print(f"\n{natoms} atoms, {size} ranks, {RUN_STEPS} steps, dump every {DUMP_FREQ}")
+        print(f"{'format':>8} {'MB written':>12} {'vs text':>8} {'wall (s)':>10} {'write (s)':>10}")
+        for dump_format, result in results.items():
+            result["write_time"] = max(result["wall_time"] - base_time, 0.0)
+            ratio = result["bytes"] / text_bytes if text_bytes else 0.0
+            print(f"{dump_format:>8} {result['bytes'] / 1e6:12.2f} {ratio:8.3f} {result['wall_time']:10.3f} {result['write_time']:10.3f}")
+
+        summary = {
+            "timestamp": str(datetime.datetime.now()),
+            "n_ranks": size,
+            "natoms": natoms,
+            "run_steps": RUN_STEPS,
+            "dump_freq": DUMP_FREQ,
+            "results": results,
+        }
+
+        os.makedirs(BENCH_DATA_DIR, exist_ok=True)
+        output_path = os.path.join(BENCH_DATA_DIR, f"dump_formats_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+        with open(output_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {output_path}")
+
+    return None
+
+# =============================================================
+# BENCHMARK
+# =============================================================
+
+def load_shear_module():
+    """Import 03_shear/run.py under another name so the benchmark uses its dump settings."""
+    spec = importlib.util.spec_from_file_location('shear_run', SHEAR_RUN_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def benchmark_format(shear, dump_format):
+    """Run the synthetic box REPEATS times with one dump format (None for no dump)."""
+
+    best_time = None
+    for _ in range(REPEATS):
+        dump_dir = os.path.join(WORK_DIR, dump_format or 'none')
+        if rank == 0:
+            shutil.rmtree(dump_dir, ignore_errors=True)
+            os.makedirs(dump_dir)
+        comm.Barrier()
+
+        lmp = build_box(shear)
+        if dump_format is not None:
+            lmp.cmd.dump('1', 'all', 'custom', DUMP_FREQ, os.path.join(dump_dir, shear.DUMP_FILENAMES[dump_format]), *shear.DUMP_COLUMNS)
+
+        comm.Barrier()
+        t0 = MPI.Wtime()
+        lmp.cmd.run(RUN_STEPS)
+        comm.Barrier()
+        wall_time = MPI.Wtime() - t0
+
+        natoms = lmp.get_natoms()
+        lmp.close()
+
+        best_time = wall_time if best_time is None else min(best_time, wall_time)
+
+    n_bytes = directory_bytes(dump_dir) if rank == 0 else 0
+    if rank == 0 and not KEEP_OUTPUT:
+        shutil.rmtree(dump_dir, ignore_errors=True)
+
+    return {"natoms": natoms, "bytes": n_bytes, "wall_time": best_time}
+
+def build_box(shear):
+    """Perfect BCC Fe box in the shear orientation with the same computes as 03_shear/run.py."""
+    lmp = lammps(cmdargs=['-log', 'none', '-screen', 'none'])
+
+    lmp.cmd.units('metal')
+    lmp.cmd.dimension(3)
+    lmp.cmd.boundary('p', 'p', 'p')
+    lmp.cmd.lattice('bcc', ALAT, 'orient', 'x', 1, 1, 1, 'orient', 'y', 1, -1, 0, 'orient', 'z', 1, 1, -2)
+    lmp.cmd.region('box', 'block', 0, NX, 0, NY, 0, NZ)
+    lmp.cmd.create_box(1, 'box')
+    lmp.cmd.create_atoms(1, 'box')
+    lmp.cmd.mass(1, 55.845)
+
+    lmp.cmd.pair_style('eam/fs')
+    lmp.cmd.pair_coeff('*', '*', shear.POTENTIAL_FILE, 'Fe')
+
+    lmp.cmd.compute('peratom', 'all', 'pe/atom')
+    lmp.cmd.compute('stress', 'all', 'stress/atom', 'NULL')
+
+    lmp.cmd.timestep(DT)
+    lmp.cmd.velocity('all', 'create', TEMPERATURE, 4928, 'mom', 'yes', 'rot', 'yes')
+    lmp.cmd.fix('1', 'all', 'nvt', 'temp', TEMPERATURE, TEMPERATURE, 100.0 * DT)
+    lmp.cmd.thermo(RUN_STEPS)
+
+    return lmp
+
+def directory_bytes(path):
+    """Total size of the files in path."""
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+# =============================================================
+# ENTRY POINT
+# =============================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# =============================================================
+# Frozen Region Shear Benchmark
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Compare 03_shear timesteps per second with FROZEN_MODE 'setforce' and 'exclude' over a range of obstacle radii.
+# Note: Runs the 03_shear workflow (precipitate by default) for BENCH_STEPS steps per case without dumps or checkpoints.
+# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif mpirun.openmpi -np 16 /opt/venv/bin/python3 00_benchmarks/frozen_region.py [--radii 20 30 40]
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import os, sys, json, shutil, argparse, datetime, importlib.util
+from mpi4py import MPI
+
+# =============================================================
+# INITIALISE MPI
+# =============================================================
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+
+# =============================================================
+# PATH SETTINGS
+# =============================================================
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BASE_DIR = os.path.join(REPO_DIR, '000_data') # Master data directory
+BENCH_DATA_DIR = os.path.join(BASE_DIR, '00_benchmarks') # Benchmark results directory
+WORK_DIR = os.path.join(BENCH_DATA_DIR, 'frozen_region') # Scratch case directories
+
+SHEAR_RUN_FILE = os.path.join(REPO_DIR, '03_shear', 'run.py')
+
+# =============================================================
+# BENCHMARK PARAMETERS
+# =============================================================
+
+OBSTACLE_TYPE = 'prec' # The precipitate is the large rigid region, 'void' only gains from the thermostat change
+RADII = [20, 30, 40]
+TEMPERATURE = 300
+SHEAR_VELOCITY = 0.001
+BENCH_STEPS = 500
+RANDOM_SEED = 4928
+
+KEEP_OUTPUT = False
+
+# =============================================================
+# MAIN FUNCTION
+# =============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Timesteps per second of the shear run with and without frozen-region exclusion.")
+    parser.add_argument('--radii', type=int, nargs='+', default=RADII)
+    parser.add_argument('--obstacle', choices=['void', 'prec'], default=OBSTACLE_TYPE)
+    parser.add_argument('--steps', type=int, default=BENCH_STEPS)
+    parser.add_argument('--input', help="Minimized data file (default: the 03_shear INPUT_FILE)")
+    args = parser.parse_args()
+
+    shear = load_module('shear_run', SHEAR_RUN_FILE)
+    shear.STAGE_DATA_DIR = WORK_DIR
+    shear.RUN_TIME = args.steps
+    shear.DUMP_FORMAT = 'none'
+    shear.CHECKPOINT_MODE = 'none'
+    if args.input is not None:
+        shear.INPUT_FILE = os.path.abspath(args.input)
+
+    results = []
+    for radius in args.radii:
+        for mode in shear.FROZEN_MODES:
+            results.append(benchmark_case(shear, args.obstacle, radius, mode))
+
+    if rank == 0:
+        print(f"\n{args.obstacle}, {args.steps} steps, {size} ranks")
+        print(f"{'radius':>7} {'mode':>9} {'atoms':>9} {'run (s)':>9} {'steps/s':>9} {'speedup':>8}")
+        for row in results:
+            base = next(r for r in results if r["radius"] == row["radius"] and r["frozen_mode"] == 'setforce')
+            row["speedup"] = row["timesteps_per_second"] / base["timesteps_per_second"]
+            print(f"{row['radius']:7d} {row['frozen_mode']:>9} {row['natoms']:9d} {row['run_time']:9.2f} "
+                  f"{row['timesteps_per_second']:9.2f} {row['speedup']:8.2f}")
+
+        summary = {
+            "timestamp": str(datetime.datetime.now()),
+            "n_ranks": size,
+            "obstacle_type": args.obstacle,
+            "steps": args.steps,
+            "input_file": shear.INPUT_FILE,
+            "frozen_core_skin": shear.FROZEN_CORE_SKIN,
+            "results": results,
+        }
+
+        os.makedirs(BENCH_DATA_DIR, exist_ok=True)
+        output_path = os.path.join(BENCH_DATA_DIR, f"frozen_region_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+        with open(output_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {output_path}")
+
+        if not KEEP_OUTPUT:
+            shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    return None
+
+# =============================================================
+# BENCHMARK
+# =============================================================
+
+def load_module(name, path):
+    """Import a stage script under another name so the benchmark uses its code and settings."""
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def benchmark_case(shear, obstacle_type, radius, mode):
+    """Run one case in one frozen mode and return the throughput of its shear run."""
+
+    shear.FROZEN_MODE = mode
+    shear.configure_case(obstacle_type, radius, TEMPERATURE, SHEAR_VELOCITY, seed=RANDOM_SEED)
+
+    comm.Barrier()
+    t0 = MPI.Wtime()
+    natoms = shear.main(obstacle_type)
+    comm.Barrier()
+    wall_time = MPI.Wtime() - t0
+
+    # Both modes write to the same case name, clear it so the next one starts fresh
+    if rank == 0:
+        shutil.rmtree(shear.CASE_DATA_DIR, ignore_errors=True)
+    comm.Barrier()
+
+    # Rate over the shear run alone, setup, equilibration and output are the same in both modes
+    return {
+        "radius": radius,
+        "frozen_mode": mode,
+        "natoms": natoms,
+        "wall_time": wall_time,
+        "run_time": shear.RUN_SECONDS,
+        "steps": shear.RUN_STEPS,
+        "timesteps_per_second": shear.RUN_STEPS / shear.RUN_SECONDS,
+        "atom_steps_per_second": natoms * shear.RUN_STEPS / shear.RUN_SECONDS,
+    }
+
+# =============================================================
+# ENTRY POINT
+# =============================================================
+if __name__ == "__main__":
+    main()
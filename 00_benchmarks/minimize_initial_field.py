@@ -0,0 +1,149 @@
+# =============================================================
+# Initial Dislocation Field Minimization Benchmark
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Compare 02_minimize iterations and wall time for inputs built with and without the Stroh field.
+# Note: Builds the input with 01_input/run.py and minimizes it with the 02_minimize settings.
+# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif mpirun.openmpi -np 4 /opt/venv/bin/python3 00_benchmarks/minimize_initial_field.py
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import os, json, shutil, datetime, importlib.util
+from mpi4py import MPI
+from lammps import lammps
+
+# =============================================================
+# INITIALISE MPI
+# =============================================================
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+
+# =============================================================
+# PATH SETTINGS
+# =============================================================
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BASE_DIR = os.path.join(REPO_DIR, '000_data') # Master data directory
+BENCH_DATA_DIR = os.path.join(BASE_DIR, '00_benchmarks') # Benchmark results directory
+WORK_DIR = os.path.join(BENCH_DATA_DIR, 'minimize_initial_field') # Scratch inputs and logs
+
+INPUT_RUN_FILE = os.path.join(REPO_DIR, '01_input', 'run.py') # Builder and Stroh field
+MINIMIZE_RUN_FILE = os.path.join(REPO_DIR, '02_minimize', 'run.py') # Minimization tolerances and potential
+
+# =============================================================
+# BENCHMARK PARAMETERS
+# =============================================================
+
+X_LEN, Y_LEN, Z_LEN = 60, 15, 10 # Oriented cell repeats, smaller than the production box
+MAX_ITERATIONS = 1000 # Same limits as 02_minimize
+MAX_EVALUATIONS = 10000
+
+KEEP_OUTPUT = False
+
+# =============================================================
+# MAIN FUNCTION
+# =============================================================
+
+def main():
+    builder = load_module('input_run', INPUT_RUN_FILE)
+    minimizer = load_module('minimize_run', MINIMIZE_RUN_FILE)
+
+    builder.X_LEN, builder.Y_LEN, builder.Z_LEN = X_LEN, Y_LEN, Z_LEN
+
+    constants = None
+    if rank == 0:
+        os.makedirs(WORK_DIR, exist_ok=True)
+        constants = builder.elastic_constants()
+    alat, C11, C12, C44 = comm.bcast(constants, root=0)
+
+    results = {}
+    for field in builder.DISLOCATION_FIELDS:
+        input_path = os.path.join(WORK_DIR, f'edge_dislo_{field}.lmp')
+        if rank == 0:
+            positions, box = builder.build_edge_dislocation(alat)
+            if field == 'stroh':
+                positions += builder.stroh_displacement(positions, box, alat, C11, C12, C44)
+            builder.write_lammps_data(input_path, positions, box)
+        comm.Barrier()
+
+        results[field] = benchmark_minimize(minimizer, input_path, field)
+
+    if rank == 0:
+        print(f"\n{results['none']['natoms']} atoms, {size} ranks, etol {minimizer.ENERGY_TOL}, ftol {minimizer.FORCE_TOL}")
+        print(f"{'field':>8} {'iterations':>11} {'wall (s)':>10} {'initial pe (eV)':>16} {'final pe (eV)':>16}")
+        for field, result in results.items():
+            print(f"{field:>8} {result['iterations']:11d} {result['wall_time']:10.2f} {result['initial_pe']:16.4f} {result['final_pe']:16.4f}")
+
+        summary = {
+            "timestamp": str(datetime.datetime.now()),
+            "n_ranks": size,
+            "repeats": [X_LEN, Y_LEN, Z_LEN],
+            "alat": alat,
+            "elastic_constants": [C11, C12, C44],
+            "energy_tol": minimizer.ENERGY_TOL,
+            "force_tol": minimizer.FORCE_TOL,
+            "results": results,
+        }
+
+        output_path = os.path.join(BENCH_DATA_DIR, f"minimize_initial_field_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+        with open(output_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {output_path}")
+
+        if not KEEP_OUTPUT:
+            shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    return None
+
+# =============================================================
+# BENCHMARK
+# =============================================================
+
+def load_module(name, path):
+    """Import a stage script under another name so the benchmark uses its settings."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def benchmark_minimize(minimizer, input_path, field):
+    """Minimize one input exactly as 02_minimize does and report iterations, wall time and energies."""
+
+    lmp = lammps(cmdargs=['-log', os.path.join(WORK_DIR, f'log_{field}.lammps'), '-screen', 'none'])
+
+    lmp.cmd.units('metal')
+    lmp.cmd.dimension(3)
+    lmp.cmd.boundary('p', 'f', 'p')
+    lmp.cmd.read_data(input_path)
+
+    lmp.cmd.pair_style('eam/fs')
+    lmp.cmd.pair_coeff('*', '*', minimizer.POTENTIAL_FILE, 'Fe')
+
+    lmp.cmd.run(0)
+    initial_pe = lmp.get_thermo('pe')
+
+    comm.Barrier()
+    t0 = MPI.Wtime()
+    lmp.cmd.minimize(minimizer.ENERGY_TOL, minimizer.FORCE_TOL, MAX_ITERATIONS, MAX_EVALUATIONS)
+    comm.Barrier()
+    wall_time = MPI.Wtime() - t0
+
+    result = {
+        "natoms": lmp.get_natoms(),
+        "iterations": int(lmp.extract_global('ntimestep')), # minimize starts from step 0
+        "wall_time": wall_time,
+        "initial_pe": initial_pe,
+        "final_pe": lmp.get_thermo('pe'),
+    }
+    lmp.close()
+
+    return result
+
+# =============================================================
+# ENTRY POINT
+# =============================================================
+if __name__ == "__main__":
+    main()
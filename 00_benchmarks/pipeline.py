@@ -0,0 +1,358 @@
+# =============================================================
+# Pipeline Scaling Benchmark
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Run 01_input, 02_minimize, 03_shear and 03_shear/analysis on small synthetic boxes over a range of MPI rank counts.
+# Note: Reports wall time, atom-steps/s, frames/s, peak RSS and bytes written as strong- and weak-scaling tables (CPU only, one node).
+# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif /opt/venv/bin/python3 00_benchmarks/pipeline.py --ranks 1 2 4 8 --mpirun mpirun.openmpi
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+# The driver only launches workers, mpi4py and lammps are imported inside the workers so the driver never initialises MPI
+import os, sys, json, shutil, argparse, datetime, resource, subprocess, importlib.util
+
+# =============================================================
+# PATH SETTINGS
+# =============================================================
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BASE_DIR = os.path.join(REPO_DIR, '000_data') # Master data directory
+BENCH_DATA_DIR = os.path.join(BASE_DIR, '00_benchmarks') # Benchmark results directory
+WORK_DIR = os.path.join(BENCH_DATA_DIR, 'pipeline') # Scratch cases, one directory per scaling mode and rank count
+
+INPUT_RUN_FILE = os.path.join(REPO_DIR, '01_input', 'run.py')
+MINIMIZE_RUN_FILE = os.path.join(REPO_DIR, '02_minimize', 'run.py')
+SHEAR_RUN_FILE = os.path.join(REPO_DIR, '03_shear', 'run.py')
+ANALYSIS_RUN_FILE = os.path.join(REPO_DIR, '03_shear', 'analysis.py')
+
+# =============================================================
+# BENCHMARK PARAMETERS
+# =============================================================
+
+STAGES = ['input', 'minimize', 'shear', 'analysis']
+RANKS = [1, 2, 4]
+SCALINGS = ['strong', 'weak'] # strong: fixed box, weak: box grows along X with the rank count
+
+BASE_SIZE = (40, 10, 6) # Oriented cell repeats along X, Y, Z for one rank (about 29k atoms)
+
+OBSTACLE_TYPE = 'prec'
+OBSTACLE_RADIUS = 8
+TEMPERATURE = 300
+SHEAR_VELOCITY = 0.001
+SHEAR_STEPS = 200 # Dumps every 03_shear DUMP_FREQ, so SHEAR_STEPS / DUMP_FREQ + 1 frames reach analysis
+RANDOM_SEED = 4928
+
+MPIRUN = os.environ.get('MPIRUN', 'mpirun') # Launcher, e.g. mpirun.openmpi inside the container
+MPIRUN_ARGS = os.environ.get('MPIRUN_ARGS', '').split() # Extra launcher arguments, e.g. --oversubscribe
+
+KEEP_OUTPUT = False
+
+# =============================================================
+# MAIN FUNCTION
+# =============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Strong and weak scaling benchmark of the obstacle shear pipeline.")
+    parser.add_argument('--ranks', type=int, nargs='+', default=RANKS)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--scalings', nargs='+', choices=SCALINGS, default=SCALINGS)
+    parser.add_argument('--size', type=int, nargs=3, default=BASE_SIZE, help="X Y Z oriented cell repeats per rank")
+    parser.add_argument('--mpirun', default=MPIRUN)
+    parser.add_argument('--worker', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--case-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        WORKERS[args.worker](args.case_dir, tuple(args.size), args.result)
+        return None
+
+    results = {scaling: {stage: [] for stage in args.stages} for scaling in args.scalings}
+
+    for scaling in args.scalings:
+        for n_ranks in args.ranks:
+            size = scaled_size(args.size, n_ranks, scaling)
+            case_dir = os.path.join(WORK_DIR, f"{scaling}_np{n_ranks}")
+            shutil.rmtree(case_dir, ignore_errors=True)
+            os.makedirs(case_dir)
+
+            # Each stage consumes the previous one's output, so earlier stages always run
+            last_stage = max(STAGES.index(stage) for stage in args.stages)
+            for stage in STAGES[:last_stage + 1]:
+                result = run_worker(stage, 1 if stage == 'input' else n_ranks, size, case_dir, args.mpirun)
+                if stage in args.stages:
+                    results[scaling][stage].append(result)
+
+            if not KEEP_OUTPUT:
+                shutil.rmtree(case_dir, ignore_errors=True)
+
+    report = {
+        "timestamp": str(datetime.datetime.now()),
+        "host": os.uname().nodename,
+        "cpu_count": os.cpu_count(),
+        "base_size": list(args.size),
+        "shear_steps": SHEAR_STEPS,
+        "results": results,
+        "tables": {scaling: {stage: scaling_table(rows, scaling) for stage, rows in stages.items()} for scaling, stages in results.items()},
+    }
+
+    print_tables(report["tables"])
+
+    os.makedirs(BENCH_DATA_DIR, exist_ok=True)
+    output_path = os.path.join(BENCH_DATA_DIR, f"pipeline_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output_path}")
+
+    return None
+
+# =============================================================
+# DRIVER
+# =============================================================
+
+def scaled_size(size, n_ranks, scaling):
+    """Box repeats for a run: unchanged for strong scaling, X multiplied by the rank count for weak scaling."""
+    if scaling == 'weak':
+        return (size[0] * n_ranks, size[1], size[2])
+    return tuple(size)
+
+def run_worker(stage, n_ranks, size, case_dir, mpirun):
+    """Run one stage in a fresh process (under the MPI launcher unless serial) and return its result."""
+
+    result_path = os.path.join(case_dir, f"result_{stage}.json")
+    command = [sys.executable, os.path.abspath(__file__), '--worker', stage, '--case-dir', case_dir,
+               '--size', *map(str, size), '--result', result_path]
+    if stage != 'input':
+        command = [mpirun, *MPIRUN_ARGS, '-np', str(n_ranks), *command]
+
+    print(f"{stage:>9} np={n_ranks} size={size}", flush=True)
+    subprocess.run(command, check=True)
+
+    with open(result_path) as f:
+        return json.load(f)
+
+def scaling_table(rows, scaling):
+    """Speedup and parallel efficiency of each row relative to the smallest rank count."""
+    if not rows:
+        return []
+
+    base = min(rows, key=lambda row: row["n_ranks"])
+    table = []
+    for row in sorted(rows, key=lambda row: row["n_ranks"]):
+        ratio = base["wall_time"] / row["wall_time"] if row["wall_time"] > 0 else 0.0
+        relative_ranks = row["n_ranks"] / base["n_ranks"]
+        table.append({
+            "n_ranks": row["n_ranks"],
+            "natoms": row["natoms"],
+            "wall_time": row["wall_time"],
+            "speedup": ratio if scaling == 'strong' else ratio * relative_ranks, # weak: work grows with ranks
+            "efficiency": ratio / relative_ranks if scaling == 'strong' else ratio,
+            "atom_steps_per_second": row.get("atom_steps_per_second"),
+            "frames_per_second": row.get("frames_per_second"),
+            "rss_max_mb": row["rss_max_mb"],
+            "bytes_written": row["bytes_written"],
+        })
+    return table
+
+def print_tables(tables):
+    for scaling, stages in tables.items():
+        for stage, table in stages.items():
+            if not table:
+                continue
+            print(f"\n{scaling} scaling, {stage}")
+            print(f"{'ranks':>6} {'atoms':>9} {'wall (s)':>9} {'speedup':>8} {'eff.':>6} {'atom-steps/s':>13} {'frames/s':>9} {'RSS (MB)':>9} {'MB written':>11}")
+            for row in table:
+                rate = row['atom_steps_per_second']
+                frames = row['frames_per_second']
+                print(f"{row['n_ranks']:6d} {row['natoms']:9d} {row['wall_time']:9.2f} {row['speedup']:8.2f} {row['efficiency']:6.2f} "
+                      f"{(f'{rate:.3e}' if rate else '-'):>13} {(f'{frames:.2f}' if frames else '-'):>9} "
+                      f"{row['rss_max_mb']:9.1f} {row['bytes_written'] / 1e6:11.2f}")
+    return None
+
+# =============================================================
+# WORKERS
+# =============================================================
+
+def worker_input(case_dir, size, result_path):
+    """Build the edge dislocation with the 01_input NumPy builder and Stroh field (serial stage)."""
+    import time
+
+    builder = load_module('input_run', INPUT_RUN_FILE)
+    builder.X_LEN, builder.Y_LEN, builder.Z_LEN = size
+
+    alat, C11, C12, C44 = builder.elastic_constants() # cached after the first run, so only the build is timed
+
+    t0 = time.perf_counter()
+    positions, box = builder.build_edge_dislocation(alat)
+    positions += builder.stroh_displacement(positions, box, alat, C11, C12, C44)
+    input_path = os.path.join(case_dir, 'input.lmp')
+    builder.write_lammps_data(input_path, positions, box)
+    wall_time = time.perf_counter() - t0
+
+    write_result(result_path, {
+        "stage": 'input',
+        "n_ranks": 1,
+        "natoms": len(positions),
+        "wall_time": wall_time,
+        "rss_max_mb": peak_rss_mb(),
+        "rss_total_mb": peak_rss_mb(),
+        "bytes_written": os.path.getsize(input_path),
+    })
+
+    return None
+
+def worker_minimize(case_dir, size, result_path):
+    """Minimize the built input with the 02_minimize settings, writing the data file and reference dump."""
+    from mpi4py import MPI
+    from lammps import lammps
+
+    comm = MPI.COMM_WORLD
+    minimizer = load_module('minimize_run', MINIMIZE_RUN_FILE)
+
+    lmp = lammps(cmdargs=['-log', os.path.join(case_dir, 'log_minimize.lammps'), '-screen', 'none'])
+    lmp.cmd.units('metal')
+    lmp.cmd.dimension(3)
+    lmp.cmd.boundary('p', 'f', 'p')
+    lmp.cmd.read_data(os.path.join(case_dir, 'input.lmp'))
+
+    lmp.cmd.pair_style('eam/fs')
+    lmp.cmd.pair_coeff('*', '*', minimizer.POTENTIAL_FILE, 'Fe')
+    lmp.cmd.compute('peratom', 'all', 'pe/atom')
+
+    comm.Barrier()
+    t0 = MPI.Wtime()
+    lmp.cmd.minimize(minimizer.ENERGY_TOL, minimizer.FORCE_TOL, minimizer.MAX_ITERATIONS, minimizer.MAX_EVALUATIONS)
+    comm.Barrier()
+    wall_time = MPI.Wtime() - t0
+
+    lmp.cmd.write_dump('all', 'custom', os.path.join(case_dir, 'minimized_dump'), 'id', 'x', 'y', 'z', 'c_peratom')
+    lmp.cmd.write_data(os.path.join(case_dir, 'minimized.lmp'))
+
+    natoms = lmp.get_natoms()
+    iterations = int(lmp.extract_global('ntimestep'))
+    lmp.close()
+
+    gather_result(comm, result_path, {
+        "stage": 'minimize',
+        "natoms": natoms,
+        "wall_time": wall_time,
+        "steps": iterations,
+        "atom_steps_per_second": natoms * iterations / wall_time,
+        "bytes_written": sum(os.path.getsize(os.path.join(case_dir, f)) for f in ('minimized_dump', 'minimized.lmp')),
+    })
+
+    return None
+
+def worker_shear(case_dir, size, result_path):
+    """Run the 03_shear workflow on the minimized box for SHEAR_STEPS steps."""
+    from mpi4py import MPI
+
+    comm = MPI.COMM_WORLD
+    shear = load_module('shear_run', SHEAR_RUN_FILE)
+
+    shear.STAGE_DATA_DIR = os.path.join(case_dir, 'shear')
+    shear.INPUT_FILE = os.path.join(case_dir, 'minimized.lmp')
+    shear.RUN_TIME = SHEAR_STEPS
+    shear.configure_case(OBSTACLE_TYPE, OBSTACLE_RADIUS, TEMPERATURE, SHEAR_VELOCITY, seed=RANDOM_SEED)
+
+    comm.Barrier()
+    t0 = MPI.Wtime()
+    natoms = shear.main(OBSTACLE_TYPE)
+    comm.Barrier()
+    wall_time = MPI.Wtime() - t0
+
+    # Throughput over the MD run only, LAMMPS startup, read_data and the setup dumps are in wall_time
+    gather_result(comm, result_path, {
+        "stage": 'shear',
+        "natoms": natoms,
+        "wall_time": wall_time,
+        "run_time": shear.RUN_SECONDS,
+        "steps": shear.RUN_STEPS,
+        "atom_steps_per_second": natoms * shear.RUN_STEPS / shear.RUN_SECONDS,
+        "bytes_written": directory_bytes(shear.CASE_DATA_DIR),
+        "case_dir": shear.CASE_DATA_DIR,
+    })
+
+    return None
+
+def worker_analysis(case_dir, size, result_path):
+    """Run 03_shear/analysis.py on the shear case with the minimized dump as Wigner-Seitz reference."""
+    from mpi4py import MPI
+
+    comm = MPI.COMM_WORLD
+
+    with open(os.path.join(case_dir, 'result_shear.json')) as f:
+        shear_case = json.load(f)["case_dir"]
+
+    # analysis.py resolves its case and reference at import time
+    os.environ['SHEAR_CASE_DIR'] = shear_case
+    os.environ['SHEAR_REFERENCE_FILE'] = os.path.join(case_dir, 'minimized_dump')
+    sys.path.insert(0, os.path.dirname(ANALYSIS_RUN_FILE)) # for result_store
+    analysis = load_module('shear_analysis', ANALYSIS_RUN_FILE)
+    analysis.RESUME = False
+    analysis.MIN_DUMP_AGE = 0.0
+
+    analysis.read_case_metadata()
+    bytes_before = directory_bytes(shear_case)
+    n_frames = len(analysis.get_dump_filenames(analysis.DATA_DIR))
+
+    comm.Barrier()
+    t0 = MPI.Wtime()
+    analysis.main()
+    comm.Barrier()
+    wall_time = MPI.Wtime() - t0
+
+    with open(os.path.join(case_dir, 'result_shear.json')) as f:
+        natoms = json.load(f)["natoms"]
+
+    gather_result(comm, result_path, {
+        "stage": 'analysis',
+        "natoms": natoms,
+        "wall_time": wall_time,
+        "frames": n_frames,
+        "frames_per_second": n_frames / wall_time,
+        "bytes_written": directory_bytes(shear_case) - bytes_before,
+    })
+
+    return None
+
+WORKERS = {'input': worker_input, 'minimize': worker_minimize, 'shear': worker_shear, 'analysis': worker_analysis}
+
+# =============================================================
+# MEASUREMENT HELPERS
+# =============================================================
+
+def load_module(name, path):
+    """Import a stage script under another name so the benchmark uses its code and settings."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is in kB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def gather_result(comm, result_path, result):
+    """Add the rank count and per-rank peak RSS (max and sum) and write the result from rank 0."""
+    rss = comm.gather(peak_rss_mb(), root=0)
+    if comm.Get_rank() == 0:
+        write_result(result_path, {**result, "n_ranks": comm.Get_size(), "rss_max_mb": max(rss), "rss_total_mb": sum(rss)})
+    return None
+
+def write_result(result_path, result):
+    with open(result_path, 'w') as f:
+        json.dump(result, f, indent=2)
+    return None
+
+def directory_bytes(path):
+    """Total size of all files below path."""
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+# =============================================================
+# ENTRY POINT
+# =============================================================
+if __name__ == "__main__":
+    main()
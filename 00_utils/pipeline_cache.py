@@ -0,0 +1,157 @@
+# =============================================================
+# Content-Addressed Pipeline Cache
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Reuse elastic constants and minimized configurations across pipeline runs and sweep cases.
+# Note: Entries are keyed on a SHA-256 of the input files' contents and the stage parameters, so any change misses.
+# Usage: key = pipeline_cache.make_key('minimize', files=[input, potential], params={...}); pipeline_cache.lookup(key)
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import os
+import json
+import time
+import shutil
+import hashlib
+
+# =============================================================
+# CACHE SETTINGS
+# =============================================================
+
+# Scratch location, overridable per machine (e.g. PIPELINE_CACHE_DIR=/mnt/parscratch/users/$USER/cache)
+CACHE_DIR = os.environ.get('PIPELINE_CACHE_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '000_data', '00_cache')))
+CACHE_MAX_BYTES = int(float(os.environ.get('PIPELINE_CACHE_MAX_GB', 20)) * 1e9) # Least recently used entries are evicted above this
+
+CACHE_FORMAT = 1 # Bump to invalidate every entry when the cached layout changes
+DATA_FILE = 'data.json' # Small values (e.g. elastic constants) stored with an entry
+USED_FILE = '.last_used' # Touched on every hit, its mtime orders eviction
+
+# =============================================================
+# KEYS
+# =============================================================
+
+_DIGESTS = {} # (path, size, mtime) -> sha256, so a file is hashed once per process
+
+def file_digest(path, block_bytes=1 << 24):
+    """SHA-256 of a file's contents."""
+    stat = os.stat(path)
+    memo = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    if memo not in _DIGESTS:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_bytes), b''):
+                digest.update(block)
+        _DIGESTS[memo] = digest.hexdigest()
+
+    return _DIGESTS[memo]
+
+def make_key(kind, files=(), params=None):
+    """Key of a cache entry from its kind, the contents (not names) of its input files and its parameters."""
+    description = {
+        "format": CACHE_FORMAT,
+        "kind": kind,
+        "files": [file_digest(path) for path in files],
+        "params": params or {},
+    }
+    return f"{kind}_{hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()[:32]}"
+
+# =============================================================
+# LOOKUP AND STORE
+# =============================================================
+
+def entry_path(key, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, key)
+
+def lookup(key, cache_dir=None):
+    """Path of a complete entry (None on a miss). A hit marks the entry as recently used."""
+    path = entry_path(key, cache_dir)
+    if not os.path.isdir(path):
+        return None
+
+    try:
+        os.utime(os.path.join(path, USED_FILE))
+    except FileNotFoundError:
+        return None # evicted by another job since the check
+    return path
+
+def store(key, files=None, data=None, cache_dir=None, max_bytes=None):
+    """Copy files ({name: path}) and data (JSON-serialisable dict) into a new entry and return its path.
+
+    The entry is assembled in a temporary directory and renamed into place, so concurrent jobs never see a partial
+    entry. If another job stored the same key first, its entry is kept.
+    """
+
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+
+    path = entry_path(key, cache_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, source in (files or {}).items():
+        shutil.copyfile(source, os.path.join(tmp_path, name))
+
+    with open(os.path.join(tmp_path, DATA_FILE), 'w') as f:
+        json.dump({"key": key, "created": time.time(), "data": data or {}}, f, indent=2)
+    open(os.path.join(tmp_path, USED_FILE), 'w').close()
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True) # already stored by a concurrent job
+
+    evict(max_bytes=max_bytes, cache_dir=cache_dir, keep=(key,))
+
+    return path
+
+def load_data(entry):
+    """The data dict stored with an entry."""
+    with open(os.path.join(entry, DATA_FILE)) as f:
+        return json.load(f)["data"]
+
+def fetch(entry, name, destination):
+    """Copy one cached file out of an entry (to a temporary name first, then moved into place)."""
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    shutil.copyfile(os.path.join(entry, name), tmp_path)
+    os.replace(tmp_path, destination)
+    return destination
+
+# =============================================================
+# EVICTION
+# =============================================================
+
+def entry_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+def evict(max_bytes=None, cache_dir=None, keep=()):
+    """Delete least recently used entries until the cache is under max_bytes. Returns the evicted keys."""
+
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    entries = []
+    for key in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, key)
+        if key.endswith('.tmp') or not os.path.isdir(path):
+            continue
+        try:
+            entries.append((os.path.getmtime(os.path.join(path, USED_FILE)), key, entry_bytes(path)))
+        except OSError:
+            continue # evicted by another job while scanning
+
+    total = sum(size for _, _, size in entries)
+    evicted = []
+    for _, key, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key in keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+        total -= size
+        evicted.append(key)
+
+    return evicted
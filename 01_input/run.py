@@ -4,18 +4,24 @@
 # Version: v1.0
 # Description: Python script to produce input for precipitate calculations.
 # Note: Dislocation is aligned along Z, glide plane along X axis, climb plane is Y axis.
-# Command: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif python3 01_input/run.py
+# Command: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif python3 01_input/run.py [--builder atomsk] [--field stroh] [--check]
 # =============================================================
 
 # =============================================================
 # IMPORT LIBRARIES
 # =============================================================
+import io
 import os
-import numpy as np
+import re
+import sys
+import argparse
+import itertools
+import tempfile
 import subprocess
+import numpy as np
 
-from matscipy.calculators.eam import EAM
-from matscipy.dislocation import get_elastic_constants
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '00_utils')))
+import pipeline_cache
 
 # =============================================================
 # PATH SETTINGS
@@ -37,7 +43,7 @@ POTENTIAL_FILE = os.path.join(POTENTIALS_DIR, 'malerba.fs') # Potential file
 # =============================================================
 # SIMULATION PARAMETERS
 # =============================================================
-# Lattice dimensions (angstrom)
+# Lattice dimensions (oriented unit cell repeats)
 X_LEN = 150  # LENGTH ALONG X
 Y_LEN = 30  # LENGTH ALONG Y
 Z_LEN = 30  # LENGTH ALONG Z
@@ -46,6 +52,20 @@ X_DIR = '[111]'
 Y_DIR = '[1-10]'
 Z_DIR = '[11-2]'
 
+ELEMENT = 'Fe'
+MASS = 55.845
+
+BUILDERS = ['numpy', 'atomsk']
+BUILDER = BUILDERS[0] # 'atomsk' keeps the original external chain (run in a private temporary directory)
+
+# Initial displacement field added to the merged crystals
+DISLOCATION_FIELDS = ['none', 'stroh']
+DISLOCATION_FIELD = DISLOCATION_FIELDS[0] # 'stroh' (--field stroh) adds the anisotropic elastic core and near field so 02_minimize starts close to equilibrium
+
+CHECK_TOL = 1e-4 # Position tolerance (angstrom) when comparing the numpy builder with atomsk
+
+USE_CACHE = True # Reuse elastic constants computed for the same potential file (see 00_utils/pipeline_cache.py)
+
 # =============================================================
 # FILENAMES
 # =============================================================
@@ -63,42 +83,324 @@ OUTPUT_PATH = os.path.join(OUTPUT_DIR, OUTPUT_FILENAME)
 # MAIN FUNCTION
 # =============================================================
 def main():
+    parser = argparse.ArgumentParser(description="Build the edge dislocation input for 02_minimize.")
+    parser.add_argument('--builder', choices=BUILDERS, default=BUILDER)
+    parser.add_argument('--field', choices=DISLOCATION_FIELDS, default=DISLOCATION_FIELD)
+    parser.add_argument('--check', action='store_true', help="Compare the numpy builder with the atomsk chain and exit")
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false', default=USE_CACHE)
+    args = parser.parse_args()
+
+    # Get lattice constant and elastic constants for Fe
+    alat, C11, C12, C44 = elastic_constants(args.use_cache)
+
+    if args.check:
+        check_builders(alat)
+        return None
 
     # ---------------------------
-    # Check if files are removed
+    # Define dislocation
     # ---------------------------
-    for file in [UNITCELL, TOP, BOTTOM, TMP_FILE]:
-        if os.path.exists(file):
-            os.remove(file)
+    if args.builder == 'numpy':
+        positions, box = build_edge_dislocation(alat)
+    else:
+        build_with_atomsk(alat, OUTPUT_PATH)
+        positions, box = read_lammps_data(OUTPUT_PATH)
+
+    if args.field == 'stroh':
+        positions += stroh_displacement(positions, box, alat, C11, C12, C44)
+
+    write_lammps_data(OUTPUT_PATH, positions, box)
+
+    return None
+
+# =============================================================
+# ELASTIC CONSTANTS
+# =============================================================
+
+def elastic_constants(use_cache=USE_CACHE):
+    """Lattice and cubic elastic constants of the potential, from the cache when this potential was seen before."""
+
+    key = pipeline_cache.make_key('elastic_constants', files=[POTENTIAL_FILE], params={"element": ELEMENT})
+
+    entry = pipeline_cache.lookup(key) if use_cache else None
+    if entry is not None:
+        constants = pipeline_cache.load_data(entry)
+        print(f"Elastic constants from cache {entry}")
+        return constants["alat"], constants["C11"], constants["C12"], constants["C44"]
 
     # ---------------------------
     # Load EAM potential
     # ---------------------------
+    # Imported here so the builders (and their tests) do not need matscipy
+    from matscipy.calculators.eam import EAM
+    from matscipy.dislocation import get_elastic_constants
+
     eam_calc = EAM(POTENTIAL_FILE)
 
-    # Get lattice constant and elastic constants for Fe
-    alat, C11, C12, C44 = get_elastic_constants(calculator=eam_calc, symbol="Fe", verbose=True)
+    alat, C11, C12, C44 = get_elastic_constants(calculator=eam_calc, symbol=ELEMENT, verbose=True)
 
-    # ---------------------------
-    # Define dislocation
-    # ---------------------------
+    if use_cache:
+        pipeline_cache.store(key, data={"alat": float(alat), "C11": float(C11), "C12": float(C12), "C44": float(C44)})
+
+    return alat, C11, C12, C44
+
+# =============================================================
+# NUMPY BUILDER
+# =============================================================
 
-    subprocess.run(['atomsk', '--create', 'bcc', str(alat), 'Fe', 'orient', X_DIR, Y_DIR, Z_DIR, UNITCELL])
+BCC_BASIS = np.array([[0.0, 0.0, 0.0], [0.5, 0.5, 0.5]])
 
-    subprocess.run(['atomsk', UNITCELL, '-duplicate', str(X_LEN), str(Y_LEN), str(Z_LEN), '-deform', 'X', str(0.5/X_LEN), '0.0', BOTTOM])
+def parse_direction(direction):
+    """Integer Miller indices of a direction string such as '[1-10]'."""
+    return np.array([int(index) for index in re.findall(r'-?\d', direction)])
 
-    subprocess.run(['atomsk', UNITCELL, '-duplicate', str(X_LEN+1), str(Y_LEN), str(Z_LEN), '-deform', 'X', str(-0.5/(X_LEN+1)), '0.0', TOP])
+def lattice_period(direction):
+    """Shortest BCC lattice translation along an integer direction, in units of alat.
+    d/2 is a lattice vector only when every index of d is odd (1/2<111> type)."""
+    length = np.linalg.norm(direction)
+    return 0.5 * length if np.all(direction % 2 == 1) else length
 
-    subprocess.run(['atomsk', '--merge', 'Y', '2', BOTTOM, TOP, TMP_FILE])
+def oriented_unit_cell(alat, directions=(X_DIR, Y_DIR, Z_DIR)):
+    """Atoms (n, 3) and side lengths (3,) of the smallest orthogonal BCC cell with its axes along directions."""
 
-    subprocess.run(['cp', TMP_FILE, OUTPUT_PATH])
+    miller = [parse_direction(direction) for direction in directions]
+    rotation = np.array([d / np.linalg.norm(d) for d in miller]) # rows are the new X, Y, Z in crystal axes
+    lengths = alat * np.array([lattice_period(d) for d in miller])
 
-    # ---------------------------
-    # Remove files
-    # ---------------------------
-    for file in [UNITCELL, TOP, BOTTOM, TMP_FILE]:
-        if os.path.exists(file):
-            os.remove(file)
+    # Crystal coordinates spanned by the cell corners bound the lattice sites to test
+    corners = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)]) * lengths
+    crystal_corners = corners @ rotation / alat
+    lo = np.floor(crystal_corners.min(axis=0)).astype(int) - 1
+    hi = np.ceil(crystal_corners.max(axis=0)).astype(int) + 1
+
+    grid = np.stack(np.meshgrid(*[np.arange(l, h + 1) for l, h in zip(lo, hi)], indexing='ij'), axis=-1).reshape(-1, 3)
+    sites = (grid[:, None, :] + BCC_BASIS[None, :, :]).reshape(-1, 3)
+
+    positions = alat * sites @ rotation.T
+
+    tol = 1e-8 * alat
+    positions[np.abs(positions) < tol] = 0.0
+    inside = np.all((positions >= 0.0) & (positions < lengths - tol), axis=1)
+    positions = positions[inside]
+
+    expected = int(round(2 * np.prod(lengths) / alat**3))
+    if len(positions) != expected:
+        raise RuntimeError(f"Oriented cell has {len(positions)} atoms, expected {expected}")
+
+    return positions, lengths
+
+def build_crystal(cell, lengths, repeats, strain_x=0.0):
+    """Duplicate an orthogonal cell repeats times and stretch it along X (atomsk -duplicate, -deform X strain 0.0)."""
+
+    offsets = np.stack(np.meshgrid(*[np.arange(n) for n in repeats], indexing='ij'), axis=-1).reshape(-1, 3) * lengths
+    positions = (offsets[:, None, :] + cell[None, :, :]).reshape(-1, 3)
+    box = lengths * np.asarray(repeats, dtype=float)
+
+    positions[:, 0] *= 1.0 + strain_x
+    box[0] *= 1.0 + strain_x
+
+    return positions, box
+
+def build_edge_dislocation(alat):
+    """Bottom crystal of X_LEN cells stretched and top crystal of X_LEN + 1 cells compressed to the same length,
+    stacked along Y, so the extra half plane of the top crystal forms an edge dislocation at the interface."""
+
+    cell, lengths = oriented_unit_cell(alat)
+
+    bottom, bottom_box = build_crystal(cell, lengths, (X_LEN, Y_LEN, Z_LEN), 0.5 / X_LEN)
+    top, top_box = build_crystal(cell, lengths, (X_LEN + 1, Y_LEN, Z_LEN), -0.5 / (X_LEN + 1))
+
+    top[:, 1] += bottom_box[1]
+    box = np.array([max(bottom_box[0], top_box[0]), bottom_box[1] + top_box[1], bottom_box[2]])
+
+    return np.concatenate([bottom, top]), box
+
+def write_lammps_data(path, positions, box, comment=None):
+    """Write an atomic-style LAMMPS data file for one element, formatted in memory and moved into place."""
+
+    if comment is None:
+        comment = f"{ELEMENT} oriented X={X_DIR} Y={Y_DIR} Z={Z_DIR}."
+
+    buffer = io.StringIO()
+    buffer.write(f"# {comment}\n\n")
+    buffer.write(f"{len(positions):>12d}  atoms\n")
+    buffer.write(f"{1:>12d}  atom types\n\n")
+    for length, axis in zip(box, 'xyz'):
+        buffer.write(f"{0.0:20.12f} {length:20.12f}  {axis}lo {axis}hi\n")
+    buffer.write(f"\nMasses\n\n{1:>12d} {MASS:.8f}  # {ELEMENT}\n\nAtoms # atomic\n\n")
+
+    ids = np.arange(1, len(positions) + 1)
+    np.savetxt(buffer, np.column_stack([ids, np.ones_like(ids), positions]), fmt=['%10d', '%4d', '%20.12f', '%20.12f', '%20.12f'])
+
+    # Temporary name in the output directory so jobs never see, or collide on, a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+
+    return None
+
+# =============================================================
+# ANISOTROPIC ELASTIC FIELD
+# =============================================================
+
+def cubic_stiffness(C11, C12, C44, directions=(X_DIR, Y_DIR, Z_DIR)):
+    """Stiffness tensor C_ijkl of a cubic crystal in the frame whose X, Y, Z axes are directions."""
+
+    C = np.zeros((3, 3, 3, 3))
+    for i, j, k, l in itertools.product(range(3), repeat=4):
+        C[i, j, k, l] = (C12 * (i == j) * (k == l)
+                         + C44 * ((i == k) * (j == l) + (i == l) * (j == k))
+                         + (C11 - C12 - 2.0 * C44) * (i == j == k == l))
+
+    rotation = np.array([d / np.linalg.norm(d) for d in (parse_direction(direction) for direction in directions)])
+
+    return np.einsum('ia,jb,kc,ld,abcd->ijkl', rotation, rotation, rotation, rotation, C)
+
+def stroh_eigensystem(C):
+    """Stroh roots p (3,) with Im p > 0 and matrices A, L (columns a_a, l_a) normalised so that 2 a_a . l_a = 1.
+    The line is along Z; the 2D problem is in the X-Y plane."""
+
+    Q, R, T = C[:, 0, :, 0], C[:, 0, :, 1], C[:, 1, :, 1]
+    T_inv = np.linalg.inv(T)
+
+    N = np.block([[-T_inv @ R.T, T_inv],
+                  [R @ T_inv @ R.T - Q, -R @ T_inv]])
+
+    p, xi = np.linalg.eig(N)
+    upper = np.argsort(p.imag)[3:]
+
+    p, A, L = p[upper], xi[:3, upper], xi[3:, upper]
+    norm = np.sqrt(2.0 * np.sum(A * L, axis=0))
+    A, L = A / norm, L / norm
+
+    # Re(A L^T) = I/2 holds only for a non-degenerate (anisotropic) eigensystem
+    if not np.allclose((A @ L.T).real, 0.5 * np.eye(3), atol=1e-6):
+        raise RuntimeError("Degenerate Stroh eigensystem, the crystal is too close to isotropic for this solver")
+
+    return p, A, L
+
+def periodic_dislocation_correction(positions, centre, period, p, A, L, burgers):
+    """Displacement of a row of dislocations with spacing period along X, minus its uniform far-field part.
+
+    The row solution u = (1/pi) Im[A <ln sin(pi z_a / period)> L^T b], z_a = x + p_a y, tends to a linear
+    (homogeneous strain) field away from the glide plane. That part is already supplied by the stretched and
+    compressed crystals, so only ln(1 - exp(+-2 pi i z_a / period)) is kept, which decays as exp(-2 pi |y| Im p / period)
+    and concentrates the Burgers vector into a core at centre.
+    """
+
+    dx = positions[:, 0] - centre[0]
+    dy = positions[:, 1] - centre[1]
+
+    z = dx[:, None] + p[None, :] * dy[:, None]
+    side = np.where(dy >= 0.0, 1.0, -1.0)[:, None] # choose the branch that decays on each side of the glide plane
+    g = np.log1p(-np.exp(2j * np.pi * side * z / period))
+
+    coefficients = A * (L.T @ burgers)[None, :]
+
+    return (g @ coefficients.T).imag / np.pi
+
+def stroh_displacement(positions, box, alat, C11, C12, C44):
+    """Anisotropic elastic displacement that turns the merged crystals into a compact edge dislocation.
+
+    The merge leaves perfect registry at x = 0 and a half Burgers vector misfit at the box centre, so the core
+    is placed at X/2, between the two crystals' interface planes.
+    """
+
+    p, A, L = stroh_eigensystem(cubic_stiffness(C11, C12, C44))
+
+    burgers = np.array([alat * lattice_period(parse_direction(X_DIR)), 0.0, 0.0])
+
+    interface = 0.5 * box[1] # the bottom crystal ends and the top one starts here
+    below = positions[:, 1] < interface
+    centre = (0.5 * box[0], 0.5 * (positions[below, 1].max() + positions[~below, 1].min()))
+
+    return periodic_dislocation_correction(positions, centre, box[0], p, A, L, burgers)
+
+# =============================================================
+# ATOMSK BUILDER
+# =============================================================
+
+def build_with_atomsk(alat, output_path):
+    """Original atomsk chain, run in a private temporary directory so concurrent jobs do not share files."""
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        subprocess.run(['atomsk', '--create', 'bcc', str(alat), ELEMENT, 'orient', X_DIR, Y_DIR, Z_DIR, UNITCELL], cwd=work_dir, check=True)
+
+        subprocess.run(['atomsk', UNITCELL, '-duplicate', str(X_LEN), str(Y_LEN), str(Z_LEN), '-deform', 'X', str(0.5/X_LEN), '0.0', BOTTOM], cwd=work_dir, check=True)
+
+        subprocess.run(['atomsk', UNITCELL, '-duplicate', str(X_LEN+1), str(Y_LEN), str(Z_LEN), '-deform', 'X', str(-0.5/(X_LEN+1)), '0.0', TOP], cwd=work_dir, check=True)
+
+        subprocess.run(['atomsk', '--merge', 'Y', '2', BOTTOM, TOP, TMP_FILE], cwd=work_dir, check=True)
+
+        os.replace(os.path.join(work_dir, TMP_FILE), output_path)
+
+    return None
+
+# =============================================================
+# EQUIVALENCE CHECK
+# =============================================================
+
+def read_lammps_data(path):
+    """Positions (n, 3) and box lengths (3,) of an orthogonal atomic-style data file."""
+
+    lo, hi = np.zeros(3), np.zeros(3)
+    with open(path) as f:
+        lines = f.readlines()
+
+    for i, line in enumerate(lines):
+        tokens = line.split()
+        if len(tokens) >= 4 and tokens[2:4] in (['xlo', 'xhi'], ['ylo', 'yhi'], ['zlo', 'zhi']):
+            axis = 'xyz'.index(tokens[2][0])
+            lo[axis], hi[axis] = float(tokens[0]), float(tokens[1])
+        elif len(tokens) >= 2 and tokens[1] == 'atoms':
+            natoms = int(tokens[0])
+        elif tokens and tokens[0] == 'Atoms':
+            start = i + 2
+            break
+
+    atoms = np.loadtxt(lines[start:start + natoms], usecols=(0, 2, 3, 4), ndmin=2)
+    atoms = atoms[np.argsort(atoms[:, 0])]
+
+    return atoms[:, 1:] - lo, hi - lo
+
+def compare_structures(positions, box, reference, reference_box, tol=CHECK_TOL):
+    """Largest distance from each reference atom to its match, allowing a rigid shift (periodic in X and Z)."""
+
+    from scipy.spatial import cKDTree
+
+    if len(positions) != len(reference):
+        raise AssertionError(f"Atom counts differ: {len(positions)} vs {len(reference)}")
+    if not np.allclose(box, reference_box, atol=tol):
+        raise AssertionError(f"Boxes differ: {box} vs {reference_box}")
+
+    # Align on the atom nearest the lower box corner, then wrap X and Z into the box
+    shift = positions[np.argmin(np.linalg.norm(positions, axis=1))] - reference[np.argmin(np.linalg.norm(reference, axis=1))]
+    periods = np.array([box[0], 4.0 * box[1], box[2]]) # Y is not periodic, a large period only makes the tree accept it
+
+    tree = cKDTree(np.mod(positions, periods), boxsize=periods)
+    distances, _ = tree.query(np.mod(reference + shift, periods))
+
+    return distances.max()
+
+def check_builders(alat):
+    """Build the configuration both ways and report whether they match within CHECK_TOL."""
+
+    positions, box = build_edge_dislocation(alat)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        atomsk_path = os.path.join(work_dir, OUTPUT_FILENAME)
+        build_with_atomsk(alat, atomsk_path)
+        reference, reference_box = read_lammps_data(atomsk_path)
+
+    max_distance = compare_structures(positions, box, reference, reference_box)
+
+    print(f"{len(positions)} atoms, box {box}, largest position difference {max_distance:.2e} A")
+    if max_distance > CHECK_TOL:
+        raise AssertionError(f"numpy builder differs from atomsk by {max_distance:.2e} A (tolerance {CHECK_TOL:.0e} A)")
+    print("numpy builder matches atomsk")
+
+    return None
 
 # =============================================================
 # ENTRY POINT
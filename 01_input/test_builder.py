@@ -0,0 +1,104 @@
+# =============================================================
+# NumPy Builder Tests
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Check the NumPy edge dislocation builder of 01_input/run.py, and that it matches the atomsk chain.
+# Note: The atomsk comparison is skipped when atomsk is not on the PATH.
+# Run: python3 -m pytest 01_input/test_builder.py
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import os
+import shutil
+import importlib.util
+import numpy as np
+import pytest
+
+# =============================================================
+# TEST PARAMETERS
+# =============================================================
+
+RUN_FILE = os.path.join(os.path.dirname(__file__), 'run.py')
+
+ALAT = 2.8553 # Fe lattice constant (angstrom) of malerba.fs, fixed so the tests need no potential evaluation
+REPEATS = (10, 3, 2) # Small crystal, X_LEN x Y_LEN x Z_LEN
+
+# =============================================================
+# FIXTURES
+# =============================================================
+
+@pytest.fixture(scope='module')
+def builder():
+    """01_input/run.py imported under another name (every stage has a run.py)."""
+    spec = importlib.util.spec_from_file_location('input_run', RUN_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture
+def small_builder(builder, monkeypatch):
+    """The builder with a REPEATS sized crystal."""
+    for name, value in zip(('X_LEN', 'Y_LEN', 'Z_LEN'), REPEATS):
+        monkeypatch.setattr(builder, name, value)
+    return builder
+
+# =============================================================
+# TESTS
+# =============================================================
+
+def test_oriented_unit_cell(builder):
+    positions, lengths = builder.oriented_unit_cell(ALAT)
+
+    # [111] repeats every half body diagonal, [1-10] and [11-2] every full vector
+    np.testing.assert_allclose(lengths, ALAT * np.array([np.sqrt(3) / 2, np.sqrt(2), np.sqrt(6)]))
+    assert positions.shape == (6, 3)
+    assert np.all(positions >= 0.0) and np.all(positions < lengths)
+
+    # Every pair of atoms is at least the BCC nearest neighbour distance apart, including across the cell faces
+    offsets = positions[:, None, :] - positions[None, :, :]
+    offsets -= lengths * np.round(offsets / lengths)
+    distances = np.linalg.norm(offsets, axis=-1)[~np.eye(len(positions), dtype=bool)]
+    assert distances.min() == pytest.approx(ALAT * np.sqrt(3) / 2)
+
+def test_build_crystal(builder):
+    cell, lengths = builder.oriented_unit_cell(ALAT)
+    n = REPEATS[0]
+
+    for strain in (0.5 / n, -0.5 / (n + 1)):
+        positions, box = builder.build_crystal(cell, lengths, REPEATS, strain)
+
+        assert len(positions) == len(cell) * np.prod(REPEATS)
+        np.testing.assert_allclose(box, lengths * np.array(REPEATS) * np.array([1.0 + strain, 1.0, 1.0]))
+        assert np.all(positions >= -1e-9) and np.all(positions < box)
+
+def test_build_edge_dislocation(small_builder):
+    positions, box = small_builder.build_edge_dislocation(ALAT)
+    cell, lengths = small_builder.oriented_unit_cell(ALAT)
+    n, ny, nz = REPEATS
+
+    # The top crystal holds the extra half plane, both are strained to the same X length
+    assert len(positions) == len(cell) * (2 * n + 1) * ny * nz
+    np.testing.assert_allclose(box, [(n + 0.5) * lengths[0], 2 * ny * lengths[1], nz * lengths[2]])
+
+def test_write_lammps_data_round_trip(small_builder, tmp_path):
+    positions, box = small_builder.build_edge_dislocation(ALAT)
+    path = str(tmp_path / 'edge.lmp')
+
+    small_builder.write_lammps_data(path, positions, box)
+    read_positions, read_box = small_builder.read_lammps_data(path)
+
+    np.testing.assert_allclose(read_box, box, atol=1e-10)
+    np.testing.assert_allclose(read_positions, positions, atol=1e-10)
+    assert not [f for f in os.listdir(tmp_path) if f.endswith('.tmp')]
+
+@pytest.mark.skipif(shutil.which('atomsk') is None, reason="atomsk not on the PATH")
+def test_matches_atomsk(small_builder, tmp_path):
+    positions, box = small_builder.build_edge_dislocation(ALAT)
+
+    atomsk_path = str(tmp_path / small_builder.OUTPUT_FILENAME)
+    small_builder.build_with_atomsk(ALAT, atomsk_path)
+    reference, reference_box = small_builder.read_lammps_data(atomsk_path)
+
+    assert small_builder.compare_structures(positions, box, reference, reference_box) < small_builder.CHECK_TOL
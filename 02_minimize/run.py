@@ -11,12 +11,17 @@
 # IMPORT LIBRARIES
 # =============================================================
 import os
+import sys
 import numpy as np
 import subprocess
+import traceback
 from mpi4py import MPI
 
 from lammps import lammps
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '00_utils')))
+import pipeline_cache
+
 # =============================================================
 # PATH SETTINGS
 # =============================================================
@@ -43,8 +48,12 @@ POTENTIAL_FILE = os.path.join(POTENTIALS_DIR, 'malerba.fs') # Potential file
 
 ENERGY_TOL = 1e-6 # Energy tolerance for minimization
 FORCE_TOL = 1e-8 # Force tolerance for minimization
+MAX_ITERATIONS = 1000 # Maximum minimizer iterations
+MAX_EVALUATIONS = 10000 # Maximum force evaluations
 BUFF = 2
 
+USE_CACHE = True # Reuse a minimized configuration of an identical input, potential and tolerances (see 00_utils/pipeline_cache.py)
+
 # =============================================================
 # MAIN FUNCTION
 # =============================================================
@@ -54,6 +63,33 @@ def main():
     rank = comm.Get_rank()
     size = comm.Get_size()
 
+    DUMP_PATH = os.path.join(DUMP_DIR, 'edge_dislo_100_30_40_dump')
+    OUTPUT_PATH = os.path.join(OUTPUT_DIR, 'edge_dislo_100_30_40_output.lmp')
+
+    # ---------- Reuse a cached minimization ------------------
+    cache_key = None
+    if USE_CACHE:
+        hit = None
+        if rank == 0:
+            # Any cache failure counts as a miss, rank 0 must reach the bcast or the other ranks wait forever
+            try:
+                cache_key = minimize_cache_key()
+                entry = pipeline_cache.lookup(cache_key)
+                if entry is not None:
+                    pipeline_cache.fetch(entry, 'output.lmp', OUTPUT_PATH)
+                    pipeline_cache.fetch(entry, 'dump', DUMP_PATH)
+                    print(f"Minimized configuration from cache {entry}")
+                hit = entry is not None
+            except FileNotFoundError:
+                hit = False # evicted by another job between lookup and fetch
+            except Exception:
+                traceback.print_exc()
+                print("Cache lookup failed, minimizing without it", flush=True)
+                cache_key, hit = None, False
+
+        if comm.bcast(hit, root=0):
+            return None
+
     lmp = lammps()
 
     # ---------- Initialize Simulation ------------------------
@@ -73,20 +109,32 @@ def main():
 
     lmp.cmd.compute('peratom', 'all', 'pe/atom')
 
-    lmp.cmd.minimize(ENERGY_TOL, FORCE_TOL, 1000, 10000)
-
-    DUMP_PATH = os.path.join(DUMP_DIR, 'edge_dislo_100_30_40_dump')
-    OUTPUT_PATH = os.path.join(OUTPUT_DIR, 'edge_dislo_100_30_40_output.lmp')
+    lmp.cmd.minimize(ENERGY_TOL, FORCE_TOL, MAX_ITERATIONS, MAX_EVALUATIONS)
 
     lmp.cmd.write_dump('all', 'custom', DUMP_PATH, 'id', 'x', 'y', 'z', 'c_peratom')
     lmp.cmd.write_data(OUTPUT_PATH)
 
+    if USE_CACHE and rank == 0 and cache_key is not None:
+        pipeline_cache.store(cache_key, files={'output.lmp': OUTPUT_PATH, 'dump': DUMP_PATH})
+
     return None
 
 # =============================================================
 # FUNCTIONS
 # =============================================================
 
+def minimize_cache_key():
+    """Cache key from the input configuration and potential contents and every setting that changes the result."""
+    params = {
+        "boundary": ['p', 'f', 'p'],
+        "pair_style": 'eam/fs',
+        "energy_tol": ENERGY_TOL,
+        "force_tol": FORCE_TOL,
+        "max_iterations": MAX_ITERATIONS,
+        "max_evaluations": MAX_EVALUATIONS,
+    }
+    return pipeline_cache.make_key('minimize', files=[INPUT_FILE, POTENTIAL_FILE], params=params)
+
 # =============================================================
 # ENTRY POINT
 # =============================================================
@@ -4,7 +4,7 @@
 # Version: v1.0
 # Description: Python script to produce input for void calculations.
 # Note: Dislocation is aligned along X, glide plane along Y axis.
-# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif python3 03_shear/analysis.py
+# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif python3 03_shear/analysis.py [--batch "prec_*" | --follow] [--profile]
 # =============================================================
 
 # =============================================================
@@ -13,13 +13,35 @@
 
 import os
 import re
+import sys
+import glob
+import gzip
+import json
+import shutil
+import time
+import queue
+import argparse
+import itertools
+import hashlib
+import resource
+import threading
+import contextlib
+import concurrent.futures
 import numpy as np
 from mpi4py import MPI
 import traceback
 
+# OVITO sizes its own worker pool from the visible cores, keep it within the slot SLURM gave each rank
+if 'SLURM_CPUS_PER_TASK' in os.environ:
+    os.environ.setdefault('OVITO_THREAD_COUNT', os.environ['SLURM_CPUS_PER_TASK'])
+
 from ovito.io import import_file, export_file
 from ovito.modifiers import DislocationAnalysisModifier, WignerSeitzAnalysisModifier, DeleteSelectedModifier, InvertSelectionModifier, ExpressionSelectionModifier
-from ovito.pipeline import FileSource
+from ovito.pipeline import FileSource, StaticSource
+from ovito.data import DataCollection
+
+import result_store
+from work_counter import create_work_counter, next_work_index
 
 # =============================================================
 # INITIALISE MPI
@@ -34,33 +56,136 @@ size = comm.Get_size()
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '000_data')) # Master data directory
 STAGE_DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, '03_shear')) # Stage data directory
-CASE_DIR = os.path.abspath(os.path.join(STAGE_DATA_DIR, 'prec_R30_T1000_V0.001_4773'))
+CASE_DIR = os.path.abspath(os.environ.get('SHEAR_CASE_DIR') or os.path.join(STAGE_DATA_DIR, 'prec_R30_T1000_V0.001_4773')) # SHEAR_CASE_DIR overrides
 
-for directory in [STAGE_DATA_DIR, CASE_DIR]:
-    if rank == 0:
-        try:
-            if not os.path.exists(directory):
-                raise FileNotFoundError(f"Directory does not exist: {directory}")
-        except Exception as e:
-            print(f"[Rank {rank}] Error with directory: {directory}")
-            traceback.print_exc()
-            raise
-    comm.Barrier()  # ensure all ranks wait until rank 0 finishes the check
+# Batch mode (--batch [GLOB]) analyses every case matching BATCH_PATTERN under STAGE_DATA_DIR from one global frame queue
+BATCH = '--batch' in sys.argv
+BATCH_PATTERN = '*'
+BATCH_LOG_DIR = os.path.join(STAGE_DATA_DIR, 'analysis_batch_logs') # Load balance and profile reports of batch runs
 
-DXA_DIR = os.path.join(CASE_DIR, 'dxa') # File with DXA analysis
-DXA_SUMMARY_DIR = os.path.join(CASE_DIR, 'dxa_summary') # File with DXA summary files
-DXA_ATOMS_DIR = os.path.join(CASE_DIR, 'dxa_atoms') # File with the atoms extracted by DXA
-WS_VAC_DIR = os.path.join(CASE_DIR, 'wigner_seitz_vacs') # File with wigner seitz analysis files
-WS_SIA_DIR = os.path.join(CASE_DIR, 'wigner_seitz_sias') # File with wigner seitz analysis files
-
-for directory in [DXA_DIR, DXA_SUMMARY_DIR, DXA_ATOMS_DIR, WS_VAC_DIR, WS_SIA_DIR]:
-    os.makedirs(directory, exist_ok=True)
+# Follow mode (--follow) analyses CASE_DIR while 03_shear/run.py is still writing it, the directory may not exist yet
+FOLLOW = '--follow' in sys.argv
 
 # REFERENCE FILE FOR WIGNER SEITZ ANALYSIS
 REFERENCE_DIR = os.path.abspath(os.path.join(BASE_DIR, '02_minimize', 'dump')) # Input directory
-REFERENCE_FILE = os.path.join(REFERENCE_DIR, 'edge_dislo_100_30_40_dump') # Input file
+REFERENCE_FILE = os.environ.get('SHEAR_REFERENCE_FILE') or os.path.join(REFERENCE_DIR, 'edge_dislo_100_30_40_dump') # Input file, SHEAR_REFERENCE_FILE overrides
+
+REFERENCE_MODES = ['per_rank', 'node_parse']
+REFERENCE_MODE = REFERENCE_MODES[0] # 'per_rank': each rank parses the reference, 'node_parse': one rank per node parses it and broadcasts the arrays (saves parse time only, every rank still holds a copy)
+
+def check_directories(directories):
+    """Collective: rank 0 checks that every directory exists before any rank carries on."""
+    for directory in directories:
+        if rank == 0:
+            try:
+                if not os.path.exists(directory):
+                    raise FileNotFoundError(f"Directory does not exist: {directory}")
+            except Exception as e:
+                print(f"[Rank {rank}] Error with directory: {directory}")
+                traceback.print_exc()
+                raise
+        comm.Barrier()  # ensure all ranks wait until rank 0 finishes the check
+    return None
+
+def configure_case(case_dir):
+    """Point every per-case path at case_dir and create the analysis output directories (not collective)."""
+    global CASE_DIR, DXA_DIR, DXA_SUMMARY_DIR, DXA_ATOMS_DIR, WS_VAC_DIR, WS_SIA_DIR, RESULTS_DIR, OUTPUT_DIR
+    global WS_CLUSTER_FILE, WS_CLUSTER_JOURNAL_DIR, DATA_DIR, FULL_DATA_DIR, LOG_DIR, MANIFEST_FILE, MANIFEST_JOURNAL_DIR, RUN_MARKER_FILE
+
+    CASE_DIR = os.path.abspath(case_dir)
+
+    DXA_DIR = os.path.join(CASE_DIR, 'dxa') # File with DXA analysis
+    DXA_SUMMARY_DIR = os.path.join(CASE_DIR, 'dxa_summary') # File with DXA summary files
+    DXA_ATOMS_DIR = os.path.join(CASE_DIR, 'dxa_atoms') # File with the atoms extracted by DXA
+    WS_VAC_DIR = os.path.join(CASE_DIR, 'wigner_seitz_vacs') # File with wigner seitz analysis files
+    WS_SIA_DIR = os.path.join(CASE_DIR, 'wigner_seitz_sias') # File with wigner seitz analysis files
+
+    RESULTS_DIR = os.path.join(CASE_DIR, 'results') # Consolidated DXA and WS results when OUTPUT_BACKEND is 'store'
+    OUTPUT_DIR = os.path.join(CASE_DIR, 'output') # Case outputs of 03_shear/run.py, also holds the WS cluster table
+
+    WS_CLUSTER_FILE = os.path.join(OUTPUT_DIR, 'ws_clusters.txt') # One row of point-defect statistics per frame
+    WS_CLUSTER_JOURNAL_DIR = os.path.join(CASE_DIR, 'ws_clusters.d') # Per-rank append-only rows, merged into WS_CLUSTER_FILE
+
+    DATA_DIR = os.path.abspath(os.path.join(CASE_DIR, 'dump'))
+    FULL_DATA_DIR = os.path.abspath(os.path.join(CASE_DIR, 'dump_full')) # Full-atom frames when the case dumps defects only
+    LOG_DIR = os.path.abspath(os.path.join(CASE_DIR, 'logs')) # Shear logs, also holds the analysis load balance report
+    RUN_MARKER_FILE = os.path.join(CASE_DIR, 'restarts', 'checkpoint.json') # Checkpoint marker of run.py, complete once the run finished
+
+    # MANIFEST OF COMPLETED FRAMES
+    MANIFEST_FILE = os.path.join(CASE_DIR, 'analysis_manifest.json') # Consolidated record of analysed frames
+    MANIFEST_JOURNAL_DIR = os.path.join(CASE_DIR, 'analysis_manifest.d') # Per-rank append-only logs, merged into MANIFEST_FILE
+
+    for directory in [DXA_DIR, DXA_SUMMARY_DIR, DXA_ATOMS_DIR, WS_VAC_DIR, WS_SIA_DIR, RESULTS_DIR, OUTPUT_DIR,
+                      WS_CLUSTER_JOURNAL_DIR, LOG_DIR, MANIFEST_JOURNAL_DIR]:
+        os.makedirs(directory, exist_ok=True)
+
+    return None
+
+if not BATCH:
+    # An explicit SHEAR_CASE_DIR may sit outside STAGE_DATA_DIR (e.g. benchmark scratch cases), a followed case may not exist yet
+    check_directories(([] if os.environ.get('SHEAR_CASE_DIR') else [STAGE_DATA_DIR]) + ([] if FOLLOW else [CASE_DIR]))
+    configure_case(CASE_DIR)
+
+# =============================================================
+# SCHEDULING PARAMETERS
+# =============================================================
+
+READER_MODES = ['per_file', 'streaming']
+READER_MODE = READER_MODES[1] # 'per_file': import_file per dump, 'streaming': one wildcard FileSource per rank
+
+# Dump format written by 03_shear/run.py, overridden from the case metadata.json when present
+DUMP_FORMAT = 'text'
+DUMP_PATTERN = 'dump_*' # Wildcard matching the shear dumps in DATA_DIR
+DUMP_COLUMNS = ['id', 'x', 'y', 'z', 'c_peratom', 'c_stress[4]']
+
+# 'all': every dump holds all atoms, 'defects': dumps hold defect atoms only and WS runs on the full frames in FULL_DATA_DIR
+DUMP_SELECTION = 'all'
+
+# OVITO property for each LAMMPS dump column, needed to map binary dumps
+OVITO_COLUMNS = {'id': 'Particle Identifier', 'x': 'Position.X', 'y': 'Position.Y', 'z': 'Position.Z'}
+
+SCHEDULERS = ['static', 'dynamic']
+SCHEDULER = SCHEDULERS[1] # 'static': one contiguous block per rank, 'dynamic': frames handed out on demand
+
+BATCH_SIZE = 1 # Number of frames handed to a rank per request in dynamic mode
+
+OUTPUT_BACKENDS = ['text', 'store']
+OUTPUT_BACKEND = OUTPUT_BACKENDS[0] # 'text': four files per frame, 'store': compressed npz chunks in RESULTS_DIR
+STORE_CHUNK_FRAMES = 20 # Frames buffered per rank before a store chunk is written
+
+RESUME = True # Skip frames the manifest records as complete with unchanged input and outputs present
+MANIFEST_HASH = False # Also fingerprint dumps with SHA-1 (reads every dump, size + mtime is usually enough)
+MIN_DUMP_AGE = 10.0 # Seconds since last modification before the newest dump is treated as fully written
+
+# Follow mode: rounds of analysis over the frames written so far, until the run is complete and nothing is pending
+FOLLOW_POLL = 30.0 # Seconds between scans of the dump directory when no frame is pending
+FOLLOW_TIMEOUT = 3600.0 # Stop after this many seconds without a new frame while the run is not complete (run killed or crashed)
+DUMP_CLEANUP_MODES = ['keep', 'compress', 'delete']
+DUMP_CLEANUP = DUMP_CLEANUP_MODES[0] # Raw dumps of analysed frames in follow mode: 'compress' gzips them in place (dump_N.gz), 'delete' removes them
 
-DATA_DIR = os.path.abspath(os.path.join(CASE_DIR, 'dump'))
+# Case settings read_case_metadata may override, restored before each case's metadata is read
+_METADATA_DEFAULTS = {"DUMP_FORMAT": DUMP_FORMAT, "DUMP_PATTERN": DUMP_PATTERN, "DUMP_COLUMNS": DUMP_COLUMNS, "DUMP_SELECTION": DUMP_SELECTION}
+
+# Point-defect clustering of the Wigner-Seitz vacancies and interstitials, tabulated per frame in WS_CLUSTER_FILE
+WS_CLUSTER_CUTOFF = 3.0 # Sites closer than this (angstrom, covers the first and second BCC Fe neighbours) share a cluster
+WS_CLUSTER_MAX_SIZE = 10 # Cluster size histogram bins 1..WS_CLUSTER_MAX_SIZE, the last bin counts all larger clusters
+WS_EXPORT = True # Also write the per-frame vacancy and interstitial dumps in 'text' mode (False skips most WS I/O)
+
+# 'clone': DXA and WS each work on their own copy of the frame (plus two more for the WS exports),
+# 'lean': both modify the one frame in place and outputs are written from NumPy index masks, so peak memory
+# stays near one frame. Lean runs DXA and WS one after the other, in 'threads' mode only the writes overlap.
+MEMORY_MODES = ['clone', 'lean']
+MEMORY_MODE = os.environ.get('ANALYSIS_MEMORY_MODE', MEMORY_MODES[0])
+
+# Hybrid ranks x threads: 'serial' runs DXA, WS and exports in turn, 'threads' runs DXA and WS concurrently
+# and hands exports to a background writer so the next frame's compute overlaps this frame's writes
+THREAD_MODES = ['serial', 'threads']
+THREAD_MODE = os.environ.get('ANALYSIS_THREAD_MODE', THREAD_MODES[0])
+EXPORT_QUEUE_SIZE = 8 # Exports waiting for the writer before compute blocks (each holds a filtered frame in memory)
+
+# Per-phase timers, atom counts and memory per frame, gathered into LOG_DIR/analysis_profile.json (off costs nothing)
+PROFILE = os.environ.get('ANALYSIS_PROFILE', '0') not in ('', '0') or '--profile' in sys.argv
+PROFILE_PERCENTILES = [50, 90, 99]
 
 # =============================================================
 # MAIN FUNCTION
@@ -75,66 +200,435 @@ def main():
     #--- INITIALISE VARIABLE ON ALL RANKS ---#
     dump_files = None
 
-    #--- Get files ---#
-    if rank == 0: dump_files = get_filenames(DATA_DIR)
+    read_case_metadata()
+
+    #--- Get files, keeping only those still to be analysed ---#
+    if rank == 0:
+        dump_files = get_dump_filenames(DATA_DIR)
+        n_found = len(dump_files)
+        manifest = merge_manifest()
+        dump_files = select_pending_frames(dump_files, manifest)
+        print(f"Scheduling {len(dump_files)} of {n_found} frames ({len(manifest)} already in manifest)", flush=True)
 
     #--- BROADCAST AND DISTRIBUTE WORK ---#
     dump_files = comm.bcast(dump_files, root=0)
 
-    # Each rank gets only its share of files to process
-    start, end = split_indexes(len(dump_files), rank, size)
-
-    print(f"Rank {rank} of size {size} processing files from {start} to {end}", flush=True)
+    #--- LOAD WIGNER SEITZ REFERENCE (collective in node_parse mode) ---#
+    with rank_phase('reference_load'):
+        load_reference(REFERENCE_FILE)
 
     #--- PROCESS FILES ---#
-    process_file(dump_files[start:end])
+    if THREAD_MODE == 'threads':
+        start_export_writer()
+
+    t_start = MPI.Wtime()
+
+    busy_time, n_frames = process_work(dump_files)
+
+    if THREAD_MODE == 'threads':
+        with rank_phase('export_drain'):
+            stop_export_writer() # manifest entries must be on disk before rank 0 merges them
+
+    with rank_phase('flush_results'):
+        flush_results()
 
     comm.Barrier()
 
-    if rank == 0: print("Successfully processed all files...")
+    wall_time = MPI.Wtime() - t_start
+
+    report_load_balance(busy_time, wall_time, n_frames)
+
+    if PROFILE:
+        report_profile(wall_time)
+
+    if rank == 0:
+        merge_manifest()
+        merge_ws_clusters()
+        if OUTPUT_BACKEND == 'store': result_store.write_index(RESULTS_DIR)
+        print("Successfully processed all files...")
     
     return None
 
+def main_batch(pattern=BATCH_PATTERN):
+    """Analyse the pending frames of every case matching pattern from one global (case, frame) work list."""
+
+    #--- DISCOVER CASES AND THEIR PENDING FRAMES ON RANK 0 ---#
+    case_dirs, work = None, None
+    if rank == 0:
+        case_dirs = discover_cases(pattern)
+        work = []
+        for case_dir in case_dirs:
+            configure_case(case_dir)
+            read_case_metadata()
+            dump_files = get_dump_filenames(DATA_DIR)
+            manifest = merge_manifest()
+            pending = select_pending_frames(dump_files, manifest)
+            work += [(case_dir, dump_file) for dump_file in pending]
+            print(f"{os.path.basename(case_dir)}: {len(pending)} of {len(dump_files)} frames pending", flush=True)
+        print(f"Scheduling {len(work)} frames from {len(case_dirs)} cases on {size} ranks", flush=True)
+
+    case_dirs = comm.bcast(case_dirs, root=0)
+    work = comm.bcast(work, root=0)
+    os.makedirs(BATCH_LOG_DIR, exist_ok=True)
+
+    #--- LOAD WIGNER SEITZ REFERENCE (shared by all cases, collective in node_parse mode) ---#
+    with rank_phase('reference_load'):
+        load_reference(REFERENCE_FILE)
+
+    #--- PROCESS THE GLOBAL WORK LIST ---#
+    if THREAD_MODE == 'threads':
+        start_export_writer()
+
+    t_start = MPI.Wtime()
+
+    busy_time, n_frames = process_work(work, process_case_items)
+
+    with rank_phase('flush_results'):
+        finish_case()
+
+    comm.Barrier()
+
+    wall_time = MPI.Wtime() - t_start
+
+    report_load_balance(busy_time, wall_time, n_frames, output_dir=BATCH_LOG_DIR)
+
+    if PROFILE:
+        report_profile(wall_time, output_dir=BATCH_LOG_DIR)
+
+    #--- CONSOLIDATE EACH CASE ---#
+    if rank == 0:
+        for case_dir in case_dirs:
+            configure_case(case_dir)
+            merge_manifest()
+            merge_ws_clusters()
+            if OUTPUT_BACKEND == 'store' and os.path.exists(RESULTS_DIR) and os.listdir(RESULTS_DIR):
+                result_store.write_index(RESULTS_DIR)
+        print(f"Successfully processed all files of {len(case_dirs)} cases...")
+
+    return None
+
+def main_follow():
+    """Analyse CASE_DIR while its shear run is writing it: rank 0 rescans the dump directory after every round of
+    frames, until run.py marks the run complete and no frame is left (or no new frame appears for FOLLOW_TIMEOUT)."""
+
+    #--- LOAD WIGNER SEITZ REFERENCE (collective in node_parse mode) ---#
+    with rank_phase('reference_load'):
+        load_reference(REFERENCE_FILE)
+
+    if THREAD_MODE == 'threads':
+        start_export_writer()
+
+    t_start = MPI.Wtime()
+    last_frame_time = time.time()
+
+    busy_time = 0.0
+    n_frames = 0
+    n_rounds = 0
+
+    while True:
+        #--- SCAN FOR COMPLETE FRAMES ON RANK 0 ---#
+        read_case_metadata() # run.py may have written it since the last round
+
+        scan = None
+        if rank == 0:
+            finished = run_complete()
+            manifest = merge_manifest()
+            merge_ws_clusters()
+
+            dump_files = get_dump_filenames(DATA_DIR) if os.path.isdir(DATA_DIR) else []
+            pending = select_pending_frames(dump_files, manifest, finished=finished)
+            skip = set(pending)
+            analysed = [f for f in dump_files if f in manifest and f not in skip and frame_up_to_date(f, manifest[f])]
+
+            if pending:
+                last_frame_time = time.time()
+                print(f"Round {n_rounds}: {len(pending)} new frames, {len(manifest)} in manifest", flush=True)
+
+            scan = {
+                "pending": pending,
+                "cleanup": analysed if DUMP_CLEANUP != 'keep' else [],
+                "finished": finished,
+                "timed_out": not finished and time.time() - last_frame_time > FOLLOW_TIMEOUT,
+            }
+
+        scan = comm.bcast(scan, root=0)
+
+        cleanup_dumps(scan["cleanup"])
+
+        if not scan["pending"]:
+            if scan["finished"] or scan["timed_out"]:
+                break
+            time.sleep(FOLLOW_POLL)
+            continue
+
+        #--- PROCESS THIS ROUND ---#
+        _FRAME_SOURCES.clear() # wildcard pipelines only know the dumps present when they were opened
+
+        round_busy, round_frames = process_work(scan["pending"])
+
+        busy_time += round_busy
+        n_frames += round_frames
+        n_rounds += 1
+
+        with rank_phase('flush_results'):
+            finish_case(restart_writer=True) # this round's records must be on disk before the next scan merges them
+
+        comm.Barrier()
+
+    if THREAD_MODE == 'threads':
+        with rank_phase('export_drain'):
+            stop_export_writer()
+
+    comm.Barrier()
+
+    wall_time = MPI.Wtime() - t_start
+
+    report_load_balance(busy_time, wall_time, n_frames)
+
+    if PROFILE:
+        report_profile(wall_time)
+
+    if rank == 0:
+        merge_manifest()
+        merge_ws_clusters()
+        if OUTPUT_BACKEND == 'store' and os.listdir(RESULTS_DIR): result_store.write_index(RESULTS_DIR)
+        if scan["timed_out"]:
+            print(f"No new frames for {FOLLOW_TIMEOUT:.0f} s and the run is not complete, stopping after {n_rounds} rounds")
+        else:
+            print(f"Successfully processed all files in {n_rounds} rounds...")
+
+    return None
+
+# --------------------------- SCHEDULING ---------------------------#
+
+def process_work(work, process=None):
+    """Hand the work list to process (process_file by default) in slices, statically or dynamically as SCHEDULER.
+    Returns (busy time, items processed)."""
+    process = process or process_file
+
+    if SCHEDULER == 'dynamic':
+        return process_dynamic(work, process)
+    elif SCHEDULER == 'static':
+        return process_static(work, process)
+    raise ValueError(f"Unknown scheduler: {SCHEDULER}")
+
+def process_static(work, process):
+    """Process one contiguous block of the work list per rank. Returns (busy time, items processed)."""
+
+    # Each rank gets only its share of files to process
+    start, end = split_indexes(len(work), rank, size)
+
+    print(f"Rank {rank} of size {size} processing files from {start} to {end}", flush=True)
+
+    t0 = MPI.Wtime()
+    process(work[start:end])
+
+    return MPI.Wtime() - t0, end - start
+
+def process_dynamic(work, process):
+    """Process slices of the work list handed out on demand from a shared counter. Returns (busy time, items processed)."""
+
+    win = create_work_counter(comm)
+
+    busy_time = 0.0
+    n_frames = 0
+
+    while True:
+        start = next_work_index(win, BATCH_SIZE)
+        if start >= len(work):
+            break
+        end = min(start + BATCH_SIZE, len(work))
+
+        t0 = MPI.Wtime()
+        process(work[start:end])
+        busy_time += MPI.Wtime() - t0
+        n_frames += end - start
+
+    win.Free()
+
+    print(f"Rank {rank} of size {size} processed {n_frames} files", flush=True)
+
+    return busy_time, n_frames
+
+# --------------------------- BATCH ---------------------------#
+
+_ACTIVE_CASE = None # Case this rank's per-case globals currently point at in batch mode
+
+def discover_cases(pattern):
+    """Case directories (with a dump/ directory) matching pattern, relative patterns are taken under STAGE_DATA_DIR."""
+    if not os.path.isabs(pattern):
+        pattern = os.path.join(STAGE_DATA_DIR, pattern)
+    cases = [os.path.abspath(path) for path in glob.glob(pattern) if os.path.isdir(os.path.join(path, 'dump'))]
+    return sorted(cases, key=natural_sort_key)
+
+def process_case_items(items):
+    """Process (case, frame) items. The work list is ordered by case and handed out in contiguous runs, so a rank
+    switches case rarely and keeps its per-case state (open frame sources, the store buffer) in between."""
+    for case_dir, group in itertools.groupby(items, key=lambda item: item[0]):
+        switch_case(case_dir)
+        process_file([dump_file for _, dump_file in group])
+    return None
+
+def switch_case(case_dir):
+    """Finish this rank's writes for the active case, then point the analysis at case_dir."""
+    global _ACTIVE_CASE
+    if case_dir == _ACTIVE_CASE:
+        return None
+
+    if _ACTIVE_CASE is not None:
+        finish_case(restart_writer=True)
+
+    configure_case(case_dir)
+    read_case_metadata()
+    _FRAME_SOURCES.clear() # wildcard pipelines belong to the previous case's dump directory
+    _ACTIVE_CASE = case_dir
+
+    return None
+
+def finish_case(restart_writer=False):
+    """Drain queued exports and manifest records and flush the store buffer, which all use the active case's paths."""
+    if _EXPORT_THREAD is not None:
+        stop_export_writer()
+        if restart_writer:
+            start_export_writer()
+
+    # A batch rank handed no frames never set the per-case globals (configure_case) and has nothing buffered
+    if BATCH and _ACTIVE_CASE is None:
+        return None
+
+    flush_results()
+    return None
+
+def report_load_balance(busy_time, wall_time, n_frames, output_dir=None):
+    """Gather per-rank busy/idle time on rank 0, print a summary and write it to output_dir (LOG_DIR) as JSON."""
+    stats = comm.gather({
+        "rank": rank,
+        "frames": n_frames,
+        "busy_time": busy_time,
+        "idle_time": wall_time - busy_time,
+    }, root=0)
+
+    if rank != 0:
+        return None
+
+    total_busy = sum(s["busy_time"] for s in stats)
+    speedup = total_busy / wall_time if wall_time > 0 else 0.0
+
+    summary = {
+        "scheduler": SCHEDULER,
+        "batch_size": BATCH_SIZE,
+        "n_ranks": size,
+        "wall_time": wall_time,
+        "speedup": speedup, # busy time summed over ranks / wall time, perfect = n_ranks
+        "efficiency": speedup / size,
+        "ranks": stats,
+    }
+
+    print(f"Load balance ({SCHEDULER}): speedup {speedup:.2f} on {size} ranks, efficiency {100 * speedup / size:.1f}%")
+    for s in stats:
+        print(f"  Rank {s['rank']}: {s['frames']} frames, busy {s['busy_time']:.1f} s, idle {s['idle_time']:.1f} s")
+
+    with open(os.path.join(output_dir or LOG_DIR, 'analysis_load_balance.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    return None
+
 # --------------------------- ANALYSIS ---------------------------#
 
 def process_file(dump_chunk):
 
-    input_paths = [os.path.join(DATA_DIR, dump_file) for dump_file in dump_chunk]
+    for frame, data in iter_frames(dump_chunk):
+
+        fingerprint = dump_fingerprint(frame)
+
+        # The modifiers change data in lean mode, so keep what the store and profile need from the frame
+        timestep, cell, natoms = data.attributes['Timestep'], np.array(data.cell[...]), data.particles.count
+
+        if MEMORY_MODE == 'lean':
+            # One copy of the frame: DXA and then WS modify it in place, outputs are cut from it with index masks
+            dxa_files, dxa_groups = performDXA(data)
+
+            with phase('read_full'):
+                ws_data = data if DUMP_SELECTION == 'all' else read_full_frame(os.path.basename(frame))
+            ws_files, ws_groups = performWS(ws_data) if ws_data is not None else ([], None)
+
+        elif MEMORY_MODE == 'clone':
+            with phase('clone'):
+                dxa_data = data.clone()
+
+            # Sparse (defect-only) frames have no vacant sites to find, WS needs the full frame of the same step
+            with phase('clone' if DUMP_SELECTION == 'all' else 'read_full'):
+                ws_data = data.clone() if DUMP_SELECTION == 'all' else read_full_frame(os.path.basename(frame))
 
-    for frame in input_paths:
+            if THREAD_MODE == 'threads':
+                (dxa_files, dxa_groups), (ws_files, ws_groups) = run_concurrently(performDXA, dxa_data, performWS, ws_data)
+            elif THREAD_MODE == 'serial':
+                dxa_files, dxa_groups = performDXA(dxa_data)
+                ws_files, ws_groups = performWS(ws_data) if ws_data is not None else ([], None)
+            else:
+                raise ValueError(f"Unknown thread mode: {THREAD_MODE}")
 
-        pipeline = import_file(frame)
-        data = pipeline.compute()
+        else:
+            raise ValueError(f"Unknown memory mode: {MEMORY_MODE}")
 
-        performDXA(data.clone())
-        performWS(data.clone())
-        
-        print(f"Successfully processed frame {frame}...", flush=True)
+        if ws_groups is None:
+            ws_groups = empty_ws_groups() if OUTPUT_BACKEND == 'store' else {}
+
+        with phase('record'):
+            if OUTPUT_BACKEND == 'store':
+                store_frame(os.path.basename(frame), fingerprint, timestep, cell, {**dxa_groups, **ws_groups})
+            elif _EXPORT_THREAD is not None:
+                # Queued behind this frame's exports, so the manifest never lists a frame whose files are unwritten
+                submit_export('record', record_frame, os.path.basename(frame), fingerprint, dxa_files + ws_files)
+            else:
+                record_frame(os.path.basename(frame), fingerprint, dxa_files + ws_files)
+
+        finish_frame_profile(natoms)
+
+        del data, ws_data # release this frame before the next one is read
+
+        if MEMORY_MODE == 'lean':
+            print(f"Successfully processed frame {frame} ({'frame' if _FRAME_PEAK_RESET else 'process'} peak RSS {frame_peak_rss_mb():.0f} MB)...", flush=True)
+        else:
+            print(f"Successfully processed frame {frame}...", flush=True)
 
 def performDXA(data):
 
     dxaModifier = DislocationAnalysisModifier(input_crystal_structure=DislocationAnalysisModifier.Lattice.BCC)
     
-    data.apply(dxaModifier) # Run DXA
+    with phase('dxa'):
+        data.apply(dxaModifier) # Run DXA
+
+    if MEMORY_MODE == 'lean':
+        return lean_dxa_outputs(data)
     
-    # Select normal sites
-    expModifier = ExpressionSelectionModifier(expression = 'Cluster == 1')
-    data.apply(expModifier)
+    with phase('dxa_filter'):
+        # Select normal sites
+        expModifier = ExpressionSelectionModifier(expression = 'Cluster == 1')
+        data.apply(expModifier)
 
-    # Delete Selected
-    delModifier = DeleteSelectedModifier()
-    data.apply(delModifier)
+        # Delete Selected
+        delModifier = DeleteSelectedModifier()
+        data.apply(delModifier)
 
     timestep = data.attributes['Timestep']
 
-    export_file(data, os.path.join(DXA_DIR, f'dxa_{int(timestep)}'), "ca")
+    if OUTPUT_BACKEND == 'store':
+        print(f"DXA for timestep {timestep} complete...", flush=True)
+        with phase('dxa_columns'):
+            return [], dxa_columns(data)
+
+    dxa_path = os.path.join(DXA_DIR, f'dxa_{int(timestep)}')
+    dxa_atoms_path = os.path.join(DXA_ATOMS_DIR, f'dxa_atoms_{int(timestep)}')
 
-    export_file(data, os.path.join(DXA_ATOMS_DIR, f'dxa_atoms_{int(timestep)}'), "lammps/dump",
+    export_output('export_dxa', data, dxa_path, "ca")
+
+    export_output('export_dxa_atoms', data, dxa_atoms_path, "lammps/dump",
             columns=["Particle Identifier", "Position.X", "Position.Y", "Position.Z", "c_peratom", "Cluster"])
 
     print(f"DXA for timestep {timestep} complete...", flush=True)
 
-    return None
+    return [dxa_path, dxa_atoms_path], {}
 
 def performWS(data):
 
@@ -145,34 +639,55 @@ def performWS(data):
     print(f"Number of particles: {np.sum(data.particles.count)}")
     """
 
-    # Create Wignerseitz modifier
-    wsModifier = WignerSeitzAnalysisModifier()
-    wsModifier.reference = FileSource()
-    wsModifier.reference.load(REFERENCE_FILE)
+    # Wigner-Seitz modifier with the cached reference configuration
+    wsModifier = get_ws_modifier(REFERENCE_FILE)
 
-    data.apply(wsModifier)
+    with phase('ws'):
+        data.apply(wsModifier)
 
-    occupancies = data.particles['Occupancy']
+        occupancies = np.asarray(data.particles['Occupancy'])
 
-    vac_data = data.clone()
-    sia_data = data.clone()
+    vacancies = occupancies == 0
+    interstitials = occupancies == 2
 
-    vac_selection = vac_data.particles_.create_property('Selection')
-    sia_selection = sia_data.particles_.create_property('Selection')
+    with phase('ws_clusters'):
+        positions = np.asarray(data.particles['Position'])
+        cell = np.array(data.cell[...])
+        record_ws_clusters(timestep, {**cluster_stats(positions[vacancies], cell, 'vac'), **cluster_stats(positions[interstitials], cell, 'sia')})
 
-    vac_selection[...] = (occupancies == 0)
-    sia_selection[...] = (occupancies == 2)
+    if OUTPUT_BACKEND == 'store':
+        print(f"WS for timestep {timestep} complete...", flush=True)
+        with phase('ws_columns'):
+            return [], {"ws_vacancies": site_columns(data, vacancies), "ws_interstitials": site_columns(data, interstitials)}
 
-    """
-    print(f"Number of particles selected (vac): {np.sum(vac_selection)}")
-    print(f"Number of particles selected (sia): {np.sum(sia_selection)}")
-    """
+    if not WS_EXPORT:
+        print(f"WS for timestep {timestep} complete...", flush=True)
+        return [], {}
 
-    vac_data.apply(InvertSelectionModifier())
-    sia_data.apply(InvertSelectionModifier())
+    if MEMORY_MODE == 'lean':
+        return lean_ws_outputs(data, vacancies, interstitials)
 
-    vac_data.apply(DeleteSelectedModifier())
-    sia_data.apply(DeleteSelectedModifier())
+    with phase('clone'):
+        vac_data = data.clone()
+        sia_data = data.clone()
+
+    with phase('ws_filter'):
+        vac_selection = vac_data.particles_.create_property('Selection')
+        sia_selection = sia_data.particles_.create_property('Selection')
+
+        vac_selection[...] = vacancies
+        sia_selection[...] = interstitials
+
+        """
+        print(f"Number of particles selected (vac): {np.sum(vac_selection)}")
+        print(f"Number of particles selected (sia): {np.sum(sia_selection)}")
+        """
+
+        vac_data.apply(InvertSelectionModifier())
+        sia_data.apply(InvertSelectionModifier())
+
+        vac_data.apply(DeleteSelectedModifier())
+        sia_data.apply(DeleteSelectedModifier())
 
     """
     print(f"Number of particles in vac: {vac_data.particles.count}")
@@ -180,22 +695,781 @@ def performWS(data):
     """
 
     # Export the file
-    export_file(
+    vac_path = os.path.join(WS_VAC_DIR, f'ws_vac_{timestep}')
+    sia_path = os.path.join(WS_SIA_DIR, f'ws_sia_{timestep}')
+
+    export_output(
+            'export_ws_vac',
             vac_data,
-            os.path.join(WS_VAC_DIR, f'ws_vac_{timestep}'),
+            vac_path,
             "lammps/dump",
             columns=["Particle Identifier", "Position.X", "Position.Y", "Position.Z"],
         )
 
-    export_file(
+    export_output(
+            'export_ws_sia',
             sia_data,
-            os.path.join(WS_SIA_DIR, f'ws_sia_{timestep}'),
+            sia_path,
             "lammps/dump",
             columns=["Particle Identifier", "Position.X", "Position.Y", "Position.Z"],
     )
 
     print(f"WS for timestep {timestep} complete...", flush=True)
 
+    return [vac_path, sia_path], {}
+
+# --------------------------- LEAN OUTPUTS ---------------------------#
+
+DXA_ATOM_COLUMNS = ["Particle Identifier", "Position.X", "Position.Y", "Position.Z", "c_peratom", "Cluster"]
+WS_SITE_COLUMNS = ["Particle Identifier", "Position.X", "Position.Y", "Position.Z"]
+LAMMPS_COLUMN_NAMES = {'Particle Identifier': 'id', 'Position.X': 'x', 'Position.Y': 'y', 'Position.Z': 'z'} # as OVITO's dump exporter names them
+
+def lean_dxa_outputs(data):
+    """DXA outputs of a frame without deleting its bulk atoms: the CA file is written now (WS changes data next),
+    the non-bulk atoms (Cluster != 1) are cut out as arrays for the dump writer or the store."""
+
+    timestep = data.attributes['Timestep']
+
+    with phase('dxa_filter'):
+        mask = np.asarray(data.particles['Cluster']) != 1
+
+    if OUTPUT_BACKEND == 'store':
+        print(f"DXA for timestep {timestep} complete...", flush=True)
+        with phase('dxa_columns'):
+            return [], dxa_columns(data, mask)
+
+    dxa_path = os.path.join(DXA_DIR, f'dxa_{int(timestep)}')
+    dxa_atoms_path = os.path.join(DXA_ATOMS_DIR, f'dxa_atoms_{int(timestep)}')
+
+    # The CA file holds the dislocation network and defect mesh only, so the undeleted bulk atoms do not change it
+    with phase('export_dxa'):
+        export_file(data, dxa_path, "ca")
+
+    with phase('dxa_columns'):
+        columns = masked_columns(data, mask, DXA_ATOM_COLUMNS)
+    write_output('export_dxa_atoms', write_dump, dxa_atoms_path, timestep, np.array(data.cell[...]), tuple(data.cell.pbc), columns)
+
+    print(f"DXA for timestep {timestep} complete...", flush=True)
+
+    return [dxa_path, dxa_atoms_path], {}
+
+def lean_ws_outputs(data, vacancies, interstitials):
+    """Vacancy and interstitial dumps written straight from the occupancy masks, without cloning the sites."""
+
+    timestep = data.attributes['Timestep']
+    cell, pbc = np.array(data.cell[...]), tuple(data.cell.pbc)
+
+    vac_path = os.path.join(WS_VAC_DIR, f'ws_vac_{timestep}')
+    sia_path = os.path.join(WS_SIA_DIR, f'ws_sia_{timestep}')
+
+    with phase('ws_filter'):
+        vac_columns = masked_columns(data, vacancies, WS_SITE_COLUMNS)
+        sia_columns = masked_columns(data, interstitials, WS_SITE_COLUMNS)
+
+    write_output('export_ws_vac', write_dump, vac_path, timestep, cell, pbc, vac_columns)
+    write_output('export_ws_sia', write_dump, sia_path, timestep, cell, pbc, sia_columns)
+
+    print(f"WS for timestep {timestep} complete...", flush=True)
+
+    return [vac_path, sia_path], {}
+
+def masked_columns(data, mask, names):
+    """(dump column name, values) of the particles selected by mask for OVITO column names such as 'Position.X'."""
+    columns = []
+    for name in names:
+        prop, _, component = name.partition('.')
+        values = np.asarray(data.particles[prop])[mask]
+        if component:
+            values = values[:, 'XYZ'.index(component)]
+        columns.append((LAMMPS_COLUMN_NAMES.get(name, name), values))
+    return columns
+
+def write_dump(path, timestep, cell, pbc, columns):
+    """Write columns as a LAMMPS text dump of an orthogonal cell, the layout export_file(..., "lammps/dump") produces."""
+    origin = cell[:, 3]
+    upper = origin + np.diag(cell[:, :3])
+    n_rows = len(columns[0][1]) if columns else 0
+
+    with open(path, 'w') as f:
+        f.write(f"ITEM: TIMESTEP\n{int(timestep)}\nITEM: NUMBER OF ATOMS\n{n_rows}\n")
+        f.write("ITEM: BOX BOUNDS " + " ".join('pp' if periodic else 'ff' for periodic in pbc) + "\n")
+        for lo, hi in zip(origin, upper):
+            f.write(f"{lo:.10g} {hi:.10g}\n")
+        f.write("ITEM: ATOMS " + " ".join(name for name, _ in columns) + "\n")
+        if n_rows:
+            formats = ['%d' if np.issubdtype(values.dtype, np.integer) else '%.10g' for _, values in columns]
+            np.savetxt(f, np.column_stack([values.astype(np.float64) for _, values in columns]), fmt=formats)
+
+    return None
+
+# --------------------------- THREADS ---------------------------#
+
+_COMPUTE_POOL = None # Two workers, one for DXA and one for WS of the same frame
+_EXPORT_QUEUE = None # Bounded queue of (profile record, phase, function, args, kwargs) for the writer thread
+_EXPORT_THREAD = None
+_EXPORT_ERRORS = [] # Exceptions raised in the writer, re-raised on the main thread
+
+def run_concurrently(dxa_function, dxa_data, ws_function, ws_data):
+    """Run DXA and WS on their own clones in two threads (OVITO's modifiers run in native code). WS is skipped for None."""
+    global _COMPUTE_POOL
+    if _COMPUTE_POOL is None:
+        _COMPUTE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='analysis')
+
+    dxa_future = _COMPUTE_POOL.submit(dxa_function, dxa_data)
+    ws_future = _COMPUTE_POOL.submit(ws_function, ws_data) if ws_data is not None else None
+
+    return dxa_future.result(), ws_future.result() if ws_future is not None else ([], None)
+
+def export_output(name, data, path, *args, **kwargs):
+    """export_file through the background writer when it is running, otherwise straight away. name is the profile phase."""
+    write_output(name, export_file, data, path, *args, **kwargs)
+    return None
+
+def write_output(name, function, *args, **kwargs):
+    if _EXPORT_THREAD is not None:
+        submit_export(name, function, *args, **kwargs)
+    else:
+        with phase(name):
+            function(*args, **kwargs)
+    return None
+
+def start_export_writer():
+    """Start this rank's writer thread, exports then run in submission order."""
+    global _EXPORT_QUEUE, _EXPORT_THREAD
+    _EXPORT_QUEUE = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+    _EXPORT_THREAD = threading.Thread(target=export_worker, name='analysis-export', daemon=True)
+    _EXPORT_THREAD.start()
+    return None
+
+def submit_export(name, function, *args, **kwargs):
+    """Queue one write, blocking while EXPORT_QUEUE_SIZE writes are already waiting."""
+    if _EXPORT_ERRORS:
+        raise RuntimeError(f"[Rank {rank}] Export writer failed") from _EXPORT_ERRORS[0]
+    _EXPORT_QUEUE.put((_current_frame, name, function, args, kwargs))
+    return None
+
+def export_worker():
+    while True:
+        item = _EXPORT_QUEUE.get()
+        if item is None:
+            return None
+
+        record, name, function, args, kwargs = item
+        try:
+            if not _EXPORT_ERRORS: # after a failure, drain without writing so the manifest stays consistent
+                with _timed(record["phases"], name) if record is not None else _NO_PHASE:
+                    function(*args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            _EXPORT_ERRORS.append(e)
+
+def stop_export_writer():
+    """Wait for every queued write, stop the writer and the compute pool, and raise any writer error."""
+    global _EXPORT_QUEUE, _EXPORT_THREAD, _COMPUTE_POOL
+    if _EXPORT_THREAD is not None:
+        _EXPORT_QUEUE.put(None)
+        _EXPORT_THREAD.join()
+        _EXPORT_QUEUE, _EXPORT_THREAD = None, None
+
+    if _COMPUTE_POOL is not None:
+        _COMPUTE_POOL.shutdown()
+        _COMPUTE_POOL = None
+
+    if _EXPORT_ERRORS:
+        raise RuntimeError(f"[Rank {rank}] Export writer failed") from _EXPORT_ERRORS[0]
+
+    return None
+
+# --------------------------- RESULT STORE ---------------------------#
+
+_PENDING_RECORDS = [] # (dump file, fingerprint) of frames buffered in the store but not yet on disk
+
+def dxa_columns(data, mask=None):
+    """Extract the dislocation network and the non-bulk atoms left after performDXA (or selected by mask) as store groups."""
+    segments = data.dislocations.segments
+
+    points = [np.asarray(segment.points, dtype=np.float64).reshape(-1, 3) for segment in segments]
+    rows = slice(None) if mask is None else mask
+
+    return {
+        "dxa_segments": {
+            "Segment Identifier": np.array([segment.id for segment in segments], dtype=np.int64),
+            "Burgers Vector": np.array([segment.true_burgers_vector for segment in segments], dtype=np.float64).reshape(-1, 3),
+            "Spatial Burgers Vector": np.array([segment.spatial_burgers_vector for segment in segments], dtype=np.float64).reshape(-1, 3),
+            "Cluster": np.array([segment.cluster_id for segment in segments], dtype=np.int64),
+            "Length": np.array([segment.length for segment in segments], dtype=np.float64),
+            "Point Count": np.array([len(p) for p in points], dtype=np.int64),
+        },
+        "dxa_points": {
+            "Position": np.concatenate(points) if points else np.empty((0, 3)),
+        },
+        "dxa_atoms": {
+            "Particle Identifier": np.asarray(data.particles['Particle Identifier'])[rows].astype(np.int64),
+            "Position": np.asarray(data.particles['Position'])[rows].astype(np.float64),
+            "c_peratom": np.asarray(data.particles['c_peratom'])[rows].astype(np.float64),
+            "Cluster": np.asarray(data.particles['Cluster'])[rows].astype(np.int64),
+        },
+    }
+
+def site_columns(data, mask):
+    """Identifier and position columns of the WS sites selected by mask."""
+    return {
+        "Particle Identifier": np.asarray(data.particles['Particle Identifier'])[mask].astype(np.int64),
+        "Position": np.asarray(data.particles['Position'])[mask].astype(np.float64),
+    }
+
+def empty_ws_groups():
+    """Zero-row WS groups for frames without a full dump (the store needs every group in every frame)."""
+    empty = {"Particle Identifier": np.empty(0, dtype=np.int64), "Position": np.empty((0, 3), dtype=np.float64)}
+    return {"ws_vacancies": dict(empty), "ws_interstitials": dict(empty)}
+
+def store_frame(dump_file, fingerprint, timestep, cell, groups):
+    """Buffer a frame's results in the store, writing a chunk every STORE_CHUNK_FRAMES frames."""
+    result_store.add_frame(RESULTS_DIR, timestep, cell, groups)
+    _PENDING_RECORDS.append((dump_file, fingerprint))
+
+    if result_store.buffered_frames(RESULTS_DIR) >= STORE_CHUNK_FRAMES:
+        flush_results()
+
+    return None
+
+def flush_results():
+    """Write any buffered store frames and record them in the manifest once their chunk exists."""
+    chunk_path = result_store.flush(RESULTS_DIR, rank)
+
+    if chunk_path is not None:
+        for dump_file, fingerprint in _PENDING_RECORDS:
+            record_frame(dump_file, fingerprint, [chunk_path])
+    _PENDING_RECORDS.clear()
+
+    return None
+
+# --------------------------- MANIFEST ---------------------------#
+
+def dump_fingerprint(path):
+    """Size, mtime and (optionally) SHA-1 of a dump, used to detect frames that changed since analysis."""
+    stat = os.stat(path)
+    fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    if MANIFEST_HASH:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 24), b''):
+                sha1.update(block)
+        fingerprint["sha1"] = sha1.hexdigest()
+
+    return fingerprint
+
+def record_frame(dump_file, fingerprint, outputs):
+    """Append a completed frame to this rank's journal so it survives the job being killed."""
+    entry = {
+        "dump": dump_file,
+        **fingerprint,
+        "outputs": [os.path.relpath(path, CASE_DIR) for path in outputs],
+        "completed": time.time(),
+    }
+
+    with open(os.path.join(MANIFEST_JOURNAL_DIR, f'rank_{rank}.jsonl'), 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+
+    return None
+
+def merge_manifest():
+    """Fold all rank journals into MANIFEST_FILE and return the manifest (dump file -> entry). Rank 0 only."""
+
+    manifest = {}
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE) as f:
+            manifest = json.load(f)
+
+    journals = [os.path.join(MANIFEST_JOURNAL_DIR, f) for f in get_filenames(MANIFEST_JOURNAL_DIR) if f.endswith('.jsonl')]
+
+    for journal in journals:
+        with open(journal) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # partial line from a rank killed mid-write
+                manifest[entry.pop("dump")] = entry
+
+    # Write the merged manifest atomically before dropping the journals it absorbed
+    tmp_file = MANIFEST_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_file, MANIFEST_FILE)
+
+    for journal in journals:
+        os.remove(journal)
+
+    return manifest
+
+def select_pending_frames(dump_files, manifest, finished=False):
+    """Return the dumps that are missing from the manifest, changed since analysis, or lost an output.
+
+    A running shear job may still be writing its newest dump. LAMMPS closes each dump file before it opens the next,
+    so a dump is complete once a later one has been modified, once it is MIN_DUMP_AGE old, or once the run is finished.
+    In 'defects' mode the full dump of the same step is written after the sparse one, so it must be MIN_DUMP_AGE old too.
+    """
+
+    pending = []
+    now = time.time()
+
+    mtimes = {dump_file: os.path.getmtime(os.path.join(DATA_DIR, dump_file)) for dump_file in dump_files}
+    newest = max(mtimes.values(), default=0.0)
+
+    for dump_file in dump_files:
+        # Dumps still being written are left for the next pass
+        if not finished and mtimes[dump_file] >= newest:
+            if now - mtimes[dump_file] < MIN_DUMP_AGE:
+                continue
+            full_path = os.path.join(FULL_DATA_DIR, dump_file)
+            if DUMP_SELECTION == 'defects' and os.path.exists(full_path) and now - os.path.getmtime(full_path) < MIN_DUMP_AGE:
+                continue
+
+        entry = manifest.get(dump_file)
+        if not RESUME or entry is None or not frame_up_to_date(dump_file, entry):
+            pending.append(dump_file)
+
+    return pending
+
+def frame_up_to_date(dump_file, entry):
+    """Whether a manifest entry still matches its dump and all of its outputs exist."""
+    fingerprint = dump_fingerprint(os.path.join(DATA_DIR, dump_file))
+    stale = any(entry.get(key) != value for key, value in fingerprint.items())
+    missing = any(not os.path.exists(os.path.join(CASE_DIR, output)) for output in entry["outputs"])
+    return not (stale or missing)
+
+def run_complete():
+    """Whether 03_shear/run.py has marked the case's run complete (every dump is then fully written)."""
+    try:
+        with open(RUN_MARKER_FILE) as f:
+            return bool(json.load(f).get("complete"))
+    except (OSError, json.JSONDecodeError):
+        return False
+
+def cleanup_dumps(dump_files):
+    """Compress or delete (DUMP_CLEANUP) the raw dumps of analysed frames, and their full dumps, split over the ranks.
+    Compressed dumps no longer match the dump pattern, so later scans skip them like deleted ones."""
+
+    start, end = split_indexes(len(dump_files), rank, size)
+
+    for dump_file in dump_files[start:end]:
+        paths = [os.path.join(DATA_DIR, dump_file)]
+        if DUMP_SELECTION == 'defects':
+            paths.append(os.path.join(FULL_DATA_DIR, dump_file))
+
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            if DUMP_CLEANUP == 'delete':
+                os.remove(path)
+            elif DUMP_CLEANUP == 'compress' and not path.endswith('.gz'): # 'gzip' format dumps are kept as they are
+                with open(path, 'rb') as f_in, gzip.open(path + '.gz.tmp', 'wb', compresslevel=1) as f_out:
+                    shutil.copyfileobj(f_in, f_out, 1 << 24)
+                os.replace(path + '.gz.tmp', path + '.gz')
+                os.remove(path)
+            elif DUMP_CLEANUP not in DUMP_CLEANUP_MODES:
+                raise ValueError(f"Unknown dump cleanup: {DUMP_CLEANUP}")
+
+    comm.Barrier() # no rank scans the directory while another is still rewriting it
+
+    return None
+
+# --------------------------- POINT DEFECT CLUSTERS ---------------------------#
+
+def defect_clusters(positions, cell):
+    """Cluster label of each defect site, linking sites within WS_CLUSTER_CUTOFF (periodic along X and Z)."""
+    from scipy.spatial import cKDTree
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    n_sites = len(positions)
+    if n_sites == 0:
+        return np.empty(0, dtype=np.int64)
+
+    lengths = np.diag(cell[:, :3])
+    periods = np.array([lengths[0], 4.0 * lengths[1], lengths[2]]) # Y is not periodic, a large period only makes the tree accept it
+
+    tree = cKDTree(np.mod(positions - cell[:, 3], periods), boxsize=periods)
+    pairs = tree.query_pairs(WS_CLUSTER_CUTOFF, output_type='ndarray')
+
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n_sites, n_sites))
+    return connected_components(graph, directed=False)[1]
+
+def cluster_stats(positions, cell, prefix):
+    """Count, clusters, largest cluster, size histogram and distance from the obstacle (box centre) of one defect type."""
+    labels = defect_clusters(positions, cell)
+    sizes = np.bincount(labels)
+    histogram = np.bincount(np.minimum(sizes, WS_CLUSTER_MAX_SIZE), minlength=WS_CLUSTER_MAX_SIZE + 1)[1:]
+
+    lengths = np.diag(cell[:, :3])
+    offsets = positions - (cell[:, 3] + 0.5 * lengths)
+    offsets[:, [0, 2]] = (offsets[:, [0, 2]] + 0.5 * lengths[[0, 2]]) % lengths[[0, 2]] - 0.5 * lengths[[0, 2]]
+    distances = np.linalg.norm(offsets, axis=1)
+
+    return {
+        f"{prefix}_count": len(positions),
+        f"{prefix}_clusters": len(sizes),
+        f"{prefix}_largest": int(sizes.max()) if len(sizes) else 0,
+        f"{prefix}_mean_distance": float(distances.mean()) if len(distances) else float('nan'),
+        f"{prefix}_min_distance": float(distances.min()) if len(distances) else float('nan'),
+        f"{prefix}_sizes": histogram.tolist(),
+    }
+
+def record_ws_clusters(timestep, stats):
+    """Append a frame's defect statistics to this rank's journal (rows survive the job being killed, like the manifest)."""
+    with open(os.path.join(WS_CLUSTER_JOURNAL_DIR, f'rank_{rank}.jsonl'), 'a') as f:
+        f.write(json.dumps({"timestep": int(timestep), **stats, "completed": time.time()}) + '\n')
+    return None
+
+def merge_ws_clusters():
+    """Write WS_CLUSTER_FILE from every rank journal, keeping the newest row per timestep. Rank 0 only."""
+    rows = {}
+    for journal in sorted(os.listdir(WS_CLUSTER_JOURNAL_DIR)):
+        with open(os.path.join(WS_CLUSTER_JOURNAL_DIR, journal)) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # partial line from a killed job
+                if row["timestep"] not in rows or row["completed"] >= rows[row["timestep"]]["completed"]:
+                    rows[row["timestep"]] = row
+
+    if not rows:
+        return None
+
+    scalars = ["count", "clusters", "largest", "mean_distance", "min_distance"]
+    header = ["timestep"]
+    for prefix in ("vac", "sia"):
+        header += [f"{prefix}_{name}" for name in scalars]
+        header += [f"{prefix}_size_{n}" for n in range(1, WS_CLUSTER_MAX_SIZE)] + [f"{prefix}_size_{WS_CLUSTER_MAX_SIZE}+"]
+
+    table = []
+    for timestep in sorted(rows):
+        row = rows[timestep]
+        values = [timestep]
+        for prefix in ("vac", "sia"):
+            values += [row[f"{prefix}_{name}"] for name in scalars] + list(row[f"{prefix}_sizes"])
+        table.append(values)
+
+    np.savetxt(WS_CLUSTER_FILE, np.array(table, dtype=np.float64), fmt='%.6g', header=" ".join(header))
+    print(f"WS cluster statistics for {len(table)} frames written to {WS_CLUSTER_FILE}", flush=True)
+
+    return None
+
+# --------------------------- FRAME READER ---------------------------#
+
+_FRAME_SOURCES = {} # data directory -> {"pipeline": wildcard pipeline, "frames": {dump file: frame index}}
+
+def iter_frames(dump_chunk):
+    """Yield (dump path, DataCollection) for each dump file in dump_chunk using the configured reader."""
+    for dump_file in dump_chunk:
+        frame = os.path.join(DATA_DIR, dump_file)
+        start_frame_profile(dump_file)
+
+        with phase('read'):
+            if READER_MODE == 'streaming':
+                data = read_streamed_frame(DATA_DIR, dump_file)
+            elif READER_MODE == 'per_file':
+                data = import_file(frame, **frame_import_kwargs()).compute()
+            else:
+                raise ValueError(f"Unknown reader mode: {READER_MODE}")
+
+        yield frame, data
+
+def open_frame_source(data_dir):
+    """(Re)open one wildcard pipeline over data_dir and map each dump file to its frame index."""
+    pipeline = import_file(os.path.join(data_dir, DUMP_PATTERN), **frame_import_kwargs())
+
+    # OVITO orders wildcard matches by the number in the filename, which is our natural sort order
+    matches = get_dump_filenames(data_dir)
+
+    if len(matches) != pipeline.source.num_frames:
+        print(f"[Rank {rank}] Warning: {len(matches)} files but {pipeline.source.num_frames} frames in {data_dir}", flush=True)
+
+    _FRAME_SOURCES[data_dir] = {"pipeline": pipeline, "frames": {f: i for i, f in enumerate(matches)}}
+
+    return _FRAME_SOURCES[data_dir]
+
+def read_streamed_frame(data_dir, dump_file):
+    """Compute dump_file through the rank's wildcard pipeline, falling back to import_file on a mismatch."""
+
+    source = _FRAME_SOURCES.get(data_dir)
+    if source is None or dump_file not in source["frames"]:
+        source = open_frame_source(data_dir) # first call, or dumps arrived since the last scan
+
+    frame_index = source["frames"].get(dump_file)
+    if frame_index is not None and frame_index < source["pipeline"].source.num_frames:
+        data = source["pipeline"].compute(frame_index)
+
+        # Dumps are named by timestep, so a mismatch means the two orderings disagree
+        expected = timestep_from_filename(dump_file)
+        if expected is None or int(data.attributes['Timestep']) == expected:
+            return data
+
+    print(f"[Rank {rank}] Streaming reader could not match {dump_file}, importing it directly", flush=True)
+
+    return import_file(os.path.join(data_dir, dump_file), **frame_import_kwargs()).compute()
+
+def read_full_frame(dump_file):
+    """Full-atom frame with the same name as a sparse dump_file, None when that step has no full dump."""
+    path = os.path.join(FULL_DATA_DIR, dump_file)
+    if not os.path.exists(path):
+        return None
+    return import_file(path, **frame_import_kwargs()).compute()
+
+def read_case_metadata():
+    """Pick up the dump format and atom selection of the case from the metadata.json written by 03_shear/run.py."""
+    global DUMP_FORMAT, DUMP_PATTERN, DUMP_COLUMNS, DUMP_SELECTION, FULL_DATA_DIR
+
+    globals().update(_METADATA_DEFAULTS)
+
+    metadata_path = os.path.join(LOG_DIR, 'metadata.json')
+    if not os.path.exists(metadata_path):
+        return None
+
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+
+    DUMP_FORMAT = metadata.get("dump_format", DUMP_FORMAT)
+    DUMP_PATTERN = metadata.get("dump_pattern") or DUMP_PATTERN
+    DUMP_COLUMNS = metadata.get("dump_columns", DUMP_COLUMNS)
+    DUMP_SELECTION = metadata.get("dump_selection", DUMP_SELECTION)
+    if metadata.get("full_dump_dir"):
+        FULL_DATA_DIR = os.path.join(CASE_DIR, metadata["full_dump_dir"])
+
+    return metadata
+
+def frame_import_kwargs():
+    """Extra import_file arguments for the case dump format. Binary dumps need an explicit column mapping."""
+    if DUMP_FORMAT == 'binary':
+        return {"columns": [OVITO_COLUMNS.get(column, column) for column in DUMP_COLUMNS]}
+    return {}
+
+def get_dump_filenames(dir_path):
+    """Naturally sorted dump filenames in dir_path that match DUMP_PATTERN."""
+    pattern = re.compile(re.escape(DUMP_PATTERN).replace(r'\*', r'\d+') + '$')
+    return [f for f in get_filenames(dir_path) if pattern.match(f)]
+
+# --------------------------- REFERENCE CACHE ---------------------------#
+
+_WS_MODIFIERS = {} # reference path -> WignerSeitzAnalysisModifier, built once per process
+
+def load_reference(reference_file):
+    """Load the WS reference once per process. Must be called by all ranks when REFERENCE_MODE is 'node_parse'."""
+
+    if reference_file in _WS_MODIFIERS:
+        return _WS_MODIFIERS[reference_file]
+
+    wsModifier = WignerSeitzAnalysisModifier()
+
+    if REFERENCE_MODE == 'node_parse':
+        wsModifier.reference = StaticSource(data=load_node_reference(reference_file))
+    elif REFERENCE_MODE == 'per_rank':
+        wsModifier.reference = FileSource()
+        wsModifier.reference.load(reference_file)
+    else:
+        raise ValueError(f"Unknown reference mode: {REFERENCE_MODE}")
+
+    _WS_MODIFIERS[reference_file] = wsModifier
+
+    return wsModifier
+
+def get_ws_modifier(reference_file):
+    """Return the cached Wigner-Seitz modifier for reference_file, loading it on first use."""
+    if reference_file not in _WS_MODIFIERS:
+        if REFERENCE_MODE == 'node_parse':
+            raise RuntimeError(f"Reference {reference_file} must be loaded collectively with load_reference() in node_parse mode")
+        load_reference(reference_file)
+    return _WS_MODIFIERS[reference_file]
+
+def load_node_reference(reference_file):
+    """Parse the reference on one rank per node and broadcast its sites to the other ranks of the node.
+    This saves the repeated parse only: each rank builds its own DataCollection, so memory per rank is unchanged."""
+
+    node_comm = comm.Split_type(MPI.COMM_TYPE_SHARED)
+
+    reference = None
+    if node_comm.Get_rank() == 0:
+        ref = import_file(reference_file).compute()
+        reference = {
+            "positions": np.ascontiguousarray(ref.particles['Position'], dtype=np.float64),
+            "identifiers": np.ascontiguousarray(ref.particles['Particle Identifier'], dtype=np.int64),
+            "cell": np.array(ref.cell[...]),
+            "pbc": tuple(ref.cell.pbc),
+        }
+        del ref
+    reference = node_comm.bcast(reference, root=0)
+    node_comm.Free()
+
+    data = DataCollection()
+    data.create_cell(reference["cell"], pbc=reference["pbc"])
+    particles = data.create_particles(count=len(reference["positions"]))
+    particles.create_property('Position', data=reference["positions"])
+    particles.create_property('Particle Identifier', data=reference["identifiers"])
+
+    if rank == 0: print(f"Loaded WS reference {reference_file} ({len(reference['positions'])} sites) once per node", flush=True)
+
+    return data
+
+# --------------------------- PROFILING ---------------------------#
+
+_NO_PHASE = contextlib.nullcontext() # Shared no-op returned by phase() when PROFILE is off
+_FRAME_PROFILES = [] # One record per processed frame: name, atom count, RSS and seconds per phase
+_RANK_PHASES = {} # Once-per-rank phases such as the reference load, in seconds
+_current_frame = None
+
+@contextlib.contextmanager
+def _timed(record, name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record[name] = record.get(name, 0.0) + time.perf_counter() - t0
+
+def phase(name):
+    """Time a block as one phase of the current frame (repeated phases add up). A shared no-op when PROFILE is off."""
+    if not PROFILE or _current_frame is None:
+        return _NO_PHASE
+    return _timed(_current_frame["phases"], name)
+
+def rank_phase(name):
+    """Time a block that runs once per rank rather than per frame."""
+    if not PROFILE:
+        return _NO_PHASE
+    return _timed(_RANK_PHASES, name)
+
+def start_frame_profile(dump_file):
+    global _current_frame
+    if PROFILE or MEMORY_MODE == 'lean':
+        reset_frame_peak_rss()
+    if PROFILE:
+        _current_frame = {"case": os.path.basename(CASE_DIR), "frame": dump_file, "rank": rank, "phases": {}}
+    return None
+
+def finish_frame_profile(natoms):
+    """Close the current frame record with its atom count, the rank's current RSS and its peak RSS during the frame."""
+    global _current_frame
+    if not PROFILE or _current_frame is None:
+        return None
+
+    _current_frame["natoms"] = int(natoms)
+    _current_frame["rss_mb"] = current_rss_mb()
+    _current_frame["peak_rss_mb"] = frame_peak_rss_mb()
+    _FRAME_PROFILES.append(_current_frame)
+    _current_frame = None
+
+    return None
+
+def current_rss_mb():
+    """Resident set size now, from /proc (Linux), in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB. ru_maxrss (kB on Linux) follows VmHWM, which
+    reset_frame_peak_rss clears, so the peaks seen before each reset are kept as well."""
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, _PROCESS_PEAK_MB)
+
+_FRAME_PEAK_RESET = False # Whether the kernel accepted the last reset of VmHWM
+_PROCESS_PEAK_MB = 0.0 # Largest VmHWM seen before a reset
+
+def read_vmhwm_mb():
+    """High-water mark of the resident set (VmHWM) from /proc (Linux) in MB, None if unavailable."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except (OSError, ValueError):
+        pass
+    return None
+
+def reset_frame_peak_rss():
+    """Reset the high-water mark so frame_peak_rss_mb covers only what follows (Linux >= 4.0)."""
+    global _FRAME_PEAK_RESET, _PROCESS_PEAK_MB
+    _PROCESS_PEAK_MB = max(_PROCESS_PEAK_MB, read_vmhwm_mb() or 0.0)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        _FRAME_PEAK_RESET = True
+    except OSError:
+        _FRAME_PEAK_RESET = False
+    return None
+
+def frame_peak_rss_mb():
+    """Peak RSS in MB since reset_frame_peak_rss, or the process peak where the reset is not supported."""
+    hwm = read_vmhwm_mb() if _FRAME_PEAK_RESET else None
+    return hwm if hwm is not None else peak_rss_mb()
+
+def summarise_phases(records):
+    """Count, total, mean and percentiles (PROFILE_PERCENTILES) of each phase's per-frame seconds."""
+    phases = sorted({name for r in records for name in r["phases"]})
+    summary = {}
+    for name in phases:
+        times = np.array([r["phases"].get(name, 0.0) for r in records])
+        summary[name] = {
+            "count": len(times),
+            "total": float(times.sum()),
+            "mean": float(times.mean()),
+            **{f"p{p}": float(np.percentile(times, p)) for p in PROFILE_PERCENTILES},
+            "max": float(times.max()),
+        }
+    return summary
+
+def report_profile(wall_time, output_dir=None):
+    """Gather every rank's frame records on rank 0 and write per-phase and per-rank summaries to output_dir (LOG_DIR)."""
+
+    gathered = comm.gather({"rank": rank, "frames": _FRAME_PROFILES, "rank_phases": _RANK_PHASES, "peak_rss_mb": peak_rss_mb()}, root=0)
+    if rank != 0:
+        return None
+
+    output_dir = output_dir or LOG_DIR
+    records = [r for g in gathered for r in g["frames"]]
+    natoms = np.array([r["natoms"] for r in records]) if records else np.zeros(1)
+
+    report = {
+        "wall_time": wall_time,
+        "n_ranks": size,
+        "n_frames": len(records),
+        "reader_mode": READER_MODE,
+        "scheduler": SCHEDULER,
+        "thread_mode": THREAD_MODE,
+        "output_backend": OUTPUT_BACKEND,
+        "dump_selection": DUMP_SELECTION,
+        "natoms": {"min": int(natoms.min()), "mean": float(natoms.mean()), "max": int(natoms.max())},
+        "phases": summarise_phases(records),
+        "ranks": [{
+            "rank": g["rank"],
+            "frames": len(g["frames"]),
+            "peak_rss_mb": g["peak_rss_mb"],
+            "rank_phases": g["rank_phases"],
+            "phases": summarise_phases(g["frames"]),
+        } for g in gathered],
+    }
+
+    with open(os.path.join(output_dir, 'analysis_profile.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    # One row per frame for plotting phase time against atom count or memory
+    phases = sorted(report["phases"])
+    with open(os.path.join(output_dir, 'analysis_profile_frames.csv'), 'w') as f:
+        f.write(",".join(["rank", "case", "frame", "natoms", "rss_mb", "peak_rss_mb", *phases]) + "\n")
+        for r in records:
+            f.write(",".join([str(r["rank"]), r["case"], r["frame"], str(r["natoms"]), f"{r['rss_mb']:.1f}", f"{r['peak_rss_mb']:.1f}",
+                              *(f"{r['phases'].get(name, 0.0):.6f}" for name in phases)]) + "\n")
+
+    print(f"\nAnalysis profile ({len(records)} frames, {size} ranks)")
+    print(f"{'phase':>18} {'total (s)':>10} {'mean (s)':>9} " + " ".join(f"{f'p{p} (s)':>9}" for p in PROFILE_PERCENTILES))
+    for name, stats in report["phases"].items():
+        print(f"{name:>18} {stats['total']:10.2f} {stats['mean']:9.4f} " + " ".join(f"{stats[f'p{p}']:9.4f}" for p in PROFILE_PERCENTILES))
+    print(f"Profile written to {os.path.join(output_dir, 'analysis_profile.json')}", flush=True)
+
     return None
 
 # --------------------------- UTILITIES ---------------------------#
@@ -217,6 +1491,11 @@ def get_filenames(dir_path):
     files = [f for f in os.listdir(dir_path) if os.path.isfile(os.path.join(dir_path, f))]
     return sorted(files, key=natural_sort_key)
 
+def timestep_from_filename(filename):
+    """Return the timestep encoded in a dump filename such as dump_1200, or None."""
+    match = re.search(r'(\d+)', filename)
+    return int(match.group(1)) if match else None
+
 def natural_sort_key(s):
     # Split the string into digit and non-digit parts, convert digits to int
     return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', s)]
@@ -239,4 +1518,17 @@ def split_indexes(n_files, rank, size):
 
 if __name__ == "__main__":
 
-        main()
\ No newline at end of file
+        parser = argparse.ArgumentParser(description="DXA and Wigner-Seitz analysis of shear case dumps.")
+        parser.add_argument('--batch', nargs='?', const=BATCH_PATTERN, metavar='GLOB',
+                            help="Analyse every case matching GLOB (default all cases under STAGE_DATA_DIR) from one frame queue")
+        parser.add_argument('--follow', action='store_true',
+                            help="Analyse the case while 03_shear/run.py is still writing it, until its run is complete")
+        parser.add_argument('--profile', action='store_true', help="Per-phase timing report (same as ANALYSIS_PROFILE=1)")
+        args = parser.parse_args()
+
+        if args.batch is not None:
+            main_batch(args.batch)
+        elif args.follow:
+            main_follow()
+        else:
+            main()
\ No newline at end of file
@@ -0,0 +1,315 @@
+# =============================================================
+# DXA Dislocation Line Trajectory Reduction
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Parse a case's DXA line output into NumPy arrays and reduce it to line position, velocity, bow-out, length and pinning time series.
+# Note: Reads the dxa_<timestep> CA files, or the result store when the case was analysed with OUTPUT_BACKEND 'store'. Frames are split over MPI ranks.
+# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif mpirun.openmpi -np 4 /opt/venv/bin/python3 03_shear/dislocation_lines.py 000_data/03_shear/<case>
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import os
+import re
+import json
+import itertools
+import argparse
+import numpy as np
+from mpi4py import MPI
+
+import result_store
+
+# =============================================================
+# INITIALISE MPI
+# =============================================================
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+
+# =============================================================
+# REDUCTION PARAMETERS
+# =============================================================
+
+SOURCES = ['auto', 'ca', 'store']
+SOURCE = SOURCES[0] # 'auto': the result store when the case has one, otherwise the CA files
+
+CA_PREFIX = 'dxa_' # CA files written by analysis.py performDXA, named by timestep
+
+# Geometry of 01_input: glide along X, glide plane normal along Y, line along Z
+GLIDE_AXIS = 0
+LINE_AXIS = 2
+
+Z_BINS = 20 # Bins along the line for the bow-out profile, as in the in-situ tracker of 03_shear/run.py
+PIN_SKIN = 4.0 # A line point within obstacle radius + PIN_SKIN (angstrom, in the glide plane) counts as contact
+
+OUTPUT_NAME = 'dislocation_lines.npz'
+
+# =============================================================
+# MAIN FUNCTION
+# =============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Dislocation line trajectory of a shear case from its DXA output.")
+    parser.add_argument('case_dir', help="Case directory under 000_data/03_shear")
+    parser.add_argument('--source', choices=SOURCES, default=SOURCE)
+    args = parser.parse_args()
+
+    case_dir = os.path.abspath(args.case_dir)
+    t0 = MPI.Wtime()
+
+    #--- LIST FRAMES ON RANK 0 ---#
+    frames = None
+    if rank == 0:
+        frames = list_frames(case_dir, args.source)
+        print(f"Reducing {len(frames[1])} DXA frames from the {frames[0]} output on {size} ranks", flush=True)
+    source, steps = comm.bcast(frames, root=0)
+
+    #--- PARSE AND MEASURE THIS RANK'S SHARE ---#
+    metadata = read_metadata(case_dir)
+    start, end = split_indexes(len(steps), rank, size)
+
+    local = [read_frame(case_dir, source, step) for step in steps[start:end]]
+    local = [(step, lines, line_measures(lines, metadata["obstacle_radius"])) for step, lines in zip(steps[start:end], local)]
+
+    gathered = comm.gather(local, root=0)
+
+    #--- TIME SERIES ON RANK 0 ---#
+    if rank == 0:
+        frames = [frame for chunk in gathered for frame in chunk]
+        output_path = os.path.join(case_dir, 'output', OUTPUT_NAME)
+        series = write_trajectory(output_path, frames, metadata["dt"])
+
+        print(f"Reduced {len(frames)} frames in {MPI.Wtime() - t0:.2f} s")
+        print(f"Pinned at steps {series['pin_steps'].tolist()}, unpinned at steps {series['unpin_steps'].tolist()}")
+        print(f"Dislocation line trajectory written to {output_path}")
+
+    return None
+
+# =============================================================
+# FRAME SOURCES
+# =============================================================
+
+def list_frames(case_dir, source):
+    """(source, sorted timesteps) of the frames with DXA output."""
+    store_dir = os.path.join(case_dir, 'results')
+    has_store = os.path.exists(os.path.join(store_dir, result_store.INDEX_FILE))
+
+    if source == 'store' or (source == 'auto' and has_store):
+        return 'store', result_store.timesteps(store_dir).tolist()
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source: {source}")
+
+    dxa_dir = os.path.join(case_dir, 'dxa')
+    steps = [int(name[len(CA_PREFIX):]) for name in os.listdir(dxa_dir) if re.fullmatch(rf'{CA_PREFIX}\d+', name)]
+    return 'ca', sorted(steps)
+
+def read_frame(case_dir, source, step):
+    """Line arrays of one frame: {"cell", "segment_ids", "burgers", "point_counts", "points"}."""
+    if source == 'store':
+        store_dir = os.path.join(case_dir, 'results')
+        segments = result_store.load_frame(store_dir, step, 'dxa_segments', columns=['Segment Identifier', 'Burgers Vector', 'Point Count'])
+        return {
+            "cell": result_store.load_cell(store_dir, step),
+            "segment_ids": segments['Segment Identifier'],
+            "burgers": segments['Burgers Vector'],
+            "point_counts": segments['Point Count'],
+            "points": result_store.load_frame(store_dir, step, 'dxa_points')['Position'],
+        }
+    return read_ca_file(os.path.join(case_dir, 'dxa', f'{CA_PREFIX}{step}'))
+
+def read_ca_file(path):
+    """Parse the cell and the DISLOCATIONS section of an OVITO CA file, stopping before the (large) defect mesh.
+
+    Each segment is written as its id, local Burgers vector, cluster id and point count, followed by one
+    line per point (x y z, plus the core size when OVITO computed it). The file is read line by line up to
+    DISLOCATION_JUNCTIONS or DEFECT_MESH, point lines are collected in blocks and converted by one NumPy call.
+    """
+
+    cell = np.zeros((3, 4))
+    found_cell = set()
+    n_segments = 0
+
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(b'SIMULATION_CELL_ORIGIN'):
+                cell[:, 3] = np.array(line.split()[1:4], dtype=np.float64)
+                found_cell.add('origin')
+            elif line.startswith(b'SIMULATION_CELL_MATRIX'):
+                cell[:, :3] = np.array(b' '.join(itertools.islice(f, 3)).split(), dtype=np.float64).reshape(3, 3)
+                found_cell.add('matrix')
+            elif line.startswith(b'DISLOCATIONS'):
+                n_segments = int(line.split()[1])
+                break
+            elif line.startswith((b'DISLOCATION_JUNCTIONS', b'DEFECT_MESH')):
+                break
+
+        if len(found_cell) < 2:
+            raise ValueError(f"No simulation cell in {path}")
+        if n_segments == 0:
+            return empty_lines(cell)
+
+        segment_ids = np.empty(n_segments, dtype=np.int64)
+        burgers = np.empty((n_segments, 3))
+        point_counts = np.empty(n_segments, dtype=np.int64)
+        point_lines = []
+
+        for s in range(n_segments):
+            segment_ids[s] = int(next(f))
+            burgers[s] = np.array(next(f).split(), dtype=np.float64)
+            next(f) # cluster id
+            point_counts[s] = int(next(f))
+            point_lines.extend(itertools.islice(f, int(point_counts[s])))
+
+    n_columns = len(point_lines[0].split()) if point_lines else 3
+    values = np.fromstring(b''.join(point_lines).decode(), sep=' ')
+
+    return {
+        "cell": cell,
+        "segment_ids": segment_ids,
+        "burgers": burgers,
+        "point_counts": point_counts,
+        "points": values.reshape(-1, n_columns)[:, :3],
+    }
+
+def empty_lines(cell):
+    return {
+        "cell": cell,
+        "segment_ids": np.empty(0, dtype=np.int64),
+        "burgers": np.empty((0, 3)),
+        "point_counts": np.empty(0, dtype=np.int64),
+        "points": np.empty((0, 3)),
+    }
+
+def read_metadata(case_dir):
+    with open(os.path.join(case_dir, 'logs', 'metadata.json')) as f:
+        metadata = json.load(f)
+    return {"dt": metadata["dt"], "obstacle_radius": metadata["obstacle_radius"]}
+
+# =============================================================
+# REDUCTION
+# =============================================================
+
+def line_measures(lines, obstacle_radius):
+    """Periodic mean glide position, extremes, bow-out, total length and obstacle contact of one frame's lines.
+
+    DXA points are unwrapped, so positions are averaged on the circle of the periodic glide direction and the
+    bow-out is the spread of the per-bin mean positions along the line, as in 03_shear/run.py line_profile.
+    """
+
+    points, counts, cell = lines["points"], lines["point_counts"], lines["cell"]
+    origin = cell[:, 3]
+    lengths = np.diag(cell[:, :3])
+
+    # Line length from consecutive points of the same segment
+    steps = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    same_segment = np.ones(len(steps), dtype=bool)
+    same_segment[np.cumsum(counts)[:-1] - 1] = False
+    length = float(steps[same_segment].sum()) if len(steps) else 0.0
+
+    if len(points) == 0:
+        return {"theta": np.nan, "x_mean": np.nan, "x_min": np.nan, "x_max": np.nan, "bow_out": np.nan, "length": 0.0, "contact": False}
+
+    lx, lz = lengths[GLIDE_AXIS], lengths[LINE_AXIS]
+    x = points[:, GLIDE_AXIS] - origin[GLIDE_AXIS]
+    z = (points[:, LINE_AXIS] - origin[LINE_AXIS]) % lz
+
+    theta = 2.0 * np.pi * x / lx
+    theta_mean = np.arctan2(np.mean(np.sin(theta)), np.mean(np.cos(theta)))
+    x_mean = origin[GLIDE_AXIS] + lx * (theta_mean / (2.0 * np.pi) % 1.0)
+
+    bins = np.clip((z / lz * Z_BINS).astype(int), 0, Z_BINS - 1)
+    counts_z = np.bincount(bins, minlength=Z_BINS)
+    sin_bins = np.bincount(bins, weights=np.sin(theta), minlength=Z_BINS)
+    cos_bins = np.bincount(bins, weights=np.cos(theta), minlength=Z_BINS)
+
+    filled = counts_z > 0
+    x_bins = origin[GLIDE_AXIS] + lx * (np.arctan2(sin_bins[filled], cos_bins[filled]) / (2.0 * np.pi) % 1.0)
+    offsets = (x_bins - x_mean + 0.5 * lx) % lx - 0.5 * lx
+
+    # Contact: any point near the obstacle (at the box centre) in the glide plane, both directions periodic
+    centre = origin + 0.5 * lengths
+    dx = (points[:, GLIDE_AXIS] - centre[GLIDE_AXIS] + 0.5 * lx) % lx - 0.5 * lx
+    dz = (points[:, LINE_AXIS] - centre[LINE_AXIS] + 0.5 * lz) % lz - 0.5 * lz
+    contact = bool(np.any(dx**2 + dz**2 < (obstacle_radius + PIN_SKIN)**2))
+
+    return {
+        "theta": float(theta_mean),
+        "x_mean": float(x_mean),
+        "x_min": float(x_mean + offsets.min()),
+        "x_max": float(x_mean + offsets.max()),
+        "bow_out": float(offsets.max() - offsets.min()),
+        "length": length,
+        "contact": contact,
+    }
+
+def write_trajectory(output_path, frames, dt):
+    """Sort frames by timestep, add velocity and pin/unpin steps, and save series and line arrays in one npz."""
+
+    frames = sorted(frames, key=lambda frame: frame[0])
+    steps = np.array([frame[0] for frame in frames], dtype=np.int64)
+    measures = [frame[2] for frame in frames]
+    lines = [frame[1] for frame in frames]
+
+    series = {key: np.array([m[key] for m in measures]) for key in ("x_mean", "x_min", "x_max", "bow_out", "length", "contact")}
+
+    # Unwrap the periodic mean position so the line can pass the box boundary any number of times
+    glide_length = np.array([line["cell"][GLIDE_AXIS, GLIDE_AXIS] for line in lines])
+    theta = np.array([m["theta"] for m in measures])
+    valid = np.isfinite(theta)
+    x_unwrapped = np.full(len(steps), np.nan)
+    if valid.any():
+        x_unwrapped[valid] = series["x_mean"][valid][0] + np.unwrap(theta[valid] - theta[valid][0]) * glide_length[valid] / (2.0 * np.pi)
+
+    time_ps = steps * dt
+    velocity = np.full(len(steps), np.nan)
+    if valid.sum() >= 2:
+        velocity[valid] = np.gradient(x_unwrapped[valid], time_ps[valid]) # angstrom / ps
+
+    # Pinning events are the contact switching on and off
+    contact = series["contact"].astype(bool)
+    change = np.diff(contact.astype(np.int8))
+    pin_steps = steps[1:][change == 1]
+    unpin_steps = steps[1:][change == -1]
+    if len(contact) and contact[0]:
+        pin_steps = np.concatenate([steps[:1], pin_steps])
+
+    point_counts = [line["point_counts"] for line in lines]
+
+    series.update({
+        "timesteps": steps,
+        "time": time_ps,
+        "x_unwrapped": x_unwrapped,
+        "velocity": velocity,
+        "pin_steps": pin_steps,
+        "unpin_steps": unpin_steps,
+        "n_segments": np.array([len(c) for c in point_counts], dtype=np.int64),
+        # Ragged line data, frame i has segments segment_offsets[i]:segment_offsets[i + 1]
+        "cells": np.array([line["cell"] for line in lines]).reshape(-1, 3, 4),
+        "segment_offsets": np.concatenate([[0], np.cumsum([len(c) for c in point_counts])]).astype(np.int64),
+        "segment_ids": np.concatenate([line["segment_ids"] for line in lines]) if lines else np.empty(0, dtype=np.int64),
+        "burgers": np.concatenate([line["burgers"] for line in lines]).reshape(-1, 3) if lines else np.empty((0, 3)),
+        "point_counts": np.concatenate(point_counts) if lines else np.empty(0, dtype=np.int64),
+        "points": np.concatenate([line["points"] for line in lines]).reshape(-1, 3) if lines else np.empty((0, 3)),
+    })
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    np.savez_compressed(output_path, **series)
+
+    return series
+
+# =============================================================
+# UTILITIES
+# =============================================================
+
+def split_indexes(n_items, rank, size):
+    """Contiguous [start, end) share of n_items for rank."""
+    chunk_size, remainder = divmod(n_items, size)
+    start = rank * chunk_size + min(rank, remainder)
+    return start, start + chunk_size + (1 if rank < remainder else 0)
+
+# =============================================================
+# ENTRY POINT
+# =============================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# =============================================================
+# LAMMPS Log Parser and Stress-Strain Reduction
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Stream-parse thermo output of log.lammps into NumPy arrays and reduce it to a stress-strain curve.
+# Note: Reads fixed-size byte chunks, so memory is bounded by the thermo rows kept, not the log size.
+# Run: python3 03_shear/lammps_log.py 000_data/03_shear/<case> [--follow]
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import io
+import os
+import re
+import json
+import time
+import argparse
+import warnings
+import numpy as np
+
+# =============================================================
+# PARSER PARAMETERS
+# =============================================================
+
+CHUNK_BYTES = 1 << 26 # Bytes read per chunk (64 MB)
+POLL_INTERVAL = 5.0 # Seconds between checks for new output when following a running log
+FOLLOW_TIMEOUT = 3600.0 # Stop following after this many seconds without new output
+
+SHEAR_COLUMN = 'c_press_comp[4]' # pxy of the pressure compute defined in 03_shear/run.py
+BAR_TO_MPA = 0.1 # LAMMPS metal units report pressure in bar
+
+# =============================================================
+# THERMO PARSING
+# =============================================================
+
+# Any line whose first non-blank character is a letter ends a run of numeric thermo rows
+TEXT_LINE = re.compile(rb'\n[ \t]*[A-Za-z][^\n]*')
+
+def iter_thermo(path, columns=None, chunk_bytes=CHUNK_BYTES, follow=False, poll=POLL_INTERVAL, timeout=FOLLOW_TIMEOUT):
+    """Yield (columns, rows) for each run of thermo lines in the log, rows as an (n, len(columns)) array.
+
+    columns selects and orders the thermo columns returned; blocks missing any of them are skipped.
+    Text lines are located with a compiled regex and the numeric regions between them are converted
+    by np.loadtxt in one call, so no Python work is done per thermo row. With follow=True the generator
+    waits for new output until LAMMPS prints 'Total wall time' or nothing is appended for timeout seconds.
+    """
+
+    block_columns = None
+    usecols = None
+    finished = False
+    tail = b'\n'
+    idle = 0.0
+
+    # Numeric regions are collected while the column layout stays the same and parsed together,
+    # so short runs (e.g. chunked runs) do not pay the np.loadtxt call overhead per block
+    pending = []
+    pending_layout = None
+    layouts = {} # header line -> (columns, usecols), chunked runs repeat the same header many times
+
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk_bytes)
+
+            if not block:
+                if not follow or finished or idle >= timeout:
+                    break
+                time.sleep(poll)
+                idle += poll
+                continue
+            idle = 0.0
+
+            # Only parse complete lines; the buffer always starts at a newline so TEXT_LINE sees the first line
+            buf = tail + block
+            cut = buf.rfind(b'\n')
+            buf, tail = buf[:cut], buf[cut:]
+
+            pos = 0
+            for match in TEXT_LINE.finditer(buf):
+                if usecols is not None and match.start() > pos:
+                    pending.append(buf[pos:match.start()])
+
+                line = match.group().strip()
+                if line.startswith(b'Step'):
+                    if line not in layouts:
+                        layouts[line] = thermo_layout(line, columns)
+                    block_columns, usecols = layouts[line]
+
+                    if usecols is not None and (block_columns, usecols) != pending_layout:
+                        if pending:
+                            yield from parse_pending(pending, pending_layout)
+                        pending = []
+                        pending_layout = (block_columns, usecols)
+                elif line.startswith(b'Loop time'):
+                    usecols = None
+                elif line.startswith(b'Total wall time'):
+                    finished = True
+                # Anything else (WARNING, memory usage, ...) is skipped without leaving the thermo block
+
+                pos = match.end()
+
+            if usecols is not None and pos < len(buf):
+                pending.append(buf[pos:])
+
+            if pending:
+                yield from parse_pending(pending, pending_layout)
+            pending = []
+
+    return None
+
+def thermo_layout(header, columns):
+    """Column names of a thermo header and the indices of the requested columns (None if any is missing)."""
+    block_columns = tuple(token.decode() for token in header.split())
+    if columns is None:
+        return block_columns, tuple(range(len(block_columns)))
+    if all(column in block_columns for column in columns):
+        return block_columns, tuple(block_columns.index(column) for column in columns)
+    return block_columns, None
+
+def parse_pending(regions, layout):
+    """Parse collected numeric regions of one column layout. Yields (columns, rows) if any row parsed."""
+    block_columns, usecols = layout
+    rows = rows_to_array(b''.join(regions), len(block_columns), usecols)
+    if len(rows):
+        yield tuple(block_columns[i] for i in usecols), rows
+
+def rows_to_array(region, ncols, usecols):
+    """Convert a block of numeric thermo lines to an (n, len(usecols)) array, dropping lines that are not ncols numbers."""
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning) # empty region
+            return np.loadtxt(io.BytesIO(region), usecols=usecols, ndmin=2)
+    except ValueError:
+        pass
+
+    # Slow path: a truncated or differently shaped line is mixed in with the thermo rows
+    parsed = []
+    for row in region.split(b'\n'):
+        tokens = row.split()
+        if len(tokens) != ncols:
+            continue
+        try:
+            parsed.append([float(tokens[i]) for i in usecols])
+        except ValueError:
+            continue
+
+    return np.array(parsed, dtype=np.float64).reshape(-1, len(usecols))
+
+def read_thermo(path, columns=None, every=1, **kwargs):
+    """Read thermo output into {column: array}, one entry per step (the last value wins for repeated steps).
+
+    columns defaults to those of the first thermo block, later blocks with a different layout are then skipped.
+    Requesting columns explicitly merges every block that has them.
+    every keeps only every n-th row of each chunk to bound memory on very long logs.
+    """
+
+    parts = []
+    for block_columns, rows in iter_thermo(path, columns=columns, **kwargs):
+        if columns is None:
+            columns = block_columns
+        if block_columns == tuple(columns):
+            parts.append(rows[::every])
+
+    if columns is None:
+        return {}
+
+    values = np.concatenate(parts) if parts else np.empty((0, len(columns)))
+    thermo = {column: values[:, i] for i, column in enumerate(columns)}
+
+    return unique_steps(thermo)
+
+def unique_steps(thermo):
+    """Sort thermo columns by Step and drop repeated steps (chunked and restarted runs repeat their first step)."""
+    if 'Step' not in thermo or len(thermo['Step']) == 0:
+        return thermo
+
+    step = thermo['Step']
+    _, last = np.unique(step[::-1], return_index=True)
+    keep = len(step) - 1 - last
+
+    return {column: values[keep] for column, values in thermo.items()}
+
+# =============================================================
+# STRESS-STRAIN
+# =============================================================
+
+def stress_strain(step, pxy, dt, shear_velocity, height, step0=None):
+    """Shear strain and stress (MPa) from thermo steps and pxy (bar).
+
+    The top slab moves at shear_velocity (angstrom/ps) relative to the fixed bottom slab,
+    so the imposed strain is shear_velocity * t / height with t measured from step0 (default the first step).
+    """
+    if step0 is None:
+        step0 = step[0] if len(step) else 0
+    time_ps = (step - step0) * dt
+    strain = shear_velocity * time_ps / height
+    stress = -pxy * BAR_TO_MPA
+
+    return strain, stress
+
+def critical_stress(strain, stress):
+    """Peak shear stress magnitude. Returns (strain, stress, index) at the peak, stress keeps its sign."""
+    if len(stress) == 0:
+        return np.nan, np.nan, -1
+    index = int(np.argmax(np.abs(stress)))
+    return strain[index], stress[index], index
+
+# =============================================================
+# CASE HELPERS
+# =============================================================
+
+def read_case_parameters(case_dir):
+    """Time step, shear velocity and deformable height of a case from its metadata and surface dump."""
+
+    with open(os.path.join(case_dir, 'logs', 'metadata.json')) as f:
+        metadata = json.load(f)
+
+    ylo, yhi = read_box_bounds(os.path.join(case_dir, 'output', 'top_surface_ID.txt'))[1]
+    fixed_depth = metadata.get("fixed_surface_depth", 0.0)
+
+    return {
+        "dt": metadata["dt"],
+        "shear_velocity": metadata["shear_velocity"],
+        "height": (yhi - ylo) - 2.0 * fixed_depth, # the surface slabs move rigidly
+    }
+
+def read_box_bounds(dump_path):
+    """(lo, hi) pairs for x, y and z from the header of a LAMMPS text dump."""
+    with open(dump_path) as f:
+        for line in f:
+            if line.startswith('ITEM: BOX BOUNDS'):
+                return [tuple(float(v) for v in next(f).split()[:2]) for _ in range(3)]
+    raise ValueError(f"No box bounds in {dump_path}")
+
+def case_stress_strain(case_dir, follow=False):
+    """Parse a case's log.lammps and return (step, strain, stress) arrays."""
+    parameters = read_case_parameters(case_dir)
+    thermo = read_thermo(os.path.join(case_dir, 'logs', 'log.lammps'), columns=('Step', SHEAR_COLUMN), follow=follow)
+
+    if not thermo:
+        return np.empty(0), np.empty(0), np.empty(0)
+
+    strain, stress = stress_strain(thermo['Step'], thermo[SHEAR_COLUMN], parameters["dt"], parameters["shear_velocity"], parameters["height"])
+
+    return thermo['Step'], strain, stress
+
+def follow_critical_stress(case_dir, **kwargs):
+    """Follow a running log, yielding (step, strain, stress, running peak stress) for each new chunk."""
+    parameters = read_case_parameters(case_dir)
+    log_path = os.path.join(case_dir, 'logs', 'log.lammps')
+
+    first_step = None
+    peak = 0.0
+    for _, rows in iter_thermo(log_path, columns=('Step', SHEAR_COLUMN), follow=True, **kwargs):
+        step = rows[:, 0]
+        if first_step is None:
+            first_step = step[0]
+
+        strain, stress = stress_strain(step, rows[:, 1], parameters["dt"],
+                                       parameters["shear_velocity"], parameters["height"], step0=first_step)
+
+        _, chunk_peak, _ = critical_stress(strain, stress)
+        if abs(chunk_peak) > abs(peak):
+            peak = chunk_peak
+
+        yield step, strain, stress, peak
+
+# =============================================================
+# MAIN FUNCTION
+# =============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress-strain curve and critical stress from a shear case log.")
+    parser.add_argument('case_dir', help="Case directory under 000_data/03_shear")
+    parser.add_argument('--follow', action='store_true', help="Keep reading while the run is still writing its log")
+    args = parser.parse_args()
+
+    case_dir = os.path.abspath(args.case_dir)
+
+    if args.follow:
+        for step, strain, stress, peak in follow_critical_stress(case_dir):
+            print(f"Step {int(step[-1])}: strain {strain[-1]:.5f}, stress {stress[-1]:.1f} MPa, peak {peak:.1f} MPa", flush=True)
+
+    t0 = time.time()
+    step, strain, stress = case_stress_strain(case_dir)
+    strain_c, stress_c, _ = critical_stress(strain, stress)
+
+    output_path = os.path.join(case_dir, 'output', 'stress_strain.txt')
+    np.savetxt(output_path, np.column_stack([step, strain, stress]), fmt=['%d', '%.6e', '%.4f'], header="step strain stress(MPa)")
+
+    print(f"Parsed {len(step)} thermo rows in {time.time() - t0:.2f} s")
+    print(f"Critical shear stress {stress_c:.1f} MPa at strain {strain_c:.5f}")
+    print(f"Stress-strain curve written to {output_path}")
+
+    return None
+
+# =============================================================
+# ENTRY POINT
+# =============================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# =============================================================
+# Columnar Result Store for Shear Analysis
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Chunked, compressed npz store for per-frame DXA and Wigner-Seitz results.
+# Note: One directory per case. Each rank writes its own chunks, index.json maps timestep -> chunk.
+# Usage: import result_store; result_store.load_frame(store_dir, timestep, 'ws_vacancies')
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import os
+import json
+import time
+import functools
+import numpy as np
+
+# =============================================================
+# STORE LAYOUT
+# =============================================================
+#
+# <store_dir>/index.json                   {"format": 1, "frames": {timestep: chunk file}}
+# <store_dir>/chunk_<rank>_<ms>_<n>.npz    one compressed chunk of consecutive frames from one rank
+#
+# Each chunk holds:
+#   timesteps                      (F,)        int64
+#   cells                          (F, 3, 4)   float64, OVITO cell matrix (three vectors + origin)
+#   <group>__offsets               (F + 1,)    int64, rows of frame i are offsets[i]:offsets[i + 1]
+#   <group>__<column>              (R, ...)    rows of all frames in the chunk, concatenated
+#
+# Ragged data such as DXA line points are stored as their own group ('dxa_points') with a
+# per-row count column in the parent group ('Point Count' in 'dxa_segments').
+
+INDEX_FILE = 'index.json'
+STORE_FORMAT = 1
+GROUP_SEPARATOR = '__'
+
+# =============================================================
+# WRITER
+# =============================================================
+
+_BUFFERS = {} # store directory -> list of buffered frames (timestep, cell, groups)
+_CHUNK_COUNTERS = {} # store directory -> number of chunks written by this process
+
+def add_frame(store_dir, timestep, cell, groups):
+    """Buffer one frame. groups maps group name -> {column name: array with one row per item}."""
+    _BUFFERS.setdefault(store_dir, []).append((int(timestep), np.asarray(cell, dtype=np.float64), groups))
+    return len(_BUFFERS[store_dir])
+
+def buffered_frames(store_dir):
+    """Number of frames waiting to be written for store_dir."""
+    return len(_BUFFERS.get(store_dir, []))
+
+def flush(store_dir, rank):
+    """Write the buffered frames as one compressed chunk and return its path (None if nothing was buffered)."""
+
+    frames = _BUFFERS.pop(store_dir, [])
+    if not frames:
+        return None
+
+    os.makedirs(store_dir, exist_ok=True)
+
+    arrays = {
+        "timesteps": np.array([timestep for timestep, _, _ in frames], dtype=np.int64),
+        "cells": np.stack([cell for _, cell, _ in frames]),
+    }
+
+    # Every frame must provide the same groups and columns, empty frames as zero-row arrays
+    _, _, first_groups = frames[0]
+    for name, first_columns in first_groups.items():
+        counts = [frame_rows(groups[name]) for _, _, groups in frames]
+        arrays[f"{name}{GROUP_SEPARATOR}offsets"] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        for column in first_columns:
+            arrays[f"{name}{GROUP_SEPARATOR}{column}"] = np.concatenate([np.asarray(groups[name][column]) for _, _, groups in frames])
+
+    counter = _CHUNK_COUNTERS.get(store_dir, 0)
+    _CHUNK_COUNTERS[store_dir] = counter + 1
+
+    chunk_file = f"chunk_{rank:04d}_{int(time.time() * 1000)}_{counter:05d}.npz"
+    chunk_path = os.path.join(store_dir, chunk_file)
+
+    # Write under a temporary name so readers and the index never see a partial chunk
+    tmp_path = chunk_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, chunk_path)
+
+    return chunk_path
+
+def frame_rows(group):
+    """Number of rows in one frame of a group (0 for an empty group)."""
+    for column in group.values():
+        return len(column)
+    return 0
+
+def write_index(store_dir):
+    """Scan all chunks and write index.json. Newer chunks win when a timestep was re-analysed."""
+
+    chunks = [f for f in os.listdir(store_dir) if f.startswith('chunk_') and f.endswith('.npz')] if os.path.isdir(store_dir) else []
+    chunks.sort(key=lambda f: os.path.getmtime(os.path.join(store_dir, f)))
+
+    frames = {}
+    for chunk_file in chunks:
+        with np.load(os.path.join(store_dir, chunk_file)) as chunk:
+            for timestep in chunk["timesteps"]:
+                frames[str(int(timestep))] = chunk_file
+
+    index = {"format": STORE_FORMAT, "frames": dict(sorted(frames.items(), key=lambda item: int(item[0])))}
+
+    tmp_path = os.path.join(store_dir, INDEX_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, os.path.join(store_dir, INDEX_FILE))
+
+    return index
+
+# =============================================================
+# READER
+# =============================================================
+
+_OPEN_CHUNKS = {} # chunk path -> open NpzFile, members are decompressed lazily on first access
+MEMBER_CACHE_SIZE = 64 # Decompressed chunk members kept in memory for repeated frame reads
+_INDEXES = {} # store directory -> (index.json mtime, index)
+
+def load_index(store_dir):
+    """Return the store index, re-reading index.json only when it has changed."""
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    mtime = os.path.getmtime(index_path)
+
+    cached = _INDEXES.get(store_dir)
+    if cached is None or cached[0] != mtime:
+        with open(index_path) as f:
+            cached = (mtime, json.load(f))
+        _INDEXES[store_dir] = cached
+
+    return cached[1]
+
+def timesteps(store_dir):
+    """Sorted array of all timesteps in the store."""
+    return np.array(sorted(int(t) for t in load_index(store_dir)["frames"]), dtype=np.int64)
+
+def open_chunk(store_dir, chunk_file):
+    path = os.path.join(store_dir, chunk_file)
+    if path not in _OPEN_CHUNKS:
+        _OPEN_CHUNKS[path] = np.load(path)
+    return _OPEN_CHUNKS[path]
+
+@functools.lru_cache(maxsize=MEMBER_CACHE_SIZE)
+def chunk_member(store_dir, chunk_file, key):
+    """Decompressed array of one chunk member, cached so consecutive frames of a chunk decompress it once."""
+    return open_chunk(store_dir, chunk_file)[key]
+
+def load_frame(store_dir, timestep, group, columns=None):
+    """Return {column: array} for one group of one frame. columns limits which members are decompressed."""
+
+    chunk_file = load_index(store_dir)["frames"].get(str(int(timestep)))
+    if chunk_file is None:
+        raise KeyError(f"Timestep {timestep} not in store {store_dir}")
+
+    position = int(np.flatnonzero(chunk_member(store_dir, chunk_file, "timesteps") == int(timestep))[-1])
+
+    prefix = f"{group}{GROUP_SEPARATOR}"
+    offsets = chunk_member(store_dir, chunk_file, prefix + "offsets")
+    start, end = offsets[position], offsets[position + 1]
+
+    if columns is None:
+        members = open_chunk(store_dir, chunk_file).files
+        columns = [key[len(prefix):] for key in members if key.startswith(prefix) and key != prefix + "offsets"]
+
+    return {column: chunk_member(store_dir, chunk_file, prefix + column)[start:end] for column in columns}
+
+def load_cell(store_dir, timestep):
+    """Return the 3 x 4 cell matrix of one frame."""
+    chunk_file = load_index(store_dir)["frames"][str(int(timestep))]
+    position = int(np.flatnonzero(chunk_member(store_dir, chunk_file, "timesteps") == int(timestep))[-1])
+    return chunk_member(store_dir, chunk_file, "cells")[position]
+
+def load_property(store_dir, group, column, steps=None):
+    """Return (timesteps, list of per-frame arrays) of one column across frames (all frames by default)."""
+    steps = timesteps(store_dir) if steps is None else np.asarray(steps, dtype=np.int64)
+    return steps, [load_frame(store_dir, timestep, group, columns=[column])[column] for timestep in steps]
+
+def close():
+    """Close all open chunk files."""
+    chunk_member.cache_clear()
+    for chunk in _OPEN_CHUNKS.values():
+        chunk.close()
+    _OPEN_CHUNKS.clear()
@@ -4,16 +4,16 @@
 # Version: v1.0
 # Description: Python script to produce input for void calculations.
 # Note: Dislocation is aligned along X, glide plane along Y axis.
-# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif mpirun.openmpi -np 16 /opt/venv/bin/python3 03_shear/run.py
+# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif mpirun.openmpi -np 16 /opt/venv/bin/python3 03_shear/run.py [--resume CASE]
 # =============================================================
 
 # =============================================================
 # IMPORT LIBRARIES
 # =============================================================
-import os, json, datetime
+import os, re, json, argparse, datetime
 import numpy as np
 from mpi4py import MPI
-from lammps import lammps
+from lammps import lammps, LMP_STYLE_ATOM, LMP_TYPE_VECTOR
 
 # =============================================================
 # INITIALISE MPI
@@ -52,12 +52,93 @@ DT = 0.001
 TEMPERATURE = 1000
 SHEAR_VELOCITY = 0.001
 
+# Rigid regions (surface slabs, precipitate): 'setforce' integrates them with everything else under fix nvt and zeroes
+# their forces, 'exclude' thermostats mobile_atoms only, moves the top slab with fix move, leaves the other rigid regions
+# unintegrated and drops pairs between atoms deeper than FROZEN_CORE_SKIN inside them from the neighbour lists
+FROZEN_MODES = ['setforce', 'exclude']
+FROZEN_MODE = FROZEN_MODES[0]
+FROZEN_CORE_SKIN = 6.5 # Depth (angstrom) kept fully interacting, >= the malerba.fs cutoff (5.3) plus margin, so EAM densities felt by mobile atoms are exact
+
+# Spatial decomposition: 'auto' picks the processors grid with the least estimated cost of the busiest rank, its owned atoms
+# (weighted for the obstacle) plus its ghost shell, 'lammps' leaves the choice to LAMMPS (smallest subdomain surface)
+PROCESSOR_GRIDS = ['auto', 'lammps']
+PROCESSOR_GRID = PROCESSOR_GRIDS[0]
+GRID_SAMPLE_SPACING = 3.0 # Spacing (angstrom) of the points sampling the atom density when estimating subdomain loads
+GHOST_CUTOFF = 7.3 # Ghost shell thickness (angstrom): the malerba.fs cutoff plus the default 2.0 neighbour skin
+
+# Load balancing: 'static' shifts the subdomain cuts once after the obstacle is made, 'shift' also rebalances every
+# BALANCE_FREQ steps with fix balance, 'rcb' uses tiled recursive bisection for both
+BALANCE_MODES = ['none', 'static', 'shift', 'rcb']
+BALANCE_MODE = BALANCE_MODES[0]
+BALANCE_FREQ = 1000 # Steps between fix balance checks
+BALANCE_THRESHOLD = 1.1 # Rebalance only when max/mean atoms per rank exceeds this
+BALANCE_SHIFT_ITERATIONS = 10 # Cut adjustments per shift balance
+BALANCE_SHIFT_STOP = 1.05 # Imbalance at which shift balancing stops iterating
+FROZEN_CORE_WEIGHT = 0.2 # Relative cost of a frozen_core atom ('exclude' mode), used in the estimate and the balance weights
+
 RUN_TIME = 500
+RUN_SECONDS = None # Wall time (s) of the last MD run, without setup, set by run_shear
+RUN_STEPS = None # Steps taken by that run (fewer than RUN_TIME when resumed)
 THERMO_FREQ = 10
 DUMP_FREQ = 10
-RESTART_FREQ = DUMP_FREQ
-
-RANDOM_SEED = np.random.randint(1000, 9999)
+RESTART_FREQ = DUMP_FREQ # Only used by the 'all' checkpoint mode
+
+# Checkpoints for resuming a run in a later allocation
+CHECKPOINT_MODES = ['rotate', 'all', 'none']
+CHECKPOINT_MODE = CHECKPOINT_MODES[0] # 'rotate' reuses CHECKPOINT_KEEP files, 'all' writes restart_* every RESTART_FREQ steps and keeps them
+CHECKPOINT_KEEP = 2 # Restart files cycled through in 'rotate' mode (2 alternates between two files)
+CHECKPOINT_STEPS = 1000 # Steps between checkpoints (None for the wall-clock interval only)
+CHECKPOINT_SECONDS = 1800.0 # Wall-clock seconds between checkpoints (None for the step interval only)
+CHECKPOINT_CHECK_FREQ = 100 # Steps between wall-clock checks
+CHECKPOINT_MARKER = 'checkpoint.json' # Lists the valid checkpoints of a case, written after each restart file is complete
+
+DUMP_FORMATS = ['text', 'gzip', 'binary', 'none']
+DUMP_FORMAT = DUMP_FORMATS[0] # 'gzip' needs LAMMPS built with gzip support, OVITO reads all three, 'none' skips dumps
+
+DUMP_FILENAMES = {'text': 'dump_*', 'gzip': 'dump_*.gz', 'binary': 'dump_*.bin'} # LAMMPS picks the format from the extension
+DUMP_COLUMNS = ['id', 'x', 'y', 'z', 'c_peratom', 'c_stress[4]']
+
+# Atoms written to the per-frame dump; 'defects' adds a full dump every FULL_DUMP_FREQ steps to dump_full/
+DUMP_SELECTIONS = ['all', 'defects']
+DUMP_SELECTION = DUMP_SELECTIONS[0]
+FULL_DUMP_FREQ = 1000 # Must be a multiple of every dump interval so full frames also have a defect frame
+DEFECT_METHODS = ['cna', 'centro']
+DEFECT_METHOD = DEFECT_METHODS[0] # 'cna': not BCC by conventional CNA (cna/atom) with the fixed DEFECT_CNA_CUTOFF, so strong local strain can flag perfect atoms, 'centro': centro-symmetry above DEFECT_CENTRO_MIN
+DEFECT_CNA_CUTOFF = 3.45 # CNA cutoff (angstrom) between the 2nd and 3rd BCC neighbour shells of Fe
+DEFECT_CENTRO_MIN = 2.0 # Centro-symmetry parameter (angstrom^2) above which an atom counts as defective
+DEFECT_SHELL = 6.0 # Perfect atoms within this distance (angstrom) of a defect atom are kept so DXA can close Burgers circuits; must stay inside the neighbour cutoff
+
+# In-situ dislocation tracking (run is split into TRACK_FREQ step chunks)
+TRACK_DISLOCATION = False
+TRACK_FREQ = 100 # Steps between position measurements
+TRACK_AVERAGE = 10 # Steps of c_peratom averaged per measurement to suppress thermal noise
+TRACK_PE_EXCESS = 0.08 # Energy above the mean atomic pe (eV) for an atom to count as dislocation core
+TRACK_SLAB = 6.0 # Half thickness (angstrom) of the slab around the glide plane searched for core atoms
+TRACK_OBSTACLE_SKIN = 4.0 # Distance (angstrom) beyond the obstacle radius ignored, its surface is also high energy
+TRACK_Z_BINS = 20 # Bins along the line direction (Z) for the bow-out profile
+
+# Adaptive dump frequency from the tracked line position (measured every TRACK_FREQ steps, tracking file optional)
+ADAPTIVE_DUMP = False
+DUMP_FREQ_FAR = 100 # Dump interval while the line is far from the obstacle
+DUMP_FREQ_NEAR = DUMP_FREQ # Dump interval during the pinning/unpinning window
+DUMP_NEAR_DISTANCE = 15.0 # Distance (angstrom) between the line and the obstacle surface below which dumps are dense
+DUMP_FAR_DISTANCE = 20.0 # Distance above which dumps become sparse again (hysteresis against thermal jitter)
+
+# Settings a resumed case takes from its metadata.json (key -> module global), so it redefines the same fixes and dumps
+RESUME_SETTINGS = {
+    "dislocation_displacement": "DISLOCATION_INITIAL_DISPLACEMENT",
+    **{name.lower(): name for name in [
+        "INPUT_FILE", "POTENTIAL_FILE", "FIXED_SURFACE_DEPTH", "FROZEN_MODE", "FROZEN_CORE_SKIN",
+        "PROCESSOR_GRID", "BALANCE_MODE", "BALANCE_FREQ", "BALANCE_THRESHOLD", "DT", "RUN_TIME", "THERMO_FREQ",
+        "DUMP_FREQ", "DUMP_FORMAT", "DUMP_COLUMNS", "DUMP_SELECTION", "FULL_DUMP_FREQ", "DEFECT_METHOD", "DEFECT_SHELL",
+        "DEFECT_CNA_CUTOFF", "DEFECT_CENTRO_MIN", "RESTART_FREQ", "CHECKPOINT_MODE", "CHECKPOINT_KEEP", "CHECKPOINT_STEPS",
+        "CHECKPOINT_SECONDS", "TRACK_DISLOCATION", "TRACK_FREQ", "TRACK_AVERAGE", "TRACK_PE_EXCESS", "TRACK_SLAB",
+        "TRACK_OBSTACLE_SKIN", "TRACK_Z_BINS", "ADAPTIVE_DUMP", "DUMP_FREQ_FAR", "DUMP_FREQ_NEAR", "DUMP_NEAR_DISTANCE",
+        "DUMP_FAR_DISTANCE",
+    ]},
+}
+
+RANDOM_SEED = int(os.environ.get('SHEAR_RANDOM_SEED') or comm.bcast(np.random.randint(1000, 9999), root=0)) # every rank must agree on the seed and case name, SHEAR_RANDOM_SEED fixes it (analysis --follow needs the case name up front)
 
 # =============================================================
 # DIRECTORY INITIALIZATION AND CASE NAMING
@@ -74,22 +155,48 @@ def make_case_name(obstacle_type, radius, temperature, control_mode, control_val
     return f"{obstacle_type}_R{radius}_T{temperature}_{ctrl}_{RANDOM_SEED}"
 
 
-def initialise_output_dirs():
-    """Initialize directory structure for output, dump, logs, and restarts."""
+def set_communicator(new_comm):
+    """Run subsequent cases on new_comm (e.g. a sub-communicator of a sweep) instead of COMM_WORLD."""
+
+    global comm, rank, size
+
+    comm = new_comm
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+
+    return None
+
+def configure_case(obstacle_type, radius, temperature, shear_velocity, seed=None):
+    """Set the case parameters for the next call to main(). A new seed is drawn and shared when none is given."""
+
+    global OBSTACLE_TYPE, OBSTACLE_RADIUS, TEMPERATURE, SHEAR_VELOCITY, RANDOM_SEED
+
+    OBSTACLE_TYPE = obstacle_type
+    OBSTACLE_RADIUS = radius
+    TEMPERATURE = temperature
+    SHEAR_VELOCITY = shear_velocity
+    RANDOM_SEED = seed if seed is not None else comm.bcast(np.random.randint(1000, 9999), root=0)
+
+    return None
+
+def initialise_output_dirs(case_dir=None):
+    """Initialize directory structure for output, dump, logs, and restarts, under case_dir (a resumed case)
+    or STAGE_DATA_DIR/CASE_NAME."""
     
-    global CASE_NAME, CASE_DATA_DIR, OUTPUT_DIR, DUMP_DIR, LOG_DIR, RESTART_DIR
+    global CASE_NAME, CASE_DATA_DIR, OUTPUT_DIR, DUMP_DIR, LOG_DIR, RESTART_DIR, FULL_DUMP_DIR
 
     CASE_NAME = make_case_name(OBSTACLE_TYPE, OBSTACLE_RADIUS, TEMPERATURE, "shear_velocity", SHEAR_VELOCITY)
-    CASE_DATA_DIR = os.path.abspath(os.path.join(STAGE_DATA_DIR, CASE_NAME))
+    CASE_DATA_DIR = os.path.abspath(case_dir or os.path.join(STAGE_DATA_DIR, CASE_NAME))
 
     OUTPUT_DIR = os.path.join(CASE_DATA_DIR, 'output')
     DUMP_DIR = os.path.join(CASE_DATA_DIR, 'dump')
     LOG_DIR = os.path.join(CASE_DATA_DIR, 'logs')
     RESTART_DIR = os.path.join(CASE_DATA_DIR, 'restarts')
+    FULL_DUMP_DIR = os.path.join(CASE_DATA_DIR, 'dump_full')
 
     if rank == 0:
 
-        for directory in [CASE_DATA_DIR, OUTPUT_DIR, DUMP_DIR, LOG_DIR, RESTART_DIR]:
+        for directory in [CASE_DATA_DIR, OUTPUT_DIR, DUMP_DIR, LOG_DIR, RESTART_DIR] + ([FULL_DUMP_DIR] if DUMP_SELECTION == 'defects' else []):
             os.makedirs(directory, exist_ok=True)
 
     comm.Barrier()
@@ -107,13 +214,48 @@ def write_metadata():
             "obstacle_type": OBSTACLE_TYPE,
             "obstacle_radius": OBSTACLE_RADIUS,
             "dislocation_displacement": DISLOCATION_INITIAL_DISPLACEMENT,
+            "fixed_surface_depth": FIXED_SURFACE_DEPTH,
+            "frozen_mode": FROZEN_MODE,
+            "frozen_core_skin": FROZEN_CORE_SKIN,
+            "n_ranks": size,
+            "processor_grid": PROCESSOR_GRID,
+            "balance_mode": BALANCE_MODE,
+            "balance_freq": BALANCE_FREQ,
+            "balance_threshold": BALANCE_THRESHOLD,
             "dt": DT,
             "temperature": TEMPERATURE,
             "shear_velocity": SHEAR_VELOCITY,
             "run_time": RUN_TIME,
             "thermo_freq": THERMO_FREQ,
             "dump_freq": DUMP_FREQ,
-            "restart_freq": RESTART_FREQ
+            "dump_format": DUMP_FORMAT,
+            "dump_pattern": DUMP_FILENAMES.get(DUMP_FORMAT),
+            "dump_columns": DUMP_COLUMNS,
+            "dump_selection": DUMP_SELECTION,
+            "full_dump_freq": FULL_DUMP_FREQ if DUMP_SELECTION == 'defects' else None,
+            "full_dump_dir": os.path.basename(FULL_DUMP_DIR) if DUMP_SELECTION == 'defects' else None,
+            "defect_method": DEFECT_METHOD,
+            "defect_shell": DEFECT_SHELL,
+            "defect_cna_cutoff": DEFECT_CNA_CUTOFF,
+            "defect_centro_min": DEFECT_CENTRO_MIN,
+            "restart_freq": RESTART_FREQ,
+            "random_seed": RANDOM_SEED,
+            "checkpoint_mode": CHECKPOINT_MODE,
+            "checkpoint_keep": CHECKPOINT_KEEP,
+            "checkpoint_steps": CHECKPOINT_STEPS,
+            "checkpoint_seconds": CHECKPOINT_SECONDS,
+            "track_dislocation": TRACK_DISLOCATION,
+            "track_freq": TRACK_FREQ,
+            "track_average": TRACK_AVERAGE,
+            "track_pe_excess": TRACK_PE_EXCESS,
+            "track_slab": TRACK_SLAB,
+            "track_obstacle_skin": TRACK_OBSTACLE_SKIN,
+            "track_z_bins": TRACK_Z_BINS,
+            "adaptive_dump": ADAPTIVE_DUMP,
+            "dump_freq_far": DUMP_FREQ_FAR,
+            "dump_freq_near": DUMP_FREQ_NEAR,
+            "dump_near_distance": DUMP_NEAR_DISTANCE,
+            "dump_far_distance": DUMP_FAR_DISTANCE
         }
 
         with open(os.path.join(LOG_DIR, "metadata.json"), "w") as f:
@@ -127,108 +269,153 @@ def write_metadata():
 # MAIN FUNCTION
 # =============================================================
 
-def main(sim_type):
-    initialise_output_dirs()
-    write_metadata()
+def main(sim_type, checkpoint=None, case_dir=None):
+    initialise_output_dirs(case_dir)
+    if checkpoint is None:
+        write_metadata()
 
     if sim_type == 'void':
-        sim_void()
+        natoms = sim_void(checkpoint)
     elif sim_type == 'prec':
-        sim_prec()
+        natoms = sim_prec(checkpoint)
     else:
         raise ValueError(f"Unknown simulation type: {sim_type}")
 
-    return None
+    return natoms
 
 # =============================================================
 # LAMMPS WORKFLOWS
 # =============================================================
 
-def sim_void():
-    """Run the dislocation–void interaction simulation."""
+def sim_void(checkpoint=None):
+    """Run the dislocation–void interaction simulation, or continue it from checkpoint. Returns the number of atoms simulated."""
 
-    lmp = lammps()
-    lmp.cmd.clear()
-    lmp.cmd.log(os.path.join(LOG_DIR, 'log.lammps'))
+    lmp, box_min, box_max, simBoxCenter = open_case(checkpoint)
 
-    lmp.cmd.units('metal')
-    lmp.cmd.dimension(3)
-    lmp.cmd.boundary('p', 'f', 'p')
-    lmp.cmd.read_data(INPUT_FILE)
+    if checkpoint is None:
+        ymin, ymax = box_min[1], box_max[1]
 
-    lmp.cmd.pair_style('eam/fs')
-    lmp.cmd.pair_coeff('*', '*', POTENTIAL_FILE, 'Fe')
+        # Displace and define regions
+        lmp.cmd.group('all', 'type', '1')
+        lmp.cmd.displace_atoms('all', 'move', OBSTACLE_RADIUS + DISLOCATION_INITIAL_DISPLACEMENT, 0, 0, 'units', 'box')
+        lmp.cmd.write_dump('all', 'custom', os.path.join(OUTPUT_DIR, 'displaced_config.txt'), 'id', 'x', 'y', 'z')
 
-    boxBounds = lmp.extract_box()
+        lmp.cmd.region('void_reg', 'sphere', simBoxCenter[0], simBoxCenter[1], simBoxCenter[2], OBSTACLE_RADIUS)
+        lmp.cmd.region('top_surface_reg', 'block', 'INF', 'INF', (ymax - FIXED_SURFACE_DEPTH), 'INF', 'INF', 'INF')
+        lmp.cmd.region('bottom_surface_reg', 'block', 'INF', 'INF', 'INF', (ymin + FIXED_SURFACE_DEPTH), 'INF', 'INF')
 
-    box_min = boxBounds[0]
-    box_max = boxBounds[1]
+        lmp.cmd.group('top_surface', 'region', 'top_surface_reg')
+        lmp.cmd.group('bottom_surface', 'region', 'bottom_surface_reg')
+        lmp.cmd.group('void', 'region', 'void_reg')
+        lmp.cmd.group('mobile_atoms', 'subtract', 'all', 'void', 'top_surface', 'bottom_surface')
+
+        lmp.cmd.delete_atoms('group', 'void')
+        lmp.cmd.write_dump('all', 'custom', os.path.join(OUTPUT_DIR, 'displaced_voided_config.txt'), 'id', 'x', 'y', 'z')
+
+    # Compute and fix definitions (not stored in restart files, so defined again on resume)
+    lmp.cmd.compute('peratom', 'all', 'pe/atom')
+    lmp.cmd.compute('stress', 'all', 'stress/atom', 'NULL')
+    lmp.cmd.compute('temp_compute', 'all', 'temp')
+    lmp.cmd.compute('press_comp', 'all', 'pressure', 'temp_compute')
 
-    xmin, xmax = box_min[0], box_max[0]
-    ymin, ymax = box_min[1], box_max[1]
-    zmin, zmax = box_min[2], box_max[2]
+    define_integration(lmp, ['top_surface', 'bottom_surface'], simBoxCenter, box_min, box_max)
 
-    simBoxCenter = [np.mean([xmin, xmax]), np.mean([ymin, ymax]), np.mean([zmin, zmax])]
+    if checkpoint is None:
+        lmp.cmd.velocity('mobile_atoms', 'create', TEMPERATURE, RANDOM_SEED, 'mom', 'yes', 'rot', 'yes')
+        lmp.cmd.velocity('top_surface', 'set', -SHEAR_VELOCITY, 0.0, 0.0)
+        lmp.cmd.velocity('bottom_surface', 'set', 0.0, 0.0, 0.0)
 
-    # Displace and define regions
-    lmp.cmd.group('all', 'type', '1')
-    lmp.cmd.displace_atoms('all', 'move', OBSTACLE_RADIUS + DISLOCATION_INITIAL_DISPLACEMENT, 0, 0, 'units', 'box')
-    lmp.cmd.write_dump('all', 'custom', os.path.join(OUTPUT_DIR, 'displaced_config.txt'), 'id', 'x', 'y', 'z')
-    
-    lmp.cmd.region('void_reg', 'sphere', simBoxCenter[0], simBoxCenter[1], simBoxCenter[2], OBSTACLE_RADIUS)
-    lmp.cmd.region('top_surface_reg', 'block', 'INF', 'INF', (ymax - FIXED_SURFACE_DEPTH), 'INF', 'INF', 'INF')
-    lmp.cmd.region('bottom_surface_reg', 'block', 'INF', 'INF', 'INF', (ymin + FIXED_SURFACE_DEPTH), 'INF', 'INF')
+        lmp.cmd.write_dump('top_surface', 'custom', os.path.join(OUTPUT_DIR, 'top_surface_ID.txt'), 'id', 'x', 'y', 'z')
+        lmp.cmd.write_dump('bottom_surface', 'custom', os.path.join(OUTPUT_DIR, 'bottom_surface_ID.txt'), 'id', 'x', 'y', 'z')
+
+    define_balance(lmp)
+
+    # Outputs
+    define_thermo(lmp)
+
+    define_dump(lmp)
+    define_restart(lmp)
+
+    run_shear(lmp, simBoxCenter, box_min, box_max, checkpoint)
+
+    natoms = lmp.get_natoms()
+    lmp.close()
+    return natoms
+
+def sim_prec(checkpoint=None):
+    """Run the dislocation–precipitate interaction simulation, or continue it from checkpoint. Returns the number of atoms simulated."""
 
-    lmp.cmd.group('top_surface', 'region', 'top_surface_reg')
-    lmp.cmd.group('bottom_surface', 'region', 'bottom_surface_reg')
-    lmp.cmd.group('void', 'region', 'void_reg')
-    lmp.cmd.group('mobile_atoms', 'subtract', 'all', 'void', 'top_surface', 'bottom_surface')
+    lmp, box_min, box_max, simBoxCenter = open_case(checkpoint)
 
-    lmp.cmd.delete_atoms('group', 'void')
-    lmp.cmd.write_dump('all', 'custom', os.path.join(OUTPUT_DIR, 'displaced_voided_config.txt'), 'id', 'x', 'y', 'z')
+    if checkpoint is None:
+        ymin, ymax = box_min[1], box_max[1]
 
-    # Compute and fix definitions
+        lmp.cmd.group('all', 'type', '1')
+        lmp.cmd.displace_atoms('all', 'move', OBSTACLE_RADIUS + DISLOCATION_INITIAL_DISPLACEMENT, 0, 0, 'units', 'box')
+
+        lmp.cmd.region('precipitate_reg', 'sphere', simBoxCenter[0], simBoxCenter[1], simBoxCenter[2], OBSTACLE_RADIUS)
+        lmp.cmd.region('top_surface_reg', 'block', 'INF', 'INF', (ymax - FIXED_SURFACE_DEPTH), 'INF', 'INF', 'INF')
+        lmp.cmd.region('bottom_surface_reg', 'block', 'INF', 'INF', 'INF', (ymin + FIXED_SURFACE_DEPTH), 'INF', 'INF')
+
+        lmp.cmd.group('top_surface', 'region', 'top_surface_reg')
+        lmp.cmd.group('bottom_surface', 'region', 'bottom_surface_reg')
+        lmp.cmd.group('precipitate', 'region', 'precipitate_reg')
+        lmp.cmd.group('mobile_atoms', 'subtract', 'all', 'precipitate', 'top_surface', 'bottom_surface')
+
+    #--- Define Computes ---#
     lmp.cmd.compute('peratom', 'all', 'pe/atom')
     lmp.cmd.compute('stress', 'all', 'stress/atom', 'NULL')
     lmp.cmd.compute('temp_compute', 'all', 'temp')
     lmp.cmd.compute('press_comp', 'all', 'pressure', 'temp_compute')
 
-    lmp.cmd.fix('1', 'all', 'nvt', 'temp', TEMPERATURE, TEMPERATURE, 100.0 * DT)
-    lmp.cmd.velocity('mobile_atoms', 'create', TEMPERATURE, RANDOM_SEED, 'mom', 'yes', 'rot', 'yes')
-    lmp.cmd.fix('top_surface_freeze', 'top_surface', 'setforce', 0.0, 0.0, 0.0)
-    lmp.cmd.fix('bottom_surface_freeze', 'bottom_surface', 'setforce', 0.0, 0.0, 0.0)
-    lmp.cmd.velocity('top_surface', 'set', -SHEAR_VELOCITY, 0.0, 0.0)
-    lmp.cmd.velocity('bottom_surface', 'set', 0.0, 0.0, 0.0)
+    define_integration(lmp, ['top_surface', 'bottom_surface', 'precipitate'], simBoxCenter, box_min, box_max)
 
-    lmp.cmd.write_dump('top_surface', 'custom', os.path.join(OUTPUT_DIR, 'top_surface_ID.txt'), 'id', 'x', 'y', 'z')
-    lmp.cmd.write_dump('bottom_surface', 'custom', os.path.join(OUTPUT_DIR, 'bottom_surface_ID.txt'), 'id', 'x', 'y', 'z')
+    if checkpoint is None:
+        lmp.cmd.velocity('mobile_atoms', 'create', TEMPERATURE, RANDOM_SEED, 'mom', 'yes', 'rot', 'yes')
+        lmp.cmd.velocity('top_surface', 'set', -SHEAR_VELOCITY, 0.0, 0.0)
+        lmp.cmd.velocity('bottom_surface', 'set', 0.0, 0.0, 0.0)
+        lmp.cmd.velocity('precipitate', 'set', 0.0, 0.0, 0.0)
 
-    # Outputs
-    lmp.cmd.thermo_style('custom', 'step', 'temp', 'pe', 'etotal',
-                         'c_press_comp[1]', 'c_press_comp[2]', 'c_press_comp[3]',
-                         'c_press_comp[4]', 'c_press_comp[5]', 'c_press_comp[6]')
-    lmp.cmd.thermo(THERMO_FREQ)
+        #--- Dump ID's for post-processing or future simulations ---#
+        lmp.cmd.write_dump('precipitate', 'custom', os.path.join(OUTPUT_DIR, 'precipitate_ID.txt'), 'id', 'x', 'y', 'z')
+        lmp.cmd.write_dump('top_surface', 'custom', os.path.join(OUTPUT_DIR, 'top_surface_ID.txt'), 'id', 'x', 'y', 'z')
+        lmp.cmd.write_dump('bottom_surface', 'custom', os.path.join(OUTPUT_DIR, 'bottom_surface_ID.txt'), 'id', 'x', 'y', 'z')
 
-    dump_path = os.path.join(DUMP_DIR, 'dump_*')
-    lmp.cmd.dump('1', 'all', 'custom', DUMP_FREQ, dump_path, 'id', 'x', 'y', 'z', 'c_peratom', 'c_stress[4]')
+    define_balance(lmp)
 
-    restart_path = os.path.join(RESTART_DIR, 'restart_*')
-    lmp.cmd.restart(RESTART_FREQ, restart_path)
+    define_thermo(lmp)
 
-    lmp.cmd.run(RUN_TIME)
-    return None
+    define_dump(lmp)
+    define_restart(lmp)
+
+    run_shear(lmp, simBoxCenter, box_min, box_max, checkpoint)
+
+    natoms = lmp.get_natoms()
+    lmp.close()
+    return natoms
 
-def sim_prec():
-    """Run the dislocation–precipitate interaction simulation."""
+def open_case(checkpoint=None):
+    """Start LAMMPS on the minimized input, or on the checkpoint's restart file (atoms, velocities, groups and
+    thermostat state are restored from it). Returns (lmp, box_min, box_max, box centre)."""
 
-    lmp = lammps()
+    lmp = lammps(comm=comm)
     lmp.cmd.clear()
-    lmp.cmd.log(os.path.join(LOG_DIR, 'log.lammps'))
 
-    lmp.cmd.units('metal')
-    lmp.cmd.dimension(3)
-    lmp.cmd.boundary('p', 'f', 'p')
-    lmp.cmd.read_data(INPUT_FILE)
+    # Must come before the box is created, read_restart also redistributes atoms over it
+    grid = choose_processor_grid()
+    if grid is not None:
+        lmp.cmd.processors(*grid)
+
+    if checkpoint is None:
+        lmp.cmd.log(os.path.join(LOG_DIR, 'log.lammps'))
+
+        lmp.cmd.units('metal')
+        lmp.cmd.dimension(3)
+        lmp.cmd.boundary('p', 'f', 'p')
+        lmp.cmd.read_data(INPUT_FILE)
+    else:
+        lmp.cmd.log(os.path.join(LOG_DIR, 'log.lammps'), 'append')
+        lmp.cmd.read_restart(checkpoint["path"])
 
     lmp.cmd.pair_style('eam/fs')
     lmp.cmd.pair_coeff('*', '*', POTENTIAL_FILE, 'Fe')
@@ -238,63 +425,628 @@ def sim_prec():
     box_min = boxBounds[0]
     box_max = boxBounds[1]
 
-    xmin, xmax = box_min[0], box_max[0]
-    ymin, ymax = box_min[1], box_max[1]
-    zmin, zmax = box_min[2], box_max[2]
+    # The obstacle sits at the centre of the box; y is a fixed boundary and x, z are periodic, so the box never changes
+    simBoxCenter = [np.mean([box_min[0], box_max[0]]), np.mean([box_min[1], box_max[1]]), np.mean([box_min[2], box_max[2]])]
 
-    simBoxCenter = [np.mean([xmin, xmax]), np.mean([ymin, ymax]), np.mean([zmin, zmax])]
+    return lmp, box_min, box_max, simBoxCenter
 
-    lmp.cmd.group('all', 'type', '1')
-    lmp.cmd.displace_atoms('all', 'move', OBSTACLE_RADIUS + DISLOCATION_INITIAL_DISPLACEMENT, 0, 0, 'units', 'box')
+def define_integration(lmp, rigid_groups, obstacle_centre, box_min, box_max):
+    """Thermostat and rigid-region fixes for FROZEN_MODE. rigid_groups are held rigid, 'top_surface' moving at the shear velocity."""
 
-    lmp.cmd.region('precipitate_reg', 'sphere', simBoxCenter[0], simBoxCenter[1], simBoxCenter[2], OBSTACLE_RADIUS)
-    lmp.cmd.region('top_surface_reg', 'block', 'INF', 'INF', (ymax - FIXED_SURFACE_DEPTH), 'INF', 'INF', 'INF')
-    lmp.cmd.region('bottom_surface_reg', 'block', 'INF', 'INF', 'INF', (ymin + FIXED_SURFACE_DEPTH), 'INF', 'INF')
+    if FROZEN_MODE == 'setforce':
+        lmp.cmd.fix('1', 'all', 'nvt', 'temp', TEMPERATURE, TEMPERATURE, 100.0 * DT)
+        for group in rigid_groups:
+            lmp.cmd.fix(f'{group}_freeze', group, 'setforce', 0.0, 0.0, 0.0)
 
-    lmp.cmd.group('top_surface', 'region', 'top_surface_reg')
-    lmp.cmd.group('bottom_surface', 'region', 'bottom_surface_reg')
-    lmp.cmd.group('precipitate', 'region', 'precipitate_reg')
-    lmp.cmd.group('mobile_atoms', 'subtract', 'all', 'precipitate', 'top_surface', 'bottom_surface')
+    elif FROZEN_MODE == 'exclude':
+        # Only the mobile atoms are integrated and thermostatted, at their own temperature
+        lmp.cmd.compute('temp_mobile', 'mobile_atoms', 'temp')
+        lmp.cmd.fix('1', 'mobile_atoms', 'nvt', 'temp', TEMPERATURE, TEMPERATURE, 100.0 * DT)
+        lmp.cmd.fix_modify('1', 'temp', 'temp_mobile')
 
-    #--- Define Computes ---#
-    lmp.cmd.compute('peratom', 'all', 'pe/atom')
-    lmp.cmd.compute('stress', 'all', 'stress/atom', 'NULL')
-    lmp.cmd.compute('temp_compute', 'all', 'temp')
-    lmp.cmd.compute('press_comp', 'all', 'pressure', 'temp_compute')
+        # Prescribed displacement of the top slab (restored from restart files); the other rigid regions are not integrated
+        lmp.cmd.fix('top_surface_move', 'top_surface', 'move', 'linear', -SHEAR_VELOCITY, 0.0, 0.0)
+
+        if define_frozen_core(lmp, rigid_groups, obstacle_centre, box_min, box_max):
+            lmp.cmd.neigh_modify('exclude', 'group', 'frozen_core', 'frozen_core')
+
+    else:
+        raise ValueError(f"Unknown frozen mode: {FROZEN_MODE}")
+
+    return None
+
+def define_frozen_core(lmp, rigid_groups, obstacle_centre, box_min, box_max):
+    """Group 'frozen_core': rigid atoms more than FROZEN_CORE_SKIN from any mobile atom. Their mutual pairs only change
+    the energy and virial of rigid atoms, a constant offset as the regions never deform. Returns whether it holds atoms."""
+
+    if 'frozen_core' not in lmp.available_ids('group'): # restored from the restart file on resume
+        ymin, ymax = box_min[1], box_max[1]
+        depth = FIXED_SURFACE_DEPTH - FROZEN_CORE_SKIN
+        regions = []
+
+        if depth > 0.0 and 'top_surface' in rigid_groups:
+            lmp.cmd.region('top_core_reg', 'block', 'INF', 'INF', ymax - depth, 'INF', 'INF', 'INF')
+            regions.append('top_core_reg')
+        if depth > 0.0 and 'bottom_surface' in rigid_groups:
+            lmp.cmd.region('bottom_core_reg', 'block', 'INF', 'INF', 'INF', ymin + depth, 'INF', 'INF')
+            regions.append('bottom_core_reg')
+        if OBSTACLE_RADIUS > FROZEN_CORE_SKIN and 'precipitate' in rigid_groups:
+            lmp.cmd.region('precipitate_core_reg', 'sphere', *obstacle_centre, OBSTACLE_RADIUS - FROZEN_CORE_SKIN)
+            regions.append('precipitate_core_reg')
+
+        if not regions:
+            lmp.cmd.group('frozen_core', 'empty')
+        else:
+            lmp.cmd.region('frozen_core_reg', 'union', len(regions), *regions)
+            lmp.cmd.group('frozen_core', 'region', 'frozen_core_reg')
+
+    n_core = int(lmp.eval('count(frozen_core)'))
+    if rank == 0:
+        print(f"Frozen core: {n_core} atoms with pairs excluded from the neighbour lists", flush=True)
+
+    return n_core > 0
+
+# =============================================================
+# DECOMPOSITION AND LOAD BALANCING
+# =============================================================
+
+def read_data_bounds(path):
+    """(box_min, box_max) from the header of a LAMMPS data file, None if it cannot be read."""
+    bounds = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 4 and fields[2] in ('xlo', 'ylo', 'zlo'):
+                    bounds[fields[2][0]] = (float(fields[0]), float(fields[1]))
+                elif fields and fields[0] in ('Atoms', 'Masses'):
+                    break
+    except (OSError, ValueError):
+        return None
+
+    if len(bounds) < 3:
+        return None
+    return np.array([bounds[axis][0] for axis in 'xyz']), np.array([bounds[axis][1] for axis in 'xyz'])
+
+def choose_processor_grid():
+    """(Px, Py, Pz) for the processors command, None to keep the LAMMPS default. Rank 0 estimates, every rank gets the grid."""
+
+    if PROCESSOR_GRID == 'lammps' or size == 1:
+        return None
+    if PROCESSOR_GRID != 'auto':
+        raise ValueError(f"Unknown processor grid: {PROCESSOR_GRID}")
+
+    # The box never changes (see open_case), so the minimized input gives it for resumed runs too
+    result = None
+    if rank == 0:
+        bounds = read_data_bounds(INPUT_FILE)
+        if bounds is None:
+            print(f"Could not read the box from {INPUT_FILE}, using the LAMMPS processors grid", flush=True)
+        else:
+            grid, imbalance = processor_grid(size, *bounds)
+            print(f"Processors grid {grid[0]}x{grid[1]}x{grid[2]}, estimated imbalance {imbalance:.3f}", flush=True)
+            result = grid
+
+    return comm.bcast(result, root=0)
+
+def processor_grid(n_ranks, box_min, box_max):
+    """Px*Py*Pz = n_ranks minimising the estimated cost of the busiest rank of a uniform grid: the volume of the atoms it owns,
+    weighted by load_samples, plus the volume of its ghost shell. Returns ((Px, Py, Pz), estimated max/mean load)."""
+
+    lengths = np.asarray(box_max) - np.asarray(box_min)
+    points, weights = load_samples(box_min, box_max)
+    fractions = (points - np.asarray(box_min)) / lengths
+
+    best = None
+    for px in range(1, n_ranks + 1):
+        if n_ranks % px:
+            continue
+        for py in range(1, n_ranks // px + 1):
+            if (n_ranks // px) % py:
+                continue
+            grid = np.array([px, py, n_ranks // px // py])
+
+            # Mean sample weight times the exact subdomain volume, so the lattice spacing does not bias the loads
+            sub = lengths / grid
+            cells = np.ravel_multi_index(np.minimum((fractions * grid).astype(int), grid - 1).T, grid)
+            loads = np.prod(sub) * np.bincount(cells, weights=weights, minlength=n_ranks) / np.maximum(np.bincount(cells, minlength=n_ranks), 1)
+
+            # Y is not periodic, so subdomains at the slabs have no ghosts beyond the box; counted anyway as an upper bound
+            ghosts = np.prod(sub + 2.0 * GHOST_CUTOFF) - np.prod(sub)
+
+            cost = loads.max() + ghosts
+            if best is None or cost < best[0]:
+                best = (cost, tuple(int(p) for p in grid), loads.max() / loads.mean())
+
+    return best[1], best[2]
+
+def load_samples(box_min, box_max):
+    """Points on a GRID_SAMPLE_SPACING lattice over the box and the relative cost of the atoms there: none inside a void,
+    FROZEN_CORE_WEIGHT inside the frozen core of a precipitate in 'exclude' mode, one elsewhere."""
+
+    axes = [np.arange(lo + 0.5 * GRID_SAMPLE_SPACING, hi, GRID_SAMPLE_SPACING) for lo, hi in zip(box_min, box_max)]
+    points = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+
+    centre = 0.5 * (np.asarray(box_min) + np.asarray(box_max))
+    distance = np.linalg.norm(points - centre, axis=1)
+
+    weights = np.ones(len(points))
+    if OBSTACLE_TYPE == 'void':
+        weights[distance < OBSTACLE_RADIUS] = 0.0
+    elif OBSTACLE_TYPE == 'prec' and FROZEN_MODE == 'exclude':
+        weights[distance < OBSTACLE_RADIUS - FROZEN_CORE_SKIN] = FROZEN_CORE_WEIGHT
+
+    return points, weights
+
+def balance_args(weighted):
+    """Style arguments shared by the balance command and fix balance."""
+    if BALANCE_MODE == 'rcb':
+        args = ['rcb']
+    else:
+        args = ['shift', 'xyz', BALANCE_SHIFT_ITERATIONS, BALANCE_SHIFT_STOP]
+
+    # frozen_core atoms have almost no neighbour pairs, so count them as cheaper
+    if weighted:
+        args += ['weight', 'group', 1, 'frozen_core', FROZEN_CORE_WEIGHT]
+    return args
+
+def define_balance(lmp):
+    """Rebalance the subdomains for BALANCE_MODE once the obstacle and groups exist, and add fix balance for periodic
+    rebalancing. Atom-count imbalance before and after is logged to balance.txt."""
 
-    lmp.cmd.fix('1', 'all', 'nvt', 'temp', TEMPERATURE, TEMPERATURE, 100.0 * DT)
-    lmp.cmd.velocity('mobile_atoms', 'create', TEMPERATURE, RANDOM_SEED, 'mom', 'yes', 'rot', 'yes')
+    if BALANCE_MODE == 'none':
+        return None
+    if BALANCE_MODE not in BALANCE_MODES:
+        raise ValueError(f"Unknown balance mode: {BALANCE_MODE}")
 
-    lmp.cmd.fix('top_surface_freeze', 'top_surface', 'setforce', 0.0, 0.0, 0.0)
-    lmp.cmd.fix('bottom_surface_freeze', 'bottom_surface', 'setforce', 0.0, 0.0, 0.0)
-    lmp.cmd.velocity('top_surface', 'set', -SHEAR_VELOCITY, 0.0, 0.0)
-    lmp.cmd.velocity('bottom_surface', 'set', 0.0, 0.0, 0.0)
+    args = balance_args(FROZEN_MODE == 'exclude' and 'frozen_core' in lmp.available_ids('group'))
+    if BALANCE_MODE == 'rcb':
+        lmp.cmd.comm_style('tiled')
 
-    lmp.cmd.fix('precipitate_freeze', 'precipitate', 'setforce', 0.0, 0.0, 0.0)
-    lmp.cmd.velocity('precipitate', 'set', 0.0, 0.0, 0.0)
+    log_imbalance(lmp, 'initial')
+    lmp.cmd.balance(BALANCE_THRESHOLD, *args)
+    log_imbalance(lmp, 'balanced')
 
-    #--- Dump ID's for post-processing or future simulations ---#
-    lmp.cmd.write_dump('precipitate', 'custom', os.path.join(OUTPUT_DIR, 'precipitate_ID.txt'), 'id', 'x', 'y', 'z')
-    lmp.cmd.write_dump('top_surface', 'custom', os.path.join(OUTPUT_DIR, 'top_surface_ID.txt'), 'id', 'x', 'y', 'z')
-    lmp.cmd.write_dump('bottom_surface', 'custom', os.path.join(OUTPUT_DIR, 'bottom_surface_ID.txt'), 'id', 'x', 'y', 'z')
+    if BALANCE_MODE in ('shift', 'rcb'):
+        lmp.cmd.fix('balance', 'all', 'balance', BALANCE_FREQ, BALANCE_THRESHOLD, *args)
 
-    lmp.cmd.thermo_style('custom', 'step', 'temp', 'pe', 'etotal',
-                         'c_press_comp[1]', 'c_press_comp[2]', 'c_press_comp[3]',
-                         'c_press_comp[4]', 'c_press_comp[5]', 'c_press_comp[6]')
+    return None
+
+def log_imbalance(lmp, label):
+    """Append max/mean atoms per rank to balance.txt."""
+    counts = comm.gather(lmp.extract_global('nlocal'), root=0)
+    if rank == 0:
+        imbalance = max(counts) / np.mean(counts)
+        print(f"Load imbalance ({label}): {imbalance:.3f}", flush=True)
+        with open(os.path.join(LOG_DIR, 'balance.txt'), 'a') as f:
+            f.write(f"{lmp.extract_global('ntimestep')} {label} {BALANCE_MODE} {max(counts)} {np.mean(counts):.1f} {imbalance:.4f}\n")
+    return None
+
+def define_thermo(lmp):
+    """Thermo output, with the imbalance factor of the last fix balance call when there is one."""
+    columns = ['step', 'temp', 'pe', 'etotal',
+               'c_press_comp[1]', 'c_press_comp[2]', 'c_press_comp[3]',
+               'c_press_comp[4]', 'c_press_comp[5]', 'c_press_comp[6]']
+    if BALANCE_MODE in ('shift', 'rcb'):
+        columns.append('f_balance')
+
+    lmp.cmd.thermo_style('custom', *columns)
     lmp.cmd.thermo(THERMO_FREQ)
+    return None
+
+# =============================================================
+# RUN AND IN-SITU TRACKING
+# =============================================================
+
+def run_shear(lmp, obstacle_centre, box_min, box_max, checkpoint=None):
+    """Run to RUN_TIME steps after the first shear step, in chunks when tracking or writing rotating checkpoints.
+
+    On resume the run continues from the checkpoint step with the original start and stop steps, so the
+    thermostat ramp and step-based outputs line up with the interrupted run.
+    """
+
+    global RUN_SECONDS, RUN_STEPS
+
+    marker = start_checkpoints(lmp, checkpoint)
+    start_step, stop_step = marker["start_step"], marker["stop_step"]
+
+    # Wall time and steps of the MD run alone, for throughput measurements without the setup
+    RUN_STEPS = stop_step - lmp.extract_global('ntimestep')
+    comm.Barrier()
+    t_run = MPI.Wtime()
+
+    chunk = run_chunk_steps()
+    if chunk is None:
+        lmp.cmd.run(RUN_STEPS, 'start', start_step, 'stop', stop_step)
+        RUN_SECONDS = MPI.Wtime() - t_run
+        finish_checkpoints(marker)
+        return None
+
+    # Time-averaged pe, valid on multiples of TRACK_FREQ; it also makes pe/atom tally on those steps
+    track_path = os.path.join(LOG_DIR, 'dislocation_track.txt')
+    if measure_line():
+        lmp.cmd.fix('track_pe', 'all', 'ave/atom', 1, TRACK_AVERAGE, TRACK_FREQ, 'c_peratom')
+    if TRACK_DISLOCATION and rank == 0:
+        start_track_file(track_path, lmp.extract_global('ntimestep') if checkpoint is not None else None)
+
+    # A fresh run starts far from the obstacle; a resumed one starts dense until the first measurement
+    dump_near = checkpoint is not None
+    if adaptive_dump():
+        dump_near = set_dump_freq(lmp, dump_near, None)
+
+    step = lmp.extract_global('ntimestep')
+    while step < stop_step:
+        lmp.cmd.run(min(chunk - step % chunk, stop_step - step), 'start', start_step, 'stop', stop_step, 'post', 'no')
+        step = lmp.extract_global('ntimestep')
+
+        if measure_line() and step % TRACK_FREQ == 0:
+            row = measure_dislocation(lmp, obstacle_centre, box_min, box_max)
+            if TRACK_DISLOCATION and rank == 0:
+                with open(track_path, 'a') as f:
+                    np.savetxt(f, [[step, step * DT, *row]], fmt=['%d', '%.4f', '%.4f', '%.4f', '%.4f', '%.4f', '%d'])
+
+            if adaptive_dump():
+                distance = obstacle_distance(row, obstacle_centre, box_min, box_max) if rank == 0 else None
+                dump_near = set_dump_freq(lmp, dump_near, comm.bcast(distance, root=0), step)
+
+        if step < stop_step and checkpoint_due(marker, step):
+            write_checkpoint(lmp, marker, step)
+
+    if measure_line():
+        lmp.cmd.unfix('track_pe')
+
+    RUN_SECONDS = MPI.Wtime() - t_run
+    finish_checkpoints(marker)
+
+    return None
+
+def run_chunk_steps():
+    """Steps per run chunk, None when the run can go in one piece."""
+    chunks = []
+    if measure_line():
+        chunks.append(TRACK_FREQ)
+    if CHECKPOINT_MODE == 'rotate':
+        chunks.append(CHECKPOINT_CHECK_FREQ if CHECKPOINT_SECONDS is not None else CHECKPOINT_STEPS)
+    return int(np.gcd.reduce(chunks)) if chunks else None
+
+def measure_line():
+    """Whether the line position is measured during the run (for the tracking file or the dump schedule)."""
+    return TRACK_DISLOCATION or adaptive_dump()
+
+def adaptive_dump():
+    return ADAPTIVE_DUMP and DUMP_FORMAT != 'none'
+
+def obstacle_distance(row, obstacle_centre, box_min, box_max):
+    """Shortest X distance (periodic) between the measured line and the obstacle surface, NaN if no core was found."""
+    _, x_min, x_max, _, n_core = row
+    if n_core == 0:
+        return np.nan
+
+    lx = box_max[0] - box_min[0]
+    # The line spans [x_min, x_max]; it touches the obstacle's X extent if the centre lies inside that span
+    offsets = (np.array([x_min, x_max]) - obstacle_centre[0] + 0.5 * lx) % lx - 0.5 * lx
+    if offsets[0] <= 0.0 <= offsets[1]:
+        return -OBSTACLE_RADIUS
+
+    return np.min(np.abs(offsets)) - OBSTACLE_RADIUS
+
+def set_dump_freq(lmp, near, distance, step=None):
+    """Switch the trajectory dump between DUMP_FREQ_FAR and DUMP_FREQ_NEAR. An unknown distance keeps dumps dense.
+    Returns the new state and logs each switch to dump_schedule.txt."""
+
+    if distance is None:
+        new_near = near
+    elif np.isnan(distance):
+        new_near = True
+    elif near:
+        new_near = distance < DUMP_FAR_DISTANCE
+    else:
+        new_near = distance < DUMP_NEAR_DISTANCE
+
+    if step is not None and new_near == near:
+        return near
 
-    dump_path = os.path.join(DUMP_DIR, 'dump_*')
-    lmp.cmd.dump('1', 'all', 'custom', DUMP_FREQ, dump_path, 'id', 'x', 'y', 'z', 'c_peratom', 'c_stress[4]')
-    restart_path = os.path.join(RESTART_DIR, 'restart_*')
-    lmp.cmd.restart(RESTART_FREQ, restart_path)
+    every = DUMP_FREQ_NEAR if new_near else DUMP_FREQ_FAR
+    lmp.cmd.dump_modify('1', 'every', every)
+
+    if rank == 0:
+        step = lmp.extract_global('ntimestep') if step is None else step
+        with open(os.path.join(LOG_DIR, 'dump_schedule.txt'), 'a') as f:
+            f.write(f"{step} {every} {distance if distance is not None else float('nan'):.3f}\n")
+
+    return new_near
+
+def start_track_file(track_path, resume_step=None):
+    """Start the tracking file, or on resume keep only the rows up to the checkpoint step."""
+    header = "# step time(ps) x_mean x_min x_max bow_out n_core\n"
+
+    rows = np.empty((0, 7))
+    if resume_step is not None and os.path.exists(track_path):
+        rows = np.loadtxt(track_path, ndmin=2).reshape(-1, 7)
+        rows = rows[rows[:, 0] <= resume_step]
+
+    with open(track_path, 'w') as f:
+        f.write(header)
+        np.savetxt(f, rows, fmt=['%d', '%.4f', '%.4f', '%.4f', '%.4f', '%.4f', '%d'])
+
+    return None
+
+def measure_dislocation(lmp, obstacle_centre, box_min, box_max):
+    """Locate the dislocation from high-energy atoms near the glide plane. Returns (x_mean, x_min, x_max, bow_out, n_core) on rank 0."""
+
+    nlocal = lmp.extract_global('nlocal')
+    x = lmp.numpy.extract_atom('x')[:nlocal]
+    pe = lmp.numpy.extract_fix('track_pe', LMP_STYLE_ATOM, LMP_TYPE_VECTOR)[:nlocal]
+
+    # Bulk reference: mean pe over all atoms
+    pe_sum = comm.allreduce(float(np.sum(pe)), op=MPI.SUM)
+    n_total = comm.allreduce(nlocal, op=MPI.SUM)
+    pe_bulk = pe_sum / n_total
+
+    glide_y = 0.5 * (box_min[1] + box_max[1])
+    centre_distance = np.linalg.norm(x - np.asarray(obstacle_centre), axis=1)
+
+    core = (pe > pe_bulk + TRACK_PE_EXCESS) & (np.abs(x[:, 1] - glide_y) < TRACK_SLAB) & (centre_distance > OBSTACLE_RADIUS + TRACK_OBSTACLE_SKIN)
+
+    core_x = comm.gather(x[core, 0].copy(), root=0)
+    core_z = comm.gather(x[core, 2].copy(), root=0)
+
+    if rank != 0:
+        return None
+
+    return line_profile(np.concatenate(core_x), np.concatenate(core_z), box_min, box_max)
+
+def line_profile(x, z, box_min, box_max):
+    """Periodic mean, extremes and bow-out of a line along Z from its core atoms' x and z coordinates."""
+
+    if len(x) == 0:
+        return (np.nan, np.nan, np.nan, np.nan, 0)
+
+    lx = box_max[0] - box_min[0]
+    lz = box_max[2] - box_min[2]
+
+    # X is periodic, so average on the circle and measure offsets from the mean within +-lx/2
+    theta = 2.0 * np.pi * (x - box_min[0]) / lx
+    x_mean = box_min[0] + lx * (np.arctan2(np.mean(np.sin(theta)), np.mean(np.cos(theta))) / (2.0 * np.pi) % 1.0)
+
+    bins = np.clip(((z - box_min[2]) / lz * TRACK_Z_BINS).astype(int), 0, TRACK_Z_BINS - 1)
+    counts = np.bincount(bins, minlength=TRACK_Z_BINS)
+    sin_bins = np.bincount(bins, weights=np.sin(theta), minlength=TRACK_Z_BINS)
+    cos_bins = np.bincount(bins, weights=np.cos(theta), minlength=TRACK_Z_BINS)
+
+    filled = counts > 0
+    x_bins = box_min[0] + lx * (np.arctan2(sin_bins[filled], cos_bins[filled]) / (2.0 * np.pi) % 1.0)
+    offsets = (x_bins - x_mean + 0.5 * lx) % lx - 0.5 * lx
+
+    return (x_mean, x_mean + offsets.min(), x_mean + offsets.max(), offsets.max() - offsets.min(), len(x))
+
+# =============================================================
+# OUTPUT HELPERS
+# =============================================================
+
+def define_restart(lmp):
+    """Legacy restart output: every RESTART_FREQ steps to its own restart_* file ('all' mode only)."""
+    if CHECKPOINT_MODE == 'all':
+        lmp.cmd.restart(RESTART_FREQ, os.path.join(RESTART_DIR, 'restart_*'))
+    elif CHECKPOINT_MODE not in CHECKPOINT_MODES:
+        raise ValueError(f"Unknown checkpoint mode: {CHECKPOINT_MODE}")
+    return None
+
+def define_dump(lmp):
+    """Define the per-frame trajectory dump in the configured DUMP_FORMAT."""
+    if DUMP_FORMAT == 'none':
+        return None
+    if DUMP_FORMAT not in DUMP_FILENAMES:
+        raise ValueError(f"Unknown dump format: {DUMP_FORMAT}")
+
+    dump_path = os.path.join(DUMP_DIR, DUMP_FILENAMES[DUMP_FORMAT])
+
+    if DUMP_SELECTION == 'all':
+        lmp.cmd.dump('1', 'all', 'custom', DUMP_FREQ, dump_path, *DUMP_COLUMNS)
+    elif DUMP_SELECTION == 'defects':
+        intervals = [DUMP_FREQ] + ([DUMP_FREQ_NEAR, DUMP_FREQ_FAR] if ADAPTIVE_DUMP else [])
+        if any(FULL_DUMP_FREQ % interval for interval in intervals):
+            raise ValueError(f"FULL_DUMP_FREQ ({FULL_DUMP_FREQ}) must be a multiple of the dump intervals {intervals}")
+
+        define_defect_group(lmp, int(np.gcd.reduce(intervals)))
+        lmp.cmd.dump('1', 'defects', 'custom', DUMP_FREQ, dump_path, *DUMP_COLUMNS)
+        lmp.cmd.dump('2', 'all', 'custom', FULL_DUMP_FREQ, os.path.join(FULL_DUMP_DIR, DUMP_FILENAMES[DUMP_FORMAT]), *DUMP_COLUMNS)
+    else:
+        raise ValueError(f"Unknown dump selection: {DUMP_SELECTION}")
+
+    return None
+
+def define_defect_group(lmp, every):
+    """Dynamic group 'defects': non-BCC mobile atoms plus the perfect atoms within DEFECT_SHELL of them,
+    re-evaluated every 'every' steps (the dump steps). The fixed slabs are left out, their free surfaces are not BCC."""
+
+    # Dynamic groups are stored as static ones in restart files, so drop them before redefining on resume
+    for group in ('defect_core', 'defects'):
+        if group in lmp.available_ids('group'):
+            lmp.cmd.group(group, 'delete')
+
+    if DEFECT_METHOD == 'cna':
+        lmp.cmd.compute('defect_structure', 'mobile_atoms', 'cna/atom', DEFECT_CNA_CUTOFF)
+        lmp.cmd.variable('defect_core', 'atom', '"c_defect_structure != 3"') # 3 = BCC
+    elif DEFECT_METHOD == 'centro':
+        lmp.cmd.compute('defect_structure', 'mobile_atoms', 'centro/atom', 'bcc')
+        lmp.cmd.variable('defect_core', 'atom', f'"c_defect_structure > {DEFECT_CENTRO_MIN}"')
+    else:
+        raise ValueError(f"Unknown defect method: {DEFECT_METHOD}")
+
+    lmp.cmd.group('defect_core', 'dynamic', 'mobile_atoms', 'var', 'defect_core', 'every', every)
+
+    lmp.cmd.compute('defect_shell', 'mobile_atoms', 'coord/atom', 'cutoff', DEFECT_SHELL, 'group', 'defect_core')
+    lmp.cmd.variable('defect_atoms', 'atom', '"v_defect_core || c_defect_shell > 0"')
+    lmp.cmd.group('defects', 'dynamic', 'mobile_atoms', 'var', 'defect_atoms', 'every', every)
 
-    lmp.cmd.run(RUN_TIME)
     return None
 
 
+# =============================================================
+# CHECKPOINTS AND RESUME
+# =============================================================
+
+def checkpoint_marker_path(restart_dir=None):
+    return os.path.join(restart_dir or RESTART_DIR, CHECKPOINT_MARKER)
+
+def read_checkpoint_marker(restart_dir=None):
+    """Checkpoint marker of a case (None if the case never started its shear run)."""
+    path = checkpoint_marker_path(restart_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def write_checkpoint_marker(marker):
+    """Atomically replace checkpoint.json, only rank 0 writes."""
+    if rank == 0:
+        path = checkpoint_marker_path()
+        with open(path + '.tmp', 'w') as f:
+            json.dump(marker, f, indent=2)
+        os.replace(path + '.tmp', path)
+    return None
+
+def start_checkpoints(lmp, checkpoint=None):
+    """Marker of the current run: the stored one on resume, a new one recording the start and stop steps otherwise."""
+
+    if checkpoint is not None:
+        marker = read_checkpoint_marker()
+    else:
+        start_step = lmp.extract_global('ntimestep')
+        marker = {
+            "mode": CHECKPOINT_MODE,
+            "start_step": start_step,
+            "stop_step": start_step + RUN_TIME,
+            "complete": False,
+            "count": 0,
+            "checkpoints": [],
+        }
+        write_checkpoint_marker(marker)
+
+    marker["last_step"] = lmp.extract_global('ntimestep')
+    marker["last_time"] = MPI.Wtime()
+
+    return marker
+
+def checkpoint_due(marker, step):
+    """Whether a rotating checkpoint is due at step; rank 0 decides so all ranks agree on the wall clock."""
+    if CHECKPOINT_MODE != 'rotate':
+        return False
+
+    due = None
+    if rank == 0:
+        due = ((CHECKPOINT_STEPS is not None and step - marker["last_step"] >= CHECKPOINT_STEPS) or
+               (CHECKPOINT_SECONDS is not None and MPI.Wtime() - marker["last_time"] >= CHECKPOINT_SECONDS))
+
+    return comm.bcast(due, root=0)
+
+def write_checkpoint(lmp, marker, step):
+    """Write the next of CHECKPOINT_KEEP rotating restart files.
+
+    The slot is dropped from the marker before it is overwritten and the file is written under a temporary name,
+    so an allocation ending mid-write still leaves every checkpoint listed in the marker intact.
+    """
+
+    slot = f"checkpoint_{marker['count'] % CHECKPOINT_KEEP}.restart"
+    path = os.path.join(RESTART_DIR, slot)
+
+    marker["checkpoints"] = [entry for entry in marker["checkpoints"] if entry["file"] != slot]
+    write_checkpoint_marker(marker)
+
+    lmp.cmd.write_restart(path + '.tmp')
+    if rank == 0:
+        os.replace(path + '.tmp', path)
+
+    marker["checkpoints"].append({"file": slot, "step": step, "timestamp": str(datetime.datetime.now())})
+    marker["count"] += 1
+    marker["last_step"] = step
+    marker["last_time"] = MPI.Wtime()
+    write_checkpoint_marker(marker)
+
+    comm.Barrier()
+
+    return None
+
+def finish_checkpoints(marker):
+    """Mark the run complete, so a later --resume does not run it again."""
+    marker["complete"] = True
+    write_checkpoint_marker(marker)
+    comm.Barrier()
+    return None
+
+def find_checkpoint(case_dir):
+    """Newest valid checkpoint of a case as {"path", "step"}, None if there is nothing to resume from.
+    Rotating checkpoints come from the marker; 'all' mode falls back to the restart_* file with the highest step."""
+
+    restart_dir = os.path.join(case_dir, 'restarts')
+    marker = read_checkpoint_marker(restart_dir)
+
+    if marker is not None and marker["checkpoints"]:
+        newest = max(marker["checkpoints"], key=lambda entry: entry["step"])
+        path = os.path.join(restart_dir, newest["file"])
+        if os.path.exists(path):
+            return {"path": path, "step": newest["step"]}
+
+    restarts = [(int(match.group(1)), f) for f in os.listdir(restart_dir) for match in [re.fullmatch(r'restart_(\d+)', f)] if match] if os.path.isdir(restart_dir) else []
+    if marker is not None and restarts:
+        step, f = max(restarts)
+        return {"path": os.path.join(restart_dir, f), "step": step}
+
+    return None
+
+def resume_case(case):
+    """Continue an interrupted case (name under STAGE_DATA_DIR or path) from its newest checkpoint, in that directory,
+    with the parameters, seed and fix and dump settings recorded in its metadata."""
+
+    case_dir = os.path.abspath(case if os.path.isdir(case) else os.path.join(STAGE_DATA_DIR, case))
+    with open(os.path.join(case_dir, 'logs', 'metadata.json')) as f:
+        metadata = json.load(f)
+
+    configure_case(metadata["obstacle_type"], metadata["obstacle_radius"], metadata["temperature"], metadata["shear_velocity"], seed=metadata["random_seed"])
+    restore_case_settings(metadata)
+
+    marker = read_checkpoint_marker(os.path.join(case_dir, 'restarts'))
+    if marker is not None and marker["complete"]:
+        if rank == 0:
+            print(f"{case_dir} already completed, nothing to resume")
+        return None
+
+    checkpoint = find_checkpoint(case_dir)
+    if checkpoint is None:
+        if rank == 0:
+            print(f"No checkpoint in {case_dir}, starting the case again")
+    elif rank == 0:
+        print(f"Resuming {case_dir} from step {checkpoint['step']}")
+
+    return main(metadata["obstacle_type"], checkpoint, case_dir=case_dir)
+
+def restore_case_settings(metadata):
+    """Set the RESUME_SETTINGS globals to the values a case ran with. Settings missing from older metadata keep the
+    current values and are listed, so a changed default does not go unnoticed."""
+
+    missing = []
+    for key, name in RESUME_SETTINGS.items():
+        if key not in metadata:
+            missing.append(key)
+        elif not (key == 'full_dump_freq' and metadata[key] is None): # recorded as None when all atoms are dumped
+            globals()[name] = metadata[key]
+
+    if missing and rank == 0:
+        print(f"Warning: metadata.json has no {', '.join(missing)}, using the current settings for them", flush=True)
+
+    return None
+
 # =============================================================
 # ENTRY POINT
 # =============================================================
 
 if __name__ == "__main__":
-    main(OBSTACLE_TYPE)
+    parser = argparse.ArgumentParser(description="Shear a dislocation onto an obstacle.")
+    parser.add_argument('--resume', metavar='CASE', help="Continue a case (name or directory) from its newest checkpoint")
+    args = parser.parse_args()
+
+    if args.resume is not None:
+        resume_case(args.resume)
+    else:
+        main(OBSTACLE_TYPE)
@@ -0,0 +1,162 @@
+# =============================================================
+# LAMMPS Dislocation-Obstacle Parameter Sweep
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: Run a grid of shear cases concurrently on sub-communicators of one MPI allocation.
+# Note: Each group of RANKS_PER_CASE ranks takes the next case from a shared counter until the grid is done.
+# Run: apptainer exec 00_envs/lmp_CPU_22Jul2025.sif mpirun.openmpi -np 16 /opt/venv/bin/python3 03_shear/sweep.py [--grid grid.json]
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import os, json, datetime, argparse, itertools
+from mpi4py import MPI
+
+import run as shear
+from work_counter import create_work_counter, next_work_index
+
+# =============================================================
+# INITIALISE MPI
+# =============================================================
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+
+# =============================================================
+# SWEEP PARAMETERS
+# =============================================================
+
+# Parameter grid, every combination is one case (overridden by --grid, a JSON file with the same keys)
+GRID = {
+    "obstacle_type": ['void', 'prec'],
+    "obstacle_radius": [10, 20, 30],
+    "temperature": [300, 1000],
+    "shear_velocity": [0.001],
+}
+
+RANKS_PER_CASE = 4 # Ranks given to each concurrent case, leftover ranks join the last group
+
+# =============================================================
+# MAIN FUNCTION
+# =============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a grid of shear cases on sub-communicators.")
+    parser.add_argument('--grid', help="JSON file mapping obstacle_type/obstacle_radius/temperature/shear_velocity to lists")
+    parser.add_argument('--ranks-per-case', type=int, default=RANKS_PER_CASE)
+    args = parser.parse_args()
+
+    grid = GRID
+    if args.grid is not None:
+        with open(args.grid) as f:
+            grid = {**GRID, **json.load(f)}
+
+    cases = make_cases(grid)
+
+    #--- SPLIT THE ALLOCATION INTO CASE GROUPS ---#
+    n_groups = max(size // args.ranks_per_case, 1)
+    color = min(rank // args.ranks_per_case, n_groups - 1)
+    group_comm = comm.Split(color, rank)
+    group_rank = group_comm.Get_rank()
+
+    shear.set_communicator(group_comm)
+
+    if rank == 0:
+        print(f"Sweeping {len(cases)} cases on {n_groups} groups of ~{args.ranks_per_case} ranks", flush=True)
+
+    #--- RUN CASES FROM THE SHARED COUNTER ---#
+    win = create_work_counter(comm)
+    results = []
+    t_start = MPI.Wtime()
+
+    while True:
+        index = next_work_index(win) if group_rank == 0 else None
+        index = group_comm.bcast(index, root=0)
+        if index >= len(cases):
+            break
+
+        results.append(run_case(cases[index], group_comm))
+
+    win.Free()
+
+    #--- REPORT ---#
+    wall_time = MPI.Wtime() - t_start
+    results = comm.gather(results if group_rank == 0 else [], root=0)
+
+    if rank == 0:
+        report_throughput([r for group in results for r in group], wall_time, n_groups)
+
+    return None
+
+# =============================================================
+# CASES
+# =============================================================
+
+def make_cases(grid):
+    """All combinations of the grid, largest obstacles first so the slowest cases do not start last."""
+    keys = ["obstacle_type", "obstacle_radius", "temperature", "shear_velocity"]
+    cases = [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+    return sorted(cases, key=lambda case: -case["obstacle_radius"])
+
+def run_case(case, group_comm):
+    """Run one case with the shear workflow on group_comm and return its throughput."""
+
+    shear.configure_case(case["obstacle_type"], case["obstacle_radius"], case["temperature"], case["shear_velocity"])
+
+    group_comm.Barrier()
+    t0 = MPI.Wtime()
+    natoms = shear.main(case["obstacle_type"])
+    group_comm.Barrier()
+    wall_time = MPI.Wtime() - t0
+
+    # Throughput over the MD run only, setup (read_data, obstacle, computes) is in wall_time
+    run_time = shear.RUN_SECONDS
+
+    result = {
+        **case,
+        "case_name": shear.CASE_NAME,
+        "n_ranks": group_comm.Get_size(),
+        "natoms": natoms,
+        "steps": shear.RUN_STEPS,
+        "wall_time": wall_time,
+        "run_time": run_time,
+        "timesteps_per_second": shear.RUN_STEPS / run_time,
+        "atom_steps_per_second": natoms * shear.RUN_STEPS / run_time,
+    }
+
+    if group_comm.Get_rank() == 0:
+        print(f"Finished {shear.CASE_NAME} on {result['n_ranks']} ranks: {result['timesteps_per_second']:.1f} steps/s, "
+              f"{result['atom_steps_per_second']:.3e} atom-steps/s", flush=True)
+
+    return result
+
+def report_throughput(results, wall_time, n_groups):
+    """Print per-case throughput and write the sweep summary to STAGE_DATA_DIR."""
+
+    print(f"\n{len(results)} cases in {wall_time:.1f} s on {size} ranks ({n_groups} groups)")
+    print(f"{'case':>40} {'ranks':>6} {'atoms':>9} {'wall (s)':>9} {'steps/s':>9} {'atom-steps/s':>13}")
+    for r in results:
+        print(f"{r['case_name']:>40} {r['n_ranks']:6d} {r['natoms']:9d} {r['wall_time']:9.1f} {r['timesteps_per_second']:9.1f} {r['atom_steps_per_second']:13.3e}")
+
+    summary = {
+        "timestamp": str(datetime.datetime.now()),
+        "n_ranks": size,
+        "n_groups": n_groups,
+        "wall_time": wall_time,
+        "total_atom_steps_per_second": sum(r["natoms"] * r["steps"] for r in results) / wall_time,
+        "cases": results,
+    }
+
+    output_path = os.path.join(shear.STAGE_DATA_DIR, f"sweep_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Sweep summary written to {output_path}")
+
+    return None
+
+# =============================================================
+# ENTRY POINT
+# =============================================================
+if __name__ == "__main__":
+    main()
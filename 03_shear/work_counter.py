@@ -0,0 +1,44 @@
+# =============================================================
+# Shared Work Counter
+# Author: Ethan L. Edmunds
+# Version: v1.0
+# Description: One int64 counter on rank 0 of a communicator, advanced with MPI one-sided atomics.
+# Note: Used to hand out frames (analysis.py) and cases (sweep.py) on demand.
+# Usage: win = work_counter.create_work_counter(comm); start = work_counter.next_work_index(win, batch_size); win.Free()
+# =============================================================
+
+# =============================================================
+# IMPORT LIBRARIES
+# =============================================================
+import numpy as np
+from mpi4py import MPI
+
+# =============================================================
+# COUNTER
+# =============================================================
+
+def create_work_counter(comm):
+    """Create a one-element int64 counter on rank 0 of comm (collective). Free the returned window when done."""
+    rank = comm.Get_rank()
+    itemsize = MPI.INT64_T.Get_size()
+    win = MPI.Win.Allocate(itemsize if rank == 0 else 0, itemsize, comm=comm)
+
+    if rank == 0:
+        win.Lock(0)
+        win.Put(np.zeros(1, dtype=np.int64), 0)
+        win.Unlock(0)
+
+    comm.Barrier() # counter must be zeroed before anyone fetches from it
+
+    return win
+
+def next_work_index(win, batch_size=1):
+    """Atomically advance the counter by batch_size and return its previous value."""
+    increment = np.array([batch_size], dtype=np.int64)
+    previous = np.zeros(1, dtype=np.int64)
+
+    win.Lock(0, MPI.LOCK_SHARED)
+    win.Fetch_and_op(increment, previous, 0, 0, MPI.SUM)
+    win.Unlock(0)
+
+    return int(previous[0])
@@ -8,6 +8,7 @@
 
 module load OpenMPI/4.1.4-GCC-12.2.0
 export OMP_NUM_THREADS=$SLURM_CPUS_PER_TASK
+# Hybrid layout: e.g. --ntasks=7 --cpus-per-task=3 with ANALYSIS_THREAD_MODE=threads (DXA, WS and writer per rank)
 
 export APPTAINER_TMPDIR=$HOME/.apptainer_tmp
 export APPTAINER_CACHEDIR=$HOME/.apptainer_cache
@@ -19,6 +20,11 @@ CONTAINER_PATH=/mnt/parscratch/users/mtp24ele/void_shear/00_envs/lmp_CPU_22Jul20
 
 INPUT=/mnt/parscratch/users/mtp24ele/void_shear/03_pin_dislo/analysis.py
 
+# Streaming (analysis.py --follow): run the shear case and analyse its frames as they are written, e.g.
+#   export SHEAR_RANDOM_SEED=4773 SHEAR_CASE_DIR=<STAGE_DATA_DIR>/prec_R30_T1000_V0.001_4773
+#   srun --ntasks=16 ... python3 03_shear/run.py &
+#   srun --ntasks=4 ... python3 03_shear/analysis.py --follow
+#   wait
 srun --export=ALL \
      apptainer exec \
      --bind $HOST_MPI_PATH:$HOST_MPI_PATH \